@@ -46,10 +46,24 @@ def add_headers(response):
     response.headers["Referrer-Policy"] = "no-referrer-when-downgrade"
     return response
 
-# Initialize DB tables
-with app.app_context():
+def init_db():
+    """Create the tables and their indexes.
+
+    Called by models once every model is defined, so it works whichever of
+    app and models is imported first.
+    """
     import models
-    db.create_all()
+    from utils.analytics_retention import create_partitioned_tables, ensure_indexes
+    with app.app_context():
+        event_tables = [models.TemplateUsage.__table__, models.TemplateView.__table__]
+        # Raw analytics events are partitioned by month on PostgreSQL when ANALYTICS_PARTITIONING=1
+        create_partitioned_tables(db.engine, event_tables)
+        db.create_all()
+        # create_all doesn't add indexes to tables that already exist
+        ensure_indexes(db.engine, event_tables)
+
+# Initialize DB tables; importing models runs init_db
+import models
 
 @app.route('/')
 def home():
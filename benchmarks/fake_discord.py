@@ -0,0 +1,317 @@
+import re
+import time
+import random
+import asyncio
+import logging
+import discord
+from discord.http import HTTPClient
+from discord.state import ConnectionState
+from typing import Dict, List, Any, Optional, Tuple
+from utils.channel_names import normalize_channel_name
+
+logger = logging.getLogger(__name__)
+
+
+class FakeResponse:
+    """Minimal stand-in for aiohttp.ClientResponse, enough for discord.HTTPException."""
+
+    def __init__(self, status: int, reason: str, headers: Dict[str, str] = None):
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+
+
+class FakeHTTPClient(HTTPClient):
+    """In-process replacement for discord.py's HTTP client.
+
+    Every discord.py REST helper funnels through HTTPClient.request, so overriding
+    that single method lets real Guild, Role and Channel objects run against an
+    in-memory guild. Calls are recorded per route, latency is simulated per route,
+    and a fraction of requests can be answered with 429s.
+    """
+
+    def __init__(self, latency: Dict[str, float] = None, default_latency: float = 0.0,
+                 rate_limit_chance: float = 0.0, retry_after: float = 0.05, seed: int = 0):
+        """Initialize the fake client.
+
+        Args:
+            latency: Simulated seconds per route key (e.g. 'POST /guilds/{guild_id}/roles')
+            default_latency: Simulated seconds for routes without an explicit latency
+            rate_limit_chance: Probability that a request is answered with a 429
+            retry_after: Retry-After value sent with simulated 429s
+            seed: Seed for the random number generator deciding 429s
+        """
+        super().__init__(loop=None)
+        self.latency = latency or {}
+        self.default_latency = default_latency
+        self.rate_limit_chance = rate_limit_chance
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls: List[Tuple[str, str]] = []
+        self.rate_limited_calls = 0
+        self.backends: Dict[int, "FakeGuildBackend"] = {}
+        self._ids = int(time.time() * 1000) << 22
+
+    def next_id(self) -> int:
+        """Generate a unique snowflake."""
+        self._ids += 1
+        return self._ids
+
+    def reset_stats(self) -> None:
+        """Forget recorded calls."""
+        self.calls = []
+        self.rate_limited_calls = 0
+
+    def call_counts(self) -> Dict[str, int]:
+        """Number of recorded calls per route key."""
+        counts: Dict[str, int] = {}
+        for key, _ in self.calls:
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    async def request(self, route, *, files=None, form=None, **kwargs: Any) -> Any:
+        """Serve a request from the in-memory guilds."""
+        latency = self.latency.get(route.key, self.default_latency)
+        if latency:
+            await asyncio.sleep(latency)
+
+        if self.rate_limit_chance and self.random.random() < self.rate_limit_chance:
+            self.rate_limited_calls += 1
+            response = FakeResponse(429, 'Too Many Requests', {'Retry-After': str(self.retry_after)})
+            raise discord.HTTPException(response, {'message': 'You are being rate limited.', 'retry_after': self.retry_after})
+
+        self.calls.append((route.key, route.url))
+        params = _route_params(route)
+        guild_id = int(params.get('guild_id', 0)) if params.get('guild_id') else None
+        if guild_id is None and params.get('channel_id'):
+            guild_id = self._guild_for_channel(int(params['channel_id']))
+
+        backend = self.backends.get(guild_id)
+        if backend is None:
+            raise discord.NotFound(FakeResponse(404, 'Not Found'), {'message': 'Unknown Guild', 'code': 10004})
+        return backend.handle(route, params, kwargs.get('json'))
+
+    def _guild_for_channel(self, channel_id: int) -> Optional[int]:
+        """Find the guild owning a channel ID."""
+        for guild_id, backend in self.backends.items():
+            if channel_id in backend.channels:
+                return guild_id
+        return None
+
+
+def _route_params(route) -> Dict[str, str]:
+    """Recover the path parameters of a formatted route."""
+    pattern = re.escape(route.BASE + route.path)
+    pattern = re.sub(r'\\{(\w+)\\}', r'(?P<\1>[^/]+)', pattern)
+    match = re.fullmatch(pattern, route.url)
+    return match.groupdict() if match else {}
+
+
+class FakeGuildBackend:
+    """Server-side state of one fake guild.
+
+    Mutations are mirrored into the discord.py cache through the same
+    ConnectionState parsers the gateway uses, so gateway listeners fire
+    exactly as they would against Discord. Without a state (as in the REST
+    stand-in server) the backend only keeps its own records.
+    """
+
+    def __init__(self, http: Any, state: Optional[ConnectionState], guild_id: int, name: str):
+        """Initialize the backend.
+
+        Args:
+            http: Anything with a next_id() method handing out snowflakes
+            state: The connection state to mirror changes into, if any
+            guild_id: The guild's ID
+            name: The guild's name
+        """
+        self.http = http
+        self.state = state
+        self.guild_id = guild_id
+        self.name = name
+        self.owner_id = http.next_id()
+        self.roles: Dict[int, Dict[str, Any]] = {
+            guild_id: {'id': str(guild_id), 'name': '@everyone', 'color': 0, 'hoist': False, 'mentionable': False,
+                       'permissions': str(discord.Permissions.general().value), 'position': 0, 'managed': False}
+        }
+        self.channels: Dict[int, Dict[str, Any]] = {}
+
+    def guild_payload(self) -> Dict[str, Any]:
+        """The guild as a GUILD_CREATE payload, for building a discord.Guild."""
+        return {
+            'id': str(self.guild_id), 'name': self.name, 'owner_id': str(self.owner_id),
+            'roles': [dict(role) for role in self.roles.values()],
+            'channels': [dict(channel) for channel in self.channels.values()],
+            'members': [], 'member_count': 1, 'features': [], 'emojis': [], 'stickers': [],
+        }
+
+    def populate(self, roles: int = 0, categories: int = 0, channels_per_category: int = 0) -> None:
+        """Add synthetic roles, categories and text channels."""
+        for i in range(roles):
+            self._create_role({'name': f'Synthetic Role {i}', 'color': i, 'permissions': '0'})
+        for i in range(categories):
+            category = self._create_channel({'type': 4, 'name': f'Synthetic Category {i}'})
+            for j in range(channels_per_category):
+                self._create_channel({'type': 0, 'name': f'synthetic-{i}-{j}', 'parent_id': category['id']})
+
+    def handle(self, route, params: Dict[str, str], payload: Any) -> Any:
+        """Dispatch a request to the matching handler."""
+        key = route.key
+        if key == 'POST /guilds/{guild_id}/roles':
+            return self._create_role(payload)
+        if key == 'PATCH /guilds/{guild_id}/roles/{role_id}':
+            return self._edit_role(int(params['role_id']), payload)
+        if key == 'PATCH /guilds/{guild_id}/roles':
+            return self._edit_role_positions(payload)
+        if key == 'POST /guilds/{guild_id}/channels':
+            return self._create_channel(payload)
+        if key == 'PATCH /guilds/{guild_id}/channels':
+            return self._bulk_channel_update(payload)
+        if key == 'PATCH /channels/{channel_id}':
+            return self._edit_channel(int(params['channel_id']), payload)
+        if key == 'DELETE /channels/{channel_id}':
+            return self._delete_channel(int(params['channel_id']))
+        if key == 'PUT /channels/{channel_id}/permissions/{target}':
+            return self._edit_overwrite(int(params['channel_id']), int(params['target']), payload)
+        if key == 'POST /channels/{channel_id}/messages':
+            return self._message(int(params['channel_id']), payload)
+        if key == 'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}':
+            return None
+        raise discord.HTTPException(FakeResponse(405, 'Method Not Allowed'), {'message': f'Unsupported route {key}'})
+
+    def _mirror(self, parser: str, data: Dict[str, Any]) -> None:
+        """Feed a change through the matching gateway parser, if there is a cache to update."""
+        if self.state is not None:
+            getattr(self.state, parser)(data)
+
+    def _create_role(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        role = {
+            'id': str(self.http.next_id()),
+            'name': payload.get('name', 'new role'),
+            'color': payload.get('color', 0),
+            'hoist': payload.get('hoist', False),
+            'mentionable': payload.get('mentionable', False),
+            'permissions': payload.get('permissions', '0'),
+            'position': 1,
+            'managed': False,
+        }
+        for existing in self.roles.values():
+            if existing['position'] >= 1 and existing['id'] != str(self.guild_id):
+                existing['position'] += 1
+        self.roles[int(role['id'])] = role
+        self._mirror('parse_guild_role_create', {'guild_id': str(self.guild_id), 'role': dict(role)})
+        return dict(role)
+
+    def _edit_role(self, role_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        role = self.roles[role_id]
+        role.update(payload or {})
+        self._mirror('parse_guild_role_update', {'guild_id': str(self.guild_id), 'role': dict(role)})
+        return dict(role)
+
+    def _edit_role_positions(self, payload: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for entry in payload:
+            role = self.roles[int(entry['id'])]
+            role['position'] = entry['position']
+            self._mirror('parse_guild_role_update', {'guild_id': str(self.guild_id), 'role': dict(role)})
+        return [dict(role) for role in self.roles.values()]
+
+    def _create_channel(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        channel = dict(payload)
+        channel['id'] = str(self.http.next_id())
+        channel['guild_id'] = str(self.guild_id)
+        channel.setdefault('position', len(self.channels))
+        if channel.get('type') in (0, 5, 15):
+            # Discord stores text and forum names lowercased and hyphenated
+            channel['name'] = normalize_channel_name(channel['name'])
+        channel['permission_overwrites'] = [
+            {'id': str(o['id']), 'type': o['type'], 'allow': str(o['allow']), 'deny': str(o['deny'])}
+            for o in payload.get('permission_overwrites', [])
+        ]
+        if channel.get('parent_id') is not None:
+            channel['parent_id'] = str(channel['parent_id'])
+        self.channels[int(channel['id'])] = channel
+        self._mirror('parse_channel_create', dict(channel))
+        return dict(channel)
+
+    def _bulk_channel_update(self, payload: List[Dict[str, Any]]) -> None:
+        for entry in payload:
+            channel = self.channels[int(entry['id'])]
+            for field in ('position', 'parent_id', 'lock_permissions'):
+                if field in entry:
+                    channel[field] = entry[field]
+            self._mirror('parse_channel_update', dict(channel))
+        return None
+
+    def _edit_channel(self, channel_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        channel = self.channels[channel_id]
+        payload = dict(payload or {})
+        if 'permission_overwrites' in payload:
+            payload['permission_overwrites'] = [
+                {'id': str(o['id']), 'type': o['type'], 'allow': str(o['allow']), 'deny': str(o['deny'])}
+                for o in payload['permission_overwrites']
+            ]
+        channel.update(payload)
+        self._mirror('parse_channel_update', dict(channel))
+        return dict(channel)
+
+    def _delete_channel(self, channel_id: int) -> Dict[str, Any]:
+        channel = self.channels.pop(channel_id)
+        self._mirror('parse_channel_delete', dict(channel))
+        return dict(channel)
+
+    def _edit_overwrite(self, channel_id: int, target: int, payload: Dict[str, Any]) -> None:
+        channel = self.channels[channel_id]
+        overwrites = [o for o in channel['permission_overwrites'] if int(o['id']) != target]
+        overwrites.append({'id': str(target), 'type': payload['type'],
+                           'allow': str(payload['allow']), 'deny': str(payload['deny'])})
+        channel['permission_overwrites'] = overwrites
+        self._mirror('parse_channel_update', dict(channel))
+        return None
+
+    def _message(self, channel_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': str(self.http.next_id()),
+            'channel_id': str(channel_id),
+            'content': (payload or {}).get('content') or '',
+            'author': {'id': str(self.http.next_id()), 'username': 'ServerSetup', 'discriminator': '0', 'avatar': None},
+            'attachments': [], 'embeds': (payload or {}).get('embeds', []), 'mentions': [], 'mention_roles': [],
+            'pinned': False, 'mention_everyone': False, 'tts': False, 'type': 0,
+            'timestamp': discord.utils.utcnow().isoformat(), 'edited_timestamp': None,
+        }
+
+
+def make_state(http: FakeHTTPClient, dispatch=None) -> ConnectionState:
+    """Create a ConnectionState bound to the fake HTTP client."""
+    state = ConnectionState(
+        dispatch=dispatch or (lambda *args, **kwargs: None),
+        handlers={},
+        hooks={},
+        http=http,
+        intents=discord.Intents.default(),
+    )
+    state.loop = asyncio.get_event_loop()
+    return state
+
+
+def make_guild(http: FakeHTTPClient, state: ConnectionState, name: str = 'Benchmark Guild',
+               roles: int = 0, categories: int = 0, channels_per_category: int = 0) -> discord.Guild:
+    """Create a fake guild, optionally pre-populated with synthetic roles and channels.
+
+    Args:
+        http: The fake HTTP client serving the guild
+        state: The connection state the guild belongs to
+        name: Guild name
+        roles: Number of synthetic roles to create
+        categories: Number of synthetic categories to create
+        channels_per_category: Number of synthetic text channels per category
+
+    Returns:
+        A real discord.Guild whose REST calls go to the fake backend
+    """
+    backend = FakeGuildBackend(http, state, http.next_id(), name)
+    http.backends[backend.guild_id] = backend
+
+    guild = discord.Guild(data=backend.guild_payload(), state=state)
+    state._add_guild(guild)
+    backend.populate(roles, categories, channels_per_category)
+    return guild
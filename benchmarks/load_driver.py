@@ -0,0 +1,200 @@
+"""Drive simulated guilds through the bot's command flows against the REST stand-in.
+
+Usage:
+    python -m benchmarks.load_driver [--url URL] [--guilds N] [--concurrency N]
+                                     [--flows serverhub backup verification]
+                                     [--roles N] [--categories N] [--channels-per-category N]
+
+Without --url a stand-in is started in-process; for cleaner numbers run
+`python -m benchmarks.rest_server` separately and pass its URL. Each guild runs
+the chosen flows the way the slash commands do (defer the interaction, do the
+work, send a followup), and the driver reports per-flow latency percentiles,
+throughput and the server's request and 429 counts.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import aiohttp
+import discord
+from discord.http import HTTPClient, Route
+from typing import Dict, List, Any, Awaitable, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discord import make_state
+from benchmarks.rest_server import DiscordStandIn, start_server, API_PREFIX
+from utils.template_manager import TemplateManager
+from utils.job_journal import JobJournal
+from utils.backup_store import BackupStore
+from utils.guild_queue import guild_job_queue
+from utils.discord_helpers import setup_verification_system
+
+logger = logging.getLogger(__name__)
+
+FLOWS = ('serverhub', 'backup', 'verification')
+
+
+class LoadDriver:
+    """Runs command flows for many guilds against a stand-in REST API."""
+
+    def __init__(self, url: str, manager: TemplateManager, concurrency: int = 50):
+        """Initialize the driver.
+
+        Args:
+            url: Base URL of the stand-in server
+            manager: Template manager used by the flows
+            concurrency: Maximum number of guilds running flows at once
+        """
+        self.url = url
+        self.manager = manager
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.http = HTTPClient(asyncio.get_running_loop())
+        self.state = make_state(self.http)
+        self.latencies: Dict[str, List[float]] = {flow: [] for flow in FLOWS}
+        self.errors: Dict[str, int] = {flow: 0 for flow in FLOWS}
+        self._interactions = 0
+
+    async def start(self) -> None:
+        """Point discord.py at the stand-in and log in."""
+        Route.BASE = self.url + API_PREFIX
+        await self.http.static_login('stand-in-token')
+
+    async def close(self) -> None:
+        await self.http.close()
+
+    async def create_guilds(self, count: int, roles: int, categories: int, channels_per_category: int) -> List[discord.Guild]:
+        """Create guilds on the stand-in and build the matching cached discord.Guild objects."""
+        guilds = []
+        async with aiohttp.ClientSession() as session:
+            for i in range(count):
+                options = {'name': f'Load Guild {i}', 'roles': roles, 'categories': categories,
+                           'channels_per_category': channels_per_category}
+                async with session.post(f'{self.url}/_stand-in/guilds', json=options) as response:
+                    payload = await response.json()
+                guild = discord.Guild(data=payload, state=self.state)
+                self.state._add_guild(guild)
+                guilds.append(guild)
+        return guilds
+
+    async def stand_in_stats(self) -> Dict[str, Any]:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'{self.url}/_stand-in/stats') as response:
+                return await response.json()
+
+    async def _interaction(self, flow: str, work: Callable[[], Awaitable[Any]]) -> None:
+        """Run one flow like a deferred slash command and record its latency."""
+        self._interactions += 1
+        interaction_id = self._interactions
+        token = f'token-{interaction_id}'
+        started = time.perf_counter()
+        try:
+            await self.http.request(
+                Route('POST', '/interactions/{interaction_id}/{interaction_token}/callback',
+                      interaction_id=interaction_id, interaction_token=token),
+                json={'type': 5, 'data': {'flags': 64}}
+            )
+            await work()
+            await self.http.request(
+                Route('POST', '/webhooks/{webhook_id}/{webhook_token}', webhook_id=1, webhook_token=token),
+                json={'content': f'{flow} done', 'flags': 64}
+            )
+        except Exception as e:
+            logger.error(f"{flow} failed: {e}")
+            self.errors[flow] += 1
+            return
+        self.latencies[flow].append(time.perf_counter() - started)
+
+    def _work(self, flow: str, guild: discord.Guild) -> Callable[[], Awaitable[Any]]:
+        if flow == 'serverhub':
+            plan = self.manager.get_plan('serverhub')
+            return lambda: guild_job_queue.submit(
+                guild.id, ('apply', 'serverhub', '{}'),
+                lambda: self.manager.apply_template(guild, 'serverhub'),
+                description="serverhub template",
+                estimated_steps=len(plan.steps)
+            )
+        if flow == 'backup':
+            return lambda: self.manager.backup_server(guild)
+        return lambda: setup_verification_system(guild)
+
+    async def run_guild(self, guild: discord.Guild, flows: List[str]) -> None:
+        """Run the flows for one guild in order."""
+        async with self.semaphore:
+            for flow in flows:
+                await self._interaction(flow, self._work(flow, guild))
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _report(driver: LoadDriver, flows: List[str], elapsed: float, stats: Dict[str, Any]) -> None:
+    print(f"{'flow':<14} {'done':>6} {'errors':>6} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'max (s)':>9}")
+    for flow in flows:
+        latencies = driver.latencies[flow]
+        print(f"{flow:<14} {len(latencies):>6} {driver.errors[flow]:>6} {_percentile(latencies, 0.5):>9.3f} "
+              f"{_percentile(latencies, 0.95):>9.3f} {_percentile(latencies, 0.99):>9.3f} "
+              f"{max(latencies, default=0.0):>9.3f}")
+
+    completed = sum(len(driver.latencies[flow]) for flow in flows)
+    print(f"\nWall time: {elapsed:.2f}s, {completed / elapsed if elapsed else 0:.1f} flows/s")
+    print(f"Stand-in: {stats['requests']} requests ({stats['requests_per_second']:.1f}/s), "
+          f"429s: {stats['rate_limited']['bucket']} bucket, {stats['rate_limited']['global']} global")
+
+
+async def run(args: argparse.Namespace) -> None:
+    runner = None
+    url = args.url
+    if not url:
+        runner, url = await start_server(DiscordStandIn(args.latency, args.bucket_limit, args.bucket_window))
+
+    with tempfile.TemporaryDirectory() as scratch:
+        manager = TemplateManager()
+        # Keep the load test's journal and backups out of the bot's data directory
+        manager.job_journal = JobJournal(os.path.join(scratch, 'jobs.db'))
+        manager.backup_path = scratch
+        manager.backups = BackupStore(scratch)
+
+        driver = LoadDriver(url, manager, args.concurrency)
+        try:
+            await driver.start()
+            guilds = await driver.create_guilds(args.guilds, args.roles, args.categories, args.channels_per_category)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(driver.run_guild(guild, args.flows) for guild in guilds))
+            elapsed = time.perf_counter() - started
+
+            _report(driver, args.flows, elapsed, await driver.stand_in_stats())
+        finally:
+            await driver.close()
+            if runner:
+                await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the bot's command flows against the REST stand-in")
+    parser.add_argument('--url', help="Base URL of a running stand-in (default: start one in-process)")
+    parser.add_argument('--guilds', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=50, help="Guilds running flows at once")
+    parser.add_argument('--flows', nargs='*', choices=FLOWS, default=list(FLOWS))
+    parser.add_argument('--roles', type=int, default=0, help="Synthetic roles per guild")
+    parser.add_argument('--categories', type=int, default=0, help="Synthetic categories per guild")
+    parser.add_argument('--channels-per-category', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help="In-process stand-in: seconds per request")
+    parser.add_argument('--bucket-limit', type=int, default=5, help="In-process stand-in: requests per bucket window")
+    parser.add_argument('--bucket-window', type=float, default=5.0, help="In-process stand-in: bucket window in seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""Local stand-in for the Discord REST API, for load-testing the bot end to end.
+
+Usage:
+    python -m benchmarks.rest_server [--host HOST] [--port PORT] [--latency SECONDS]
+                                     [--bucket-limit N] [--bucket-window SECONDS] [--global-limit N]
+
+Serves the routes the bot uses (roles, channels, permission overwrites, member
+role add, messages and interaction responses) from in-memory guilds under
+/api/v10, and enforces per-route buckets and a global limit with the same
+X-RateLimit-* headers and 429 bodies Discord sends. discord.py talks to it
+after setting discord.http.Route.BASE to the server's /api/v10 URL.
+
+Guilds are created with POST /_stand-in/guilds, which returns a GUILD_CREATE
+payload for building the matching discord.Guild; GET /_stand-in/stats reports
+request counts, 429s and throughput.
+"""
+import re
+import time
+import json
+import asyncio
+import hashlib
+import logging
+import argparse
+import discord
+from aiohttp import web
+from types import SimpleNamespace
+from typing import Dict, List, Any, Optional, Pattern, Tuple
+
+from benchmarks.fake_discord import FakeGuildBackend
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/v10'
+
+# Routes served from the guild backends, as discord.py route keys
+GUILD_ROUTES = [
+    'POST /guilds/{guild_id}/roles',
+    'PATCH /guilds/{guild_id}/roles/{role_id}',
+    'PATCH /guilds/{guild_id}/roles',
+    'POST /guilds/{guild_id}/channels',
+    'PATCH /guilds/{guild_id}/channels',
+    'PATCH /channels/{channel_id}',
+    'PUT /channels/{channel_id}/permissions/{target}',
+    'POST /channels/{channel_id}/messages',
+    'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}',
+]
+
+# Routes answered by the server itself
+USER_ROUTE = 'GET /users/@me'
+INTERACTION_CALLBACK_ROUTE = 'POST /interactions/{interaction_id}/{interaction_token}/callback'
+FOLLOWUP_ROUTE = 'POST /webhooks/{webhook_id}/{webhook_token}'
+EDIT_ORIGINAL_ROUTE = 'PATCH /webhooks/{webhook_id}/{webhook_token}/messages/@original'
+
+# Interaction responses are exempt from the global limit and are effectively
+# unlimited per interaction token, so they carry no rate-limit headers here
+UNLIMITED_ROUTES = {USER_ROUTE, INTERACTION_CALLBACK_ROUTE, FOLLOWUP_ROUTE, EDIT_ORIGINAL_ROUTE}
+
+# Path parameters Discord buckets rate limits on
+MAJOR_PARAMETERS = ('guild_id', 'channel_id')
+
+
+def _compile_route(route_key: str) -> Tuple[str, Pattern]:
+    """Turn a route key into its method and a regex over the request path."""
+    method, path = route_key.split(' ', 1)
+    pattern = re.escape(path)
+    pattern = re.sub(r'\\{(\w+)\\}', r'(?P<\1>[^/]+)', pattern)
+    return method, re.compile(pattern)
+
+
+def _json_response(body: Any, status: int = 200, headers: Dict[str, str] = None) -> web.Response:
+    """Build a JSON response with the bare content type discord.py expects."""
+    headers = dict(headers or {})
+    # discord.py only decodes bodies whose content type is exactly application/json
+    headers['Content-Type'] = 'application/json'
+    return web.Response(body=json.dumps(body).encode(), status=status, headers=headers)
+
+
+class RateLimitBucket:
+    """A fixed-window bucket, as Discord reports it in X-RateLimit-* headers."""
+
+    def __init__(self, name: str, limit: int, window: float):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def hit(self, now: float) -> Tuple[bool, float]:
+        """Count one request.
+
+        Returns:
+            A tuple of (whether the request is allowed, seconds until the window resets)
+        """
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+
+        reset_after = self.reset_at - now
+        if self.remaining <= 0:
+            return False, reset_after
+        self.remaining -= 1
+        return True, reset_after
+
+    def headers(self, reset_after: float) -> Dict[str, str]:
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(max(self.remaining, 0)),
+            'X-RateLimit-Reset': f'{time.time() + reset_after:.3f}',
+            'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+            'X-RateLimit-Bucket': self.name,
+        }
+
+
+class DiscordStandIn:
+    """In-memory Discord REST API with rate limits."""
+
+    def __init__(self, latency: float = 0.0, bucket_limit: int = 5, bucket_window: float = 5.0,
+                 global_limit: int = 50):
+        """Initialize the stand-in.
+
+        Args:
+            latency: Simulated processing seconds per request
+            bucket_limit: Requests allowed per route bucket and window
+            bucket_window: Length of a route bucket's window in seconds
+            global_limit: Requests allowed per second across all routes
+        """
+        self.latency = latency
+        self.bucket_limit = bucket_limit
+        self.bucket_window = bucket_window
+        self.global_bucket = RateLimitBucket('global', global_limit, 1.0)
+        self.backends: Dict[int, FakeGuildBackend] = {}
+        self._channel_guilds: Dict[int, int] = {}
+        self._buckets: Dict[str, RateLimitBucket] = {}
+        self._ids = int(time.time() * 1000) << 22
+        self._routes = [
+            (route_key, *_compile_route(route_key))
+            for route_key in GUILD_ROUTES + [USER_ROUTE, INTERACTION_CALLBACK_ROUTE, FOLLOWUP_ROUTE, EDIT_ORIGINAL_ROUTE]
+        ]
+        self.started_at = time.monotonic()
+        self.requests: Dict[str, int] = {}
+        self.rate_limited = {'bucket': 0, 'global': 0}
+
+    def next_id(self) -> int:
+        """Generate a unique snowflake."""
+        self._ids += 1
+        return self._ids
+
+    def create_guild(self, name: str, roles: int = 0, categories: int = 0,
+                     channels_per_category: int = 0) -> Dict[str, Any]:
+        """Create a guild, optionally with synthetic roles and channels, and return its payload."""
+        backend = FakeGuildBackend(self, None, self.next_id(), name)
+        backend.populate(roles, categories, channels_per_category)
+        self.backends[backend.guild_id] = backend
+        for channel_id in backend.channels:
+            self._channel_guilds[channel_id] = backend.guild_id
+        return backend.guild_payload()
+
+    def _match(self, method: str, path: str) -> Tuple[Optional[str], Dict[str, str]]:
+        for route_key, route_method, pattern in self._routes:
+            if route_method != method:
+                continue
+            match = pattern.fullmatch(path)
+            if match:
+                return route_key, match.groupdict()
+        return None, {}
+
+    def _bucket(self, route_key: str, params: Dict[str, str]) -> RateLimitBucket:
+        """Get the bucket for a route and its major parameter."""
+        major = next((params[name] for name in MAJOR_PARAMETERS if name in params), '')
+        key = f'{route_key}:{major}'
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # Discord's bucket hash identifies the route, not the major parameter
+            name = hashlib.sha1(route_key.encode()).hexdigest()[:16]
+            bucket = RateLimitBucket(name, self.bucket_limit, self.bucket_window)
+            self._buckets[key] = bucket
+        return bucket
+
+    @staticmethod
+    def _rate_limited(retry_after: float, headers: Dict[str, str], is_global: bool) -> web.Response:
+        headers = dict(headers)
+        headers['Retry-After'] = str(max(int(retry_after + 0.999), 1))
+        headers['X-RateLimit-Scope'] = 'global' if is_global else 'user'
+        # discord.py treats a 429 without Via as a Cloudflare ban
+        headers['Via'] = '1.1 google'
+        if is_global:
+            headers['X-RateLimit-Global'] = 'true'
+        body = {'message': 'You are being rate limited.', 'retry_after': round(retry_after, 3), 'global': is_global}
+        return _json_response(body, status=429, headers=headers)
+
+    async def handle_api(self, request: web.Request) -> web.Response:
+        """Serve one /api/v10 request."""
+        path = request.path[len(API_PREFIX):]
+        route_key, params = self._match(request.method, path)
+        if route_key is None:
+            return _json_response({'message': '404: Not Found', 'code': 0}, status=404)
+
+        self.requests[route_key] = self.requests.get(route_key, 0) + 1
+        now = time.monotonic()
+
+        headers = {}
+        if route_key not in UNLIMITED_ROUTES:
+            allowed, reset_after = self.global_bucket.hit(now)
+            if not allowed:
+                self.rate_limited['global'] += 1
+                return self._rate_limited(reset_after, {}, True)
+
+            bucket = self._bucket(route_key, params)
+            allowed, reset_after = bucket.hit(now)
+            headers = bucket.headers(reset_after)
+            if not allowed:
+                self.rate_limited['bucket'] += 1
+                return self._rate_limited(reset_after, headers, False)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        payload = await request.json() if request.can_read_body else None
+        try:
+            result = self._dispatch(route_key, params, payload)
+        except discord.HTTPException as e:
+            return _json_response({'message': e.text, 'code': e.code}, status=e.status, headers=headers)
+        except KeyError:
+            return _json_response({'message': 'Unknown Channel', 'code': 10003}, status=404, headers=headers)
+
+        if result is None:
+            return web.Response(status=204, headers=headers)
+        return _json_response(result, headers=headers)
+
+    def _dispatch(self, route_key: str, params: Dict[str, str], payload: Any) -> Any:
+        if route_key == USER_ROUTE:
+            return {'id': '1', 'username': 'ServerSetup', 'discriminator': '0', 'avatar': None, 'bot': True}
+        if route_key == INTERACTION_CALLBACK_ROUTE:
+            return None
+        if route_key in (FOLLOWUP_ROUTE, EDIT_ORIGINAL_ROUTE):
+            return self._webhook_message(int(params['webhook_id']), payload)
+
+        if 'guild_id' in params:
+            guild_id = int(params['guild_id'])
+        else:
+            guild_id = self._channel_guilds[int(params['channel_id'])]
+        backend = self.backends[guild_id]
+        result = backend.handle(SimpleNamespace(key=route_key), params, payload)
+
+        if isinstance(result, dict) and 'type' in result and 'guild_id' in result:
+            self._channel_guilds[int(result['id'])] = guild_id
+        return result
+
+    def _webhook_message(self, webhook_id: int, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        payload = payload or {}
+        return {
+            'id': str(self.next_id()),
+            'channel_id': str(self.next_id()),
+            'webhook_id': str(webhook_id),
+            'content': payload.get('content') or '',
+            'author': {'id': str(webhook_id), 'username': 'ServerSetup', 'discriminator': '0', 'avatar': None},
+            'attachments': [], 'embeds': payload.get('embeds', []), 'mentions': [], 'mention_roles': [],
+            'pinned': False, 'mention_everyone': False, 'tts': False, 'type': 0, 'flags': payload.get('flags', 0),
+            'timestamp': discord.utils.utcnow().isoformat(), 'edited_timestamp': None,
+        }
+
+    async def handle_create_guild(self, request: web.Request) -> web.Response:
+        """Create a guild from {name, roles, categories, channels_per_category}."""
+        options = await request.json() if request.can_read_body else {}
+        payload = self.create_guild(
+            options.get('name', 'Load Test Guild'),
+            roles=options.get('roles', 0),
+            categories=options.get('categories', 0),
+            channels_per_category=options.get('channels_per_category', 0),
+        )
+        return _json_response(payload)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return _json_response(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counts, 429s and throughput since the server started."""
+        elapsed = time.monotonic() - self.started_at
+        total = sum(self.requests.values())
+        return {
+            'guilds': len(self.backends),
+            'requests': total,
+            'requests_by_route': dict(self.requests),
+            'rate_limited': dict(self.rate_limited),
+            'requests_per_second': total / elapsed if elapsed else 0.0,
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/_stand-in/guilds', self.handle_create_guild)
+        app.router.add_get('/_stand-in/stats', self.handle_stats)
+        app.router.add_route('*', API_PREFIX + '/{tail:.*}', self.handle_api)
+        return app
+
+
+async def start_server(stand_in: DiscordStandIn, host: str = '127.0.0.1', port: int = 0) -> Tuple[web.AppRunner, str]:
+    """Start the stand-in on the running event loop.
+
+    Returns:
+        A tuple of (the runner, to clean up with runner.cleanup(); the server's base URL)
+    """
+    runner = web.AppRunner(stand_in.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return runner, f'http://{host}:{bound_port}'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Discord REST API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds per request")
+    parser.add_argument('--bucket-limit', type=int, default=5, help="Requests per route bucket and window")
+    parser.add_argument('--bucket-window', type=float, default=5.0, help="Route bucket window in seconds")
+    parser.add_argument('--global-limit', type=int, default=50, help="Requests per second across all routes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stand_in = DiscordStandIn(args.latency, args.bucket_limit, args.bucket_window, args.global_limit)
+    logger.info(f"Discord REST stand-in listening on http://{args.host}:{args.port}{API_PREFIX}")
+    web.run_app(stand_in.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Benchmark template application and backups against the offline fake guild.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--templates NAME ...] [--latency SECONDS]
+                                        [--rate-limit-chance P] [--json PATH]
+
+Every template in data/server_templates.json is applied to an empty guild and
+to a synthetic 500-channel guild, then applied again (which should be nearly
+free), backed up and restored from that backup (which should also be nearly
+free). Each run reports wall time, REST calls and peak memory.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from typing import Dict, List, Any, Awaitable, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discord import FakeHTTPClient, make_state, make_guild
+from utils.template_manager import TemplateManager
+from utils.job_journal import JobJournal
+from utils.backup_store import BackupStore
+from utils.guild_index import guild_indexes
+
+logger = logging.getLogger(__name__)
+
+# Guild shapes each template is applied to
+SCENARIOS = {
+    'empty': {'roles': 0, 'categories': 0, 'channels_per_category': 0},
+    'synthetic-500': {'roles': 250, 'categories': 50, 'channels_per_category': 10},
+}
+
+
+def _dispatch(event: str, *args: Any) -> None:
+    """Forward the fake gateway events the bot listens to into the guild indexes."""
+    handler = {
+        'guild_role_create': guild_indexes.on_role_create,
+        'guild_role_update': guild_indexes.on_role_update,
+        'guild_role_delete': guild_indexes.on_role_delete,
+        'guild_channel_create': guild_indexes.on_channel_create,
+        'guild_channel_update': guild_indexes.on_channel_update,
+        'guild_channel_delete': guild_indexes.on_channel_delete,
+    }.get(event)
+    if handler:
+        handler(*args)
+
+
+async def _measure(http: FakeHTTPClient, operation: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    """Run one operation and collect its wall time, REST calls and peak memory."""
+    http.reset_stats()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        await operation()
+        error = None
+    except Exception as e:
+        error = str(e)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'wall_time': elapsed,
+        'rest_calls': len(http.calls),
+        'rate_limited': http.rate_limited_calls,
+        'calls_by_route': http.call_counts(),
+        'peak_memory_kb': peak / 1024,
+        'error': error,
+    }
+
+
+async def benchmark_template(manager: TemplateManager, template_name: str, scenario: str,
+                             latency: float, rate_limit_chance: float) -> Dict[str, Dict[str, Any]]:
+    """Benchmark apply, re-apply, backup and restore of one template on a fresh fake guild.
+
+    Args:
+        manager: The template manager under test
+        template_name: The template to apply
+        scenario: Key of SCENARIOS describing the guild's starting shape
+        latency: Simulated seconds per REST request
+        rate_limit_chance: Probability of a simulated 429 per request
+
+    Returns:
+        Measurements keyed by phase ('apply', 'reapply', 'backup', 'restore')
+    """
+    http = FakeHTTPClient(default_latency=latency, rate_limit_chance=rate_limit_chance)
+    state = make_state(http, _dispatch)
+    guild = make_guild(http, state, name=f'{template_name} ({scenario})', **SCENARIOS[scenario])
+
+    results = {}
+    results['apply'] = await _measure(http, lambda: manager.apply_template(guild, template_name))
+    results['reapply'] = await _measure(http, lambda: manager.apply_template(guild, template_name))
+    results['backup'] = await _measure(http, lambda: manager.backup_server(guild))
+
+    async def restore() -> None:
+        plan = await manager.load_backup_plan(guild.id)
+        await manager.apply_template(guild, plan.name, {'repair': True})
+
+    results['restore'] = await _measure(http, restore)
+    guild_indexes.drop(guild.id)
+    return results
+
+
+def _print_table(rows: List[Dict[str, Any]]) -> None:
+    """Print results as an aligned table."""
+    header = f"{'template':<28} {'guild':<14} {'phase':<8} {'wall (s)':>9} {'calls':>6} {'429s':>5} {'peak KB':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        line = (f"{row['template']:<28} {row['scenario']:<14} {row['phase']:<8} {row['wall_time']:>9.3f} "
+                f"{row['rest_calls']:>6} {row['rate_limited']:>5} {row['peak_memory_kb']:>9.1f}")
+        if row['error']:
+            line += f"  ERROR: {row['error']}"
+        print(line)
+
+
+async def run(template_names: List[str], latency: float, rate_limit_chance: float) -> List[Dict[str, Any]]:
+    """Benchmark the given templates in every scenario.
+
+    Returns:
+        One row per template, scenario and phase
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as scratch:
+        manager = TemplateManager()
+        # Keep the benchmark's journal and backups out of the bot's data directory
+        manager.job_journal = JobJournal(os.path.join(scratch, 'jobs.db'))
+        manager.backup_path = scratch
+        manager.backups = BackupStore(scratch)
+
+        for template_name in template_names:
+            for scenario in SCENARIOS:
+                results = await benchmark_template(manager, template_name, scenario, latency, rate_limit_chance)
+                for phase, measurement in results.items():
+                    rows.append({'template': template_name, 'scenario': scenario, 'phase': phase, **measurement})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark template application against a fake Discord guild")
+    parser.add_argument('--templates', nargs='*', help="Templates to benchmark (default: all)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds per REST request")
+    parser.add_argument('--rate-limit-chance', type=float, default=0.0, help="Probability of a simulated 429")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    template_names = args.templates or TemplateManager().get_template_names()
+    rows = asyncio.run(run(template_names, args.latency, args.rate_limit_chance))
+    _print_table(rows)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
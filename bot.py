@@ -1,11 +1,19 @@
 import os
+import json
+import asyncio
 import discord
 import threading
 import logging
 from discord.ext import commands
 from discord import app_commands
-from utils.template_manager import TemplateManager
+from datetime import datetime
+from utils.template_manager import TemplateManager, BACKUP_PLAN_PREFIX
 from utils.analytics_service import analytics_service
+from utils.guild_queue import guild_job_queue
+from utils.rest_scheduler import rest_scheduler, INTERACTIVE
+from utils.guild_index import guild_indexes
+from utils.discord_helpers import setup_verification_system
+from utils.render_cache import render_cache
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -31,7 +39,11 @@ bot_status = {
     "reconnect_attempts": 0,
     "command_usages": {},
     "rate_limited_commands": set(),
-    "active_operations": 0
+    "active_operations": 0,
+    "jobs_resumed": False,
+    "templates_watched": False,
+    "backups_compacting": False,
+    "analytics_compacting": False
 }
 
 @bot.event
@@ -68,10 +80,79 @@ async def on_ready():
 
     try:
         synced = await bot.tree.sync()
+        synced_command_ids.update({command.name: command.id for command in synced})
         logger.info(f"Synced {len(synced)} command(s)")
     except Exception as e:
         logger.error(f"Failed to sync commands: {e}")
 
+    # Watch the template catalog for edits and index it for autocomplete, once per process
+    if not bot_status["templates_watched"]:
+        bot_status["templates_watched"] = True
+        bot.loop.create_task(template_manager.watch_templates())
+        bot.loop.create_task(template_manager.rebuild_search_index())
+
+    # Apply the backup retention policy in the background, once per process
+    if not bot_status["backups_compacting"]:
+        bot_status["backups_compacting"] = True
+        bot.loop.create_task(template_manager.compact_backups())
+
+    # Backfill the analytics rollups and sketches and apply the event retention policy
+    # in the background, once per process
+    if not bot_status["analytics_compacting"]:
+        bot_status["analytics_compacting"] = True
+        bot.loop.create_task(analytics_service.backfill())
+        bot.loop.create_task(analytics_service.compact_raw_events())
+
+    # Resume template jobs interrupted by a restart, once per process
+    if not bot_status["jobs_resumed"]:
+        bot_status["jobs_resumed"] = True
+        bot.loop.create_task(resume_interrupted_jobs())
+
+async def resume_interrupted_jobs():
+    """Resume template-apply jobs that were interrupted by a restart.
+
+    Jobs of a process that stopped just before this one started are still
+    leased to it, so a second pass picks them up once their leases run out.
+    """
+    for attempt in range(2):
+        if attempt:
+            await asyncio.sleep(template_manager.job_journal.lease_seconds)
+        try:
+            resumed = await template_manager.resume_interrupted_jobs(bot, apply=queue_template_apply)
+            if resumed:
+                logger.info(f"Resumed {resumed} interrupted template job(s)")
+        except Exception as e:
+            logger.error(f"Failed to resume interrupted template jobs: {e}")
+
+# Keep the guild name indexes in sync with role and channel changes
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    guild_indexes.on_role_create(role)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    guild_indexes.on_role_update(before, after)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    guild_indexes.on_role_delete(role)
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    guild_indexes.on_channel_create(channel)
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    guild_indexes.on_channel_update(before, after)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    guild_indexes.on_channel_delete(channel)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_indexes.drop(guild.id)
+
 # Add Discord connection events for better error handling
 @bot.event
 async def on_disconnect():
@@ -128,6 +209,25 @@ async def on_error(event, *args, **kwargs):
     except:
         pass
 
+async def queue_template_apply(guild: discord.Guild, template_name: str, options: dict = None, user_id: int = None):
+    """Apply a template through the guild's job queue.
+
+    Applies to one guild run one at a time, and a request identical to one
+    already queued or running for that guild is merged into it.
+    """
+    plan = await template_manager.load_plan(template_name)
+
+    async def run():
+        await template_manager.apply_template(guild, template_name, options, user_id)
+
+    await guild_job_queue.submit(
+        guild.id,
+        key=("apply", template_name, json.dumps(options or {}, sort_keys=True)),
+        factory=run,
+        description=f"{template_name} template",
+        estimated_steps=len(plan.steps) if plan else 1
+    )
+
 # Rate limiting helper function
 def check_rate_limit(command_name, user_id):
     """Check if a command is rate limited for a user."""
@@ -146,7 +246,7 @@ def check_rate_limit(command_name, user_id):
     command_type = "default"
     if command_name in ["customize", "gaming", "community", "content", "serverhub", "promohub"]:
         command_type = "template"
-    elif command_name == "backup":
+    elif command_name in ["backup", "restore"]:
         command_type = "backup"
     elif command_name == "ai-template":
         command_type = "ai"
@@ -166,10 +266,8 @@ def check_rate_limit(command_name, user_id):
     bot_status["command_usages"][command_key] = current_time
     return True, 0
 
-@bot.tree.command(name="help", description="View available server templates and commands")
-async def help_command(interaction: discord.Interaction):
-    """Display help information and available server templates."""
-
+def build_help_pages():
+    """Build the two /help embeds; cached until the template catalog changes."""
     # Create page 1 - Main Commands
     page1 = discord.Embed(
         title="ServerSetup Bot - Help (1/2)",
@@ -194,6 +292,7 @@ async def help_command(interaction: discord.Interaction):
         name="🛠️ Server Management",
         value=(
             "`/backup` - Create server backup\n"
+            "`/restore` - Restore from a backup\n"
             "`/verification` - Setup verification\n"
             "`/ticket` - Setup ticket system\n"
             "`/customize` - Custom template options"
@@ -250,6 +349,14 @@ async def help_command(interaction: discord.Interaction):
 
     page2.set_footer(text="Use the buttons below to navigate • Join our support server for help")
 
+    return page1, page2
+
+@bot.tree.command(name="help", description="View available server templates and commands")
+async def help_command(interaction: discord.Interaction):
+    """Display help information and available server templates."""
+
+    page1, page2 = render_cache.get_or_render(("help", None), None, build_help_pages)
+
     # Create navigation buttons
     class NavigationView(discord.ui.View):
         def __init__(self):
@@ -288,78 +395,7 @@ async def verification(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
 
     try:
-        # Create verified role if it doesn't exist
-        verified_role = discord.utils.get(interaction.guild.roles, name="Verified")
-        if not verified_role:
-            verified_role = await interaction.guild.create_role(
-                name="Verified",
-                color=discord.Color.green(),
-                reason="ServerSetup Bot Verification System"
-            )
-
-        # Create verification category if it doesn't exist
-        verification_category = discord.utils.get(interaction.guild.categories, name="🔒 Verification")
-        if not verification_category:
-            overwrites = {
-                interaction.guild.default_role: discord.PermissionOverwrite(view_channel=True, read_messages=True),
-                verified_role: discord.PermissionOverwrite(view_channel=False)
-            }
-            verification_category = await interaction.guild.create_category(
-                name="🔒 Verification",
-                overwrites=overwrites,
-                reason="ServerSetup Bot Verification System"
-            )
-
-        # Create verification channel if it doesn't exist
-        verification_channel = discord.utils.get(verification_category.channels, name="verify")
-        if not verification_channel:
-            overwrites = {
-                interaction.guild.default_role: discord.PermissionOverwrite(
-                    view_channel=True,
-                    send_messages=False,
-                    read_messages=True
-                ),
-                verified_role: discord.PermissionOverwrite(view_channel=False)
-            }
-            verification_channel = await interaction.guild.create_text_channel(
-                name="verify",
-                category=verification_category,
-                overwrites=overwrites,
-                reason="ServerSetup Bot Verification System"
-            )
-
-        # Create button for verification
-        verify_button = discord.ui.Button(style=discord.ButtonStyle.green, label="Verify", custom_id="verify_button")
-        view = discord.ui.View()
-        view.add_item(verify_button)
-
-        # Create the embed
-        embed = discord.Embed(
-            title="Server Verification",
-            description="Click the button below to verify and gain access to the server.",
-            color=discord.Color.blue()
-        )
-        embed.set_footer(text=f"{interaction.guild.name} • Verification System")
-
-        await verification_channel.send(embed=embed, view=view)
-
-        # Update server settings to lock main channels for unverified users
-        for category in interaction.guild.categories:
-            if category.id != verification_category.id:
-                try:
-                    await category.set_permissions(
-                        verified_role,
-                        view_channel=True,
-                        reason="ServerSetup Bot Verification System"
-                    )
-                    await category.set_permissions(
-                        interaction.guild.default_role,
-                        view_channel=False,
-                        reason="ServerSetup Bot Verification System"
-                    )
-                except discord.Forbidden:
-                    pass
-
+        await setup_verification_system(interaction.guild)
         await interaction.followup.send("Verification system has been set up successfully!", ephemeral=True)
 
     except Exception as e:
@@ -372,9 +408,12 @@ async def on_interaction(interaction: discord.Interaction):
     if interaction.type == discord.InteractionType.component:
         if interaction.data["custom_id"] == "verify_button":
             try:
-                verified_role = discord.utils.get(interaction.guild.roles, name="Verified")
+                verified_role = guild_indexes.get(interaction.guild).get_role("Verified")
                 if verified_role:
-                    await interaction.user.add_roles(verified_role, reason="User verified through button")
+                    await rest_scheduler.call(
+                        interaction.guild.id, INTERACTIVE,
+                        lambda: interaction.user.add_roles(verified_role, reason="User verified through button")
+                    )
                     await interaction.response.send_message("You have been verified! You now have access to the server.", ephemeral=True)
                     try:
                         welcome_embed = discord.Embed(
@@ -435,6 +474,22 @@ async def status_command(interaction: discord.Interaction):
         inline=True
     )
 
+    # Template job queue for this server, plus how many servers have work queued
+    queue_status = guild_job_queue.status()
+    if interaction.guild and interaction.guild.id in queue_status:
+        guild_queue = queue_status[interaction.guild.id]
+        eta_minutes, eta_seconds = divmod(int(guild_queue["eta"]), 60)
+        queue_text = (f"Jobs: {guild_queue['depth']}\n"
+                      f"Running: {guild_queue['running'] or 'None'}\n"
+                      f"ETA: {eta_minutes}m {eta_seconds}s")
+    else:
+        queue_text = "No queued jobs"
+    embed.add_field(
+        name="Template Queue",
+        value=f"{queue_text}\nServers with queued jobs: {len(queue_status)}",
+        inline=True
+    )
+
     if rate_limited:
         embed.add_field(
             name="Rate Limited Commands",
@@ -538,6 +593,15 @@ async def info_command(interaction: discord.Interaction):
 
     await interaction.response.send_message(embed=embed)
 
+async def template_name_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest template names matching what the user has typed so far."""
+    # Discord caps choice values at 100 characters, and a truncated name would never resolve
+    return [
+        app_commands.Choice(name=name, value=name)
+        for name in template_manager.search_templates(current)
+        if len(name) <= 100
+    ]
+
 @bot.tree.command(name="customize", description="Customize and apply a server template")
 @app_commands.describe(
     template_name="The name of the template to customize",
@@ -546,6 +610,7 @@ async def info_command(interaction: discord.Interaction):
     include_text_channels="Whether to include text channels from the template",
     include_voice_channels="Whether to include voice channels from the template"
 )
+@app_commands.autocomplete(template_name=template_name_autocomplete)
 async def customize_template(interaction: discord.Interaction,
                         template_name: str,
                         include_roles: bool = True,
@@ -560,9 +625,9 @@ async def customize_template(interaction: discord.Interaction,
     await interaction.response.defer(ephemeral=True)
 
     try:
-        # Get template
-        template = template_manager.get_template(template_name)
-        if not template:
+        # Get the compiled template plan
+        plan = await template_manager.load_plan(template_name)
+        if not plan:
             await interaction.followup.send(f"Template '{template_name}' not found", ephemeral=True)
             return
 
@@ -575,18 +640,9 @@ async def customize_template(interaction: discord.Interaction,
         confirmation += f"• {'✅' if include_voice_channels else '❌'} Voice Channels\n"
 
         # Count what will be created
-        role_count = len(template.get('roles', [])) if include_roles else 0
-        category_count = len(template.get('categories', [])) if include_categories else 0
-
-        channel_count = 0
-        if include_text_channels or include_voice_channels:
-            for category in template.get('categories', []):
-                for channel in category.get('channels', []):
-                    channel_type = channel.get('type', 'text')
-
-                    if (channel_type == 'text' and include_text_channels) or \
-                       (channel_type == 'voice' and include_voice_channels):
-                        channel_count += 1
+        role_count = plan.role_count if include_roles else 0
+        category_count = plan.category_count if include_categories else 0
+        channel_count = plan.count_channels(include_text_channels, include_voice_channels)
 
         confirmation += f"\n**Will create:** {role_count} roles, {category_count} categories, and {channel_count} channels."
 
@@ -599,9 +655,7 @@ async def customize_template(interaction: discord.Interaction,
         }
 
         # Apply template with options and track user for analytics
-        from app import app
-        with app.app_context():
-            await template_manager.apply_template(interaction.guild, template_name, template_options, interaction.user.id)
+        await queue_template_apply(interaction.guild, template_name, template_options, interaction.user.id)
 
         # Send confirmation
         await interaction.followup.send(
@@ -627,22 +681,23 @@ async def setup_ticket(interaction: discord.Interaction):
 
     try:
         # Create ticket category if it doesn't exist
-        ticket_category = discord.utils.get(interaction.guild.categories, name="🎫 Support Tickets")
+        index = guild_indexes.get(interaction.guild)
+        ticket_category = index.get_category("🎫 Support Tickets")
         if not ticket_category:
-            ticket_category = await interaction.guild.create_category(
+            ticket_category = await rest_scheduler.call(interaction.guild.id, INTERACTIVE, lambda: interaction.guild.create_category(
                 name="🎫 Support Tickets",
                 reason="ServerSetup Bot Ticket System"
-            )
+            ))
 
         # Create ticket channel if it doesn't exist
-        ticket_channel = discord.utils.get(ticket_category.channels, name="create-ticket")
+        ticket_channel = index.get_channel(ticket_category.id, "create-ticket")
         if not ticket_channel:
-            ticket_channel = await interaction.guild.create_text_channel(
+            ticket_channel = await rest_scheduler.call(interaction.guild.id, INTERACTIVE, lambda: interaction.guild.create_text_channel(
                 name="create-ticket",
                 category=ticket_category,
                 topic="Create a support ticket here",
                 reason="ServerSetup Bot Ticket System"
-            )
+            ))
 
         class TicketButton(discord.ui.View):
             def __init__(self):
@@ -672,7 +727,7 @@ async def setup_ticket(interaction: discord.Interaction):
                         channel_name = f"ticket-{interaction.user.name.lower()}"
 
                         # Set up permissions
-                        staff_role = discord.utils.get(interaction.guild.roles, name="Staff")
+                        staff_role = guild_indexes.get(interaction.guild).get_role("Staff")
                         overwrites = {
                             interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
                             interaction.guild.me: discord.PermissionOverwrite(read_messages=True),
@@ -683,11 +738,11 @@ async def setup_ticket(interaction: discord.Interaction):
 
                         # Create the ticket channel
                         try:
-                            ticket_channel = await interaction.guild.create_text_channel(
+                            ticket_channel = await rest_scheduler.call(interaction.guild.id, INTERACTIVE, lambda: interaction.guild.create_text_channel(
                                 name=channel_name,
                                 overwrites=overwrites,
                                 reason=f"Ticket created by {interaction.user}"
-                            )
+                            ))
 
                             # Create ticket embed
                             embed = discord.Embed(
@@ -700,9 +755,12 @@ async def setup_ticket(interaction: discord.Interaction):
                                 embed.add_field(name="Reported User", value=self.reported_user.value, inline=False)
                             embed.add_field(name="Reason", value=self.ticket_reason.value, inline=False)
 
-                            await ticket_channel.send(embed=embed)
+                            await rest_scheduler.call(interaction.guild.id, INTERACTIVE, lambda: ticket_channel.send(embed=embed))
                             if staff_role:
-                                await ticket_channel.send(f"{staff_role.mention} A new ticket has been created.")
+                                await rest_scheduler.call(
+                                    interaction.guild.id, INTERACTIVE,
+                                    lambda: ticket_channel.send(f"{staff_role.mention} A new ticket has been created.")
+                                )
 
                             await modal_interaction.response.send_message(
                                         f"Ticket created! Please check {ticket_channel.mention}",
@@ -725,7 +783,7 @@ async def setup_ticket(interaction: discord.Interaction):
         embed.set_footer(text=f"{interaction.guild.name} • Support Tickets")
 
         # Send the embed with the button
-        await ticket_channel.send(embed=embed, view=TicketButton())
+        await rest_scheduler.call(interaction.guild.id, INTERACTIVE, lambda: ticket_channel.send(embed=embed, view=TicketButton()))
         await interaction.followup.send("Ticket system has been set up successfully!", ephemeral=True)
 
     except Exception as e:
@@ -733,87 +791,105 @@ async def setup_ticket(interaction: discord.Interaction):
         await interaction.followup.send(f"Error setting up ticket system: {str(e)}", ephemeral=True)
 
 
-@bot.tree.command(name="preview", description="Preview a server template before applying it")
-@app_commands.describe(template_name="The name of the template to preview")
-async def preview_template(interaction: discord.Interaction, template_name: str):
-    """Preview a server template before applying it."""
-    try:
-        from app import app
-        with app.app_context():
-            # Get template preview information and track view analytics
-            preview_data = template_manager.generate_preview(
-                template_name,
-                user_id=interaction.user.id,
-                guild_id=interaction.guild.id if interaction.guild else None
-            )
+def build_preview_embed(template_name: str):
+    """Build the /preview embed for a template, or None if it doesn't exist."""
+    preview_data = template_manager.generate_preview(template_name)
+    if "error" in preview_data:
+        return None
 
-        if "error" in preview_data:
-            await interaction.response.send_message(preview_data["error"], ephemeral=True)
-            return
+    # Create embed for template overview
+    overview_embed = discord.Embed(
+        title=f"📋 {preview_data['name'].title()} Template Preview",
+        description=preview_data['description'],
+        color=discord.Color.blue()
+    )
 
-        # Create embed for template overview
-        overview_embed = discord.Embed(
-            title=f"📋 {preview_data['name'].title()} Template Preview",
-            description=preview_data['description'],
-            color=discord.Color.blue()
-        )
+    # Set thumbnail if available
+    if preview_data.get('image_url'):
+        overview_embed.set_thumbnail(url=preview_data['image_url'])
+
+    # Add summary stats
+    overview_embed.add_field(
+        name="Summary",
+        value=f"🧩 **{preview_data['category_count']}** Categories\n" +
+              f"📝 **{preview_data['channel_count']}** Channels\n" +
+              f"👑 **{preview_data['role_count']}** Roles",
+        inline=False
+    )
 
-        # Set thumbnail if available
-        if preview_data.get('image_url'):
-            overview_embed.set_thumbnail(url=preview_data['image_url'])
+    # Add roles information
+    roles_text = ""
+    for role in preview_data['roles'][:10]:  # Limit to 10 roles to avoid oversized embeds
+        color_hex = role['color']
+        permissions = ", ".join(role['key_permissions']) if role['key_permissions'] else "No special permissions"
+        roles_text += f"**{role['name']}** - {permissions}\n"
 
-        # Add summary stats
-        overview_embed.add_field(
-            name="Summary",
-            value=f"🧩 **{preview_data['category_count']}** Categories\n" +
-                  f"📝 **{preview_data['channel_count']}** Channels\n" +
-                  f"👑 **{preview_data['role_count']}** Roles",
-            inline=False
-        )
+    if len(preview_data['roles']) > 10:
+        roles_text += f"*...and {len(preview_data['roles']) - 10} more roles*\n"
+
+    overview_embed.add_field(name="📊 Roles", value=roles_text or "No roles defined", inline=False)
 
-        # Add roles information
-        roles_text = ""
-        for role in preview_data['roles'][:10]:  # Limit to 10 roles to avoid oversized embeds
-            color_hex = role['color']
-            permissions = ", ".join(role['key_permissions']) if role['key_permissions'] else "No special permissions"
-            roles_text += f"**{role['name']}** - {permissions}\n"
+    # Add first few categories and channels preview
+    categories_text = ""
+    for i, category in enumerate(preview_data['categories'][:5]):  # Limit to 5 categories
+        categories_text += f"**{category['name']}**\n"
 
-        if len(preview_data['roles']) > 10:
-            roles_text += f"*...and {len(preview_data['roles']) - 10} more roles*\n"
+        # Add first few channels from this category
+        channel_list = []
+        for channel in category['channels'][:5]:  # Limit to 5 channels per category
+            # Add an emoji based on channel type
+            emoji = "🔊" if channel['type'] == "voice" else "📋" if channel['type'] == "forum" else "#️⃣"
+            channel_list.append(f"{emoji} {channel['name']}")
 
-        overview_embed.add_field(name="📊 Roles", value=roles_text or "No roles defined", inline=False)
+        if channel_list:
+            categories_text += "  " + "\n  ".join(channel_list) + "\n"
 
-        # Add first few categories and channels preview
-        categories_text = ""
-        for i, category in enumerate(preview_data['categories'][:5]):  # Limit to 5 categories
-            categories_text += f"**{category['name']}**\n"
+        # If there are more channels, add a note
+        if len(category['channels']) > 5:
+            categories_text += f"  *...and {len(category['channels']) - 5} more channels*\n"
 
-            # Add first few channels from this category
-            channel_list = []
-            for channel in category['channels'][:5]:  # Limit to 5 channels per category
-                # Add an emoji based on channel type
-                emoji = "🔊" if channel['type'] == "voice" else "📋" if channel['type'] == "forum" else "#️⃣"
-                channel_list.append(f"{emoji} {channel['name']}")
+    # If there are more categories, add a note
+    if len(preview_data['categories']) > 5:
+        categories_text += f"*...and {len(preview_data['categories']) - 5} more categories*\n"
 
-            if channel_list:
-                categories_text += "  " + "\n  ".join(channel_list) + "\n"
+    overview_embed.add_field(name="📂 Categories & Channels", value=categories_text or"No categories defined", inline=False)
 
-            # If there are more channels, add a note
-            if len(category['channels']) > 5:
-                categories_text += f"  *...and {len(category['channels']) - 5} more channels*\n"
+    # Add a footer with instructions
+    overview_embed.set_footer(text=f"Use the /{template_name.lower()} command to apply this template to yourserver")
 
-        # If there are more categories, add a note
-        if len(preview_data['categories']) > 5:
-            categories_text += f"*...and {len(preview_data['categories']) - 5} more categories*\n"
+    return overview_embed
 
-        overview_embed.add_field(name="📂 Categories & Channels", value=categories_text or"No categories defined", inline=False)
+@bot.tree.command(name="preview", description="Preview a server template before applying it")
+@app_commands.describe(template_name="The name of the template to preview")
+@app_commands.autocomplete(template_name=template_name_autocomplete)
+async def preview_template(interaction: discord.Interaction, template_name: str):
+    """Preview a server template before applying it."""
+    try:
+        # Loads an approved user template off the event loop, so the digest and render below find it compiled
+        if await template_manager.load_plan(template_name) is None:
+            await interaction.response.send_message(f"Template '{template_name}' not found", ephemeral=True)
+            return
 
-        # Add a footer with instructions
-        overview_embed.set_footer(text=f"Use the /{template_name.lower()} command to apply this template to yourserver")
+        overview_embed = render_cache.get_or_render(
+            ("preview", template_name),
+            template_manager.get_template_digest(template_name),
+            lambda: build_preview_embed(template_name)
+        )
+        if overview_embed is None:
+            await interaction.response.send_message(f"Template '{template_name}' not found", ephemeral=True)
+            return
 
         # Send the preview embed
         await interaction.response.send_message(embed=overview_embed)
 
+        # Track the view; the embed itself may have come from the cache. This never waits on the
+        # analytics queue, so a slow database can't delay the response
+        analytics_service.track_template_view_nowait(
+            template_name,
+            interaction.user.id,
+            interaction.guild.id if interaction.guild else None
+        )
+
     except Exception as e:
         logger.error(f"Error generating template preview: {e}")
         await interaction.response.send_message(f"Error generating preview: {str(e)}", ephemeral=True)
@@ -829,9 +905,7 @@ async def promohub(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
 
     try:
-        from app import app
-        with app.app_context():
-            await template_manager.apply_template(interaction.guild, "promohub", user_id=interaction.user.id)
+        await queue_template_apply(interaction.guild, "promohub", user_id=interaction.user.id)
 
         # Success message with preview tip
         await interaction.followup.send(
@@ -854,9 +928,7 @@ async def serverhub(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
 
     try:
-        from app import app
-        with app.app_context():
-            await template_manager.apply_template(interaction.guild, "serverhub", user_id=interaction.user.id)
+        await queue_template_apply(interaction.guild, "serverhub", user_id=interaction.user.id)
 
         # Success message with preview tip
         await interaction.followup.send(
@@ -895,7 +967,7 @@ async def backup_command(interaction: discord.Interaction):
         # Add statistics
         embed.add_field(
             name="Backup Statistics",
-            value=f"Roles: {len(backup['roles'])}\nCategories: {len(backup['categories'])}\nTotal Channels: {sum(len(category['channels']) for category in backup['categories'])}",
+            value=f"Roles: {backup['role_count']}\nCategories: {backup['category_count']}\nTotal Channels: {backup['channel_count']}",
             inline=False
         )
 
@@ -905,7 +977,7 @@ async def backup_command(interaction: discord.Interaction):
             inline=False
         )
 
-        embed.set_footer(text=f"Backup ID: {interaction.guild.id}_{discord.utils.utcnow().strftime('%Y%m%d_%H%M%S')}")
+        embed.set_footer(text=f"Backup ID: {backup['id']}")
 
         await interaction.followup.send(embed=embed, ephemeral=True)
 
@@ -913,6 +985,57 @@ async def backup_command(interaction: discord.Interaction):
         logger.error(f"Error creating server backup: {e}")
         await interaction.followup.send(f"Error creating server backup: {str(e)}", ephemeral=True)
 
+async def backup_id_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest the server's backups, newest first."""
+    if not interaction.guild:
+        return []
+    choices = []
+    for record in template_manager.backups.list_backups(interaction.guild.id, limit=25):
+        created_at = datetime.strptime(record['created_at'], '%Y%m%d_%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+        label = (f"{created_at} UTC · {record['role_count']} roles, {record['category_count']} categories, "
+                 f"{record['channel_count']} channels")
+        if current.lower() in label.lower() or current in record['backup_id']:
+            choices.append(app_commands.Choice(name=label[:100], value=record['backup_id']))
+    return choices
+
+@bot.tree.command(name="restore", description="Restore your server's structure from a backup")
+@app_commands.describe(backup_id="The backup to restore (default: the most recent one)")
+@app_commands.autocomplete(backup_id=backup_id_autocomplete)
+async def restore_command(interaction: discord.Interaction, backup_id: str = None):
+    """Restores missing and changed roles, categories and channels from a backup."""
+    if not interaction.guild or interaction.user.id != interaction.guild.owner_id:
+        await interaction.response.send_message("This command can only be used by the server owner!", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+
+    try:
+        plan = await template_manager.load_backup_plan(interaction.guild.id, backup_id)
+        if not plan:
+            await interaction.followup.send("No matching backup of this server was found. Use `/backup` to create one.", ephemeral=True)
+            return
+
+        # Only what is missing or differs from the backup is recreated or edited
+        await queue_template_apply(interaction.guild, plan.name, {'repair': True}, interaction.user.id)
+
+        embed = discord.Embed(
+            title="Server Restored",
+            description=f"**{interaction.guild.name}** has been restored from backup `{plan.name[len(BACKUP_PLAN_PREFIX):]}`.",
+            color=discord.Color.green()
+        )
+        embed.add_field(
+            name="Backup Contents",
+            value=f"Roles: {plan.role_count}\nCategories: {plan.category_count}\nTotal Channels: {plan.channel_count}",
+            inline=False
+        )
+        embed.set_footer(text="Roles and channels added since the backup were left in place.")
+
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    except Exception as e:
+        logger.error(f"Error restoring server backup: {e}")
+        await interaction.followup.send(f"Error restoring server backup: {str(e)}", ephemeral=True)
+
 @bot.tree.command(name="submit-template", description="Submit your server as a template for others to use")
 @app_commands.describe(
     name="A name for your template",
@@ -934,14 +1057,14 @@ async def submit_template_command(interaction: discord.Interaction,
         # Create a backup of the server to use as the template
         backup = await template_manager.backup_server(interaction.guild)
 
-        # Modify the backup with the template metadata
-        template_data = backup.copy()
+        # Modify the backup with the template metadata; a submission stores the whole template
+        template_data = await asyncio.to_thread(template_manager.backups.load, backup['id'])
         template_data["name"] = name
         template_data["description"] = description
         template_data["category"] = category
 
         # Submit the template
-        success = template_manager.submit_template(interaction.user.id, template_data)
+        success = await asyncio.to_thread(template_manager.submit_template, interaction.user.id, template_data)
 
         if success:
             embed = discord.Embed(
@@ -974,11 +1097,21 @@ async def submit_template_command(interaction: discord.Interaction,
 
 
 
-# Create commands for all server templates
-for template_name in template_manager.get_template_names():
+# Commands with a hand-written implementation above; never generated from the catalog
+EXPLICIT_TEMPLATE_COMMANDS = ["serverhub", "promohub"]
+
+# Global command IDs by name, used to update single commands instead of re-syncing all of them
+synced_command_ids = {}
+
+def register_template_command(template_name: str) -> bool:
+    """Add the slash command for a catalog template to the command tree.
+
+    Returns:
+        bool: True if a command was added
+    """
     # Skip serverhub and promohub as they're already defined explicitly above
-    if template_name.lower() in ["serverhub", "promohub"]:
-        continue
+    if template_name.lower() in EXPLICIT_TEMPLATE_COMMANDS:
+        return False
 
     @bot.tree.command(name=template_name.lower(), description=f"Create a {template_name} server template")
     @app_commands.checks.has_permissions(administrator=True)
@@ -990,18 +1123,54 @@ for template_name in template_manager.get_template_names():
         await interaction.response.defer(ephemeral=True)
 
         try:
-            from app import app
-            with app.app_context():
-                await template_manager.apply_template(
-                    interaction.guild,
-                    template_name,
-                    user_id=interaction.user.id
-                )
-                await interaction.followup.send(f"Successfully applied the {template_name} template!", ephemeral=True)
+            await queue_template_apply(interaction.guild, template_name, user_id=interaction.user.id)
+            await interaction.followup.send(f"Successfully applied the {template_name} template!", ephemeral=True)
         except Exception as e:
             logger.error(f"Error applying {template_name} template: {e}")
             await interaction.followup.send(f"Error applying {template_name} template: {str(e)}", ephemeral=True)
 
+    return True
+
+async def sync_template_commands(changes: dict):
+    """Register and remove template commands after the catalog was reloaded.
+
+    Only added and removed templates touch Discord: each is upserted or deleted
+    on its own, so the rest of the command list is left alone. Changed templates
+    need nothing, since their commands look the template up when invoked.
+    """
+    if not bot.application_id:
+        return
+
+    for template_name in changes['removed']:
+        name = template_name.lower()
+        if name in EXPLICIT_TEMPLATE_COMMANDS or not bot.tree.remove_command(name):
+            continue
+        command_id = synced_command_ids.pop(name, None)
+        if command_id:
+            try:
+                await bot.http.delete_global_command(bot.application_id, command_id)
+                logger.info(f"Removed command /{name}")
+            except discord.HTTPException as e:
+                logger.error(f"Failed to remove command /{name}: {e}")
+
+    for template_name in changes['added']:
+        name = template_name.lower()
+        if bot.tree.get_command(name) or not register_template_command(template_name):
+            continue
+        try:
+            data = await bot.http.upsert_global_command(bot.application_id, bot.tree.get_command(name).to_dict(bot.tree))
+            synced_command_ids[name] = int(data['id'])
+            logger.info(f"Registered command /{name}")
+        except discord.HTTPException as e:
+            logger.error(f"Failed to register command /{name}: {e}")
+
+# Create commands for all server templates
+for template_name in template_manager.get_template_names():
+    register_template_command(template_name)
+
+template_manager.reload_listeners.append(sync_template_commands)
+template_manager.reload_listeners.append(render_cache.invalidate)
+
 # Add a decorator for rate limiting and error handling
 def rate_limit_and_handle_errors():
     """Decorator to handle rate limiting and errors for commands."""
@@ -1134,6 +1303,9 @@ def start_bot():
                         retry_delay *= 2  # Exponential backoff
                     else:
                         logger.critical("Maximum retry attempts reached. Bot is shutting down.")
+
+            # Write analytics events still queued when the bot's event loop stopped
+            analytics_service.close_sync()
         else:
             logger.error("No Discord token found! Bot cannot start.")
 
@@ -1187,7 +1359,7 @@ def get_cooldown(command_name: str) -> int:
 
     if command_name in ["customize", "gaming", "community", "content", "serverhub", "promohub"]:
         return cooldowns["template"]
-    elif command_name == "backup":
+    elif command_name in ["backup", "restore"]:
         return cooldowns["backup"]
     elif command_name == "ai-template":
         return cooldowns["ai"]
@@ -1196,5 +1368,6 @@ def get_cooldown(command_name: str) -> int:
 if __name__ == "__main__":
     if TOKEN:
         bot.run(TOKEN)
+        analytics_service.close_sync()
     else:
         logger.error("No Discord token found! Bot cannot start.")
\ No newline at end of file
@@ -1,10 +1,10 @@
-from app import db
+from app import db, init_db
 from datetime import datetime
 
 class TemplateUsage(db.Model):
     """Model to track template usage statistics"""
     id = db.Column(db.Integer, primary_key=True)
-    template_name = db.Column(db.String(100), nullable=False, index=True)
+    template_name = db.Column(db.String(100), nullable=False)
     guild_id = db.Column(db.BigInteger, nullable=False)
     guild_name = db.Column(db.String(100), nullable=True)
     user_id = db.Column(db.BigInteger, nullable=False)
@@ -12,6 +12,14 @@ class TemplateUsage(db.Model):
     is_ai_generated = db.Column(db.Boolean, default=False)
     customization_options = db.Column(db.JSON, nullable=True)
     success = db.Column(db.Boolean, default=True)
+
+    # Retention deletes by timestamp; lookups are per template, guild or user within a time range
+    __table_args__ = (
+        db.Index('ix_template_usage_timestamp', 'timestamp'),
+        db.Index('ix_template_usage_template_timestamp', 'template_name', 'timestamp'),
+        db.Index('ix_template_usage_guild_timestamp', 'guild_id', 'timestamp'),
+        db.Index('ix_template_usage_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     def __repr__(self):
         return f"<TemplateUsage {self.template_name} by {self.user_id} at {self.timestamp}>"
@@ -34,10 +42,66 @@ class TemplateAnalytics(db.Model):
 class TemplateView(db.Model):
     """Model to track template preview/view statistics"""
     id = db.Column(db.Integer, primary_key=True)
-    template_name = db.Column(db.String(100), nullable=False, index=True)
+    template_name = db.Column(db.String(100), nullable=False)
     user_id = db.Column(db.BigInteger, nullable=False)
     guild_id = db.Column(db.BigInteger, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_template_view_timestamp', 'timestamp'),
+        db.Index('ix_template_view_template_timestamp', 'template_name', 'timestamp'),
+        db.Index('ix_template_view_guild_timestamp', 'guild_id', 'timestamp'),
+        db.Index('ix_template_view_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     def __repr__(self):
         return f"<TemplateView {self.template_name} by {self.user_id} at {self.timestamp}>"
+
+class TemplateSketch(db.Model):
+    """Model to store HyperLogLog sketches of the distinct guilds and users applying a template"""
+    id = db.Column(db.Integer, primary_key=True)
+    template_name = db.Column(db.String(100), nullable=False)
+    # 'all' for the all-time sketch, or a day as YYYY-MM-DD
+    period = db.Column(db.String(10), nullable=False)
+    # 'guilds' or 'users'
+    kind = db.Column(db.String(10), nullable=False)
+    registers = db.Column(db.LargeBinary, nullable=False)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('template_name', 'period', 'kind'),)
+
+    def __repr__(self):
+        return f"<TemplateSketch {self.template_name} {self.kind} for {self.period}>"
+
+class TemplateRollup(db.Model):
+    """Model to store template view and usage counts per hour and per day"""
+    id = db.Column(db.Integer, primary_key=True)
+    template_name = db.Column(db.String(100), nullable=False)
+    # 'hour' or 'day'
+    resolution = db.Column(db.String(4), nullable=False)
+    # Start of the hour or day the counts cover
+    bucket = db.Column(db.DateTime, nullable=False)
+    views = db.Column(db.Integer, default=0)
+    total_uses = db.Column(db.Integer, default=0)
+    successful_uses = db.Column(db.Integer, default=0)
+    failed_uses = db.Column(db.Integer, default=0)
+    ai_generated_uses = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('template_name', 'resolution', 'bucket'),
+        db.Index('ix_template_rollup_bucket', 'resolution', 'bucket'),
+    )
+
+    def __repr__(self):
+        return f"<TemplateRollup {self.template_name} {self.resolution} of {self.bucket}>"
+
+class AnalyticsBackfill(db.Model):
+    """Model to record one-off analytics backfills, so each runs exactly once across processes"""
+    name = db.Column(db.String(50), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AnalyticsBackfill {self.name} at {self.applied_at}>"
+
+# Create the tables now that every model is defined
+init_db()
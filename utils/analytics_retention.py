@@ -0,0 +1,226 @@
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from typing import Dict, List, Iterable, Optional, Tuple
+from sqlalchemy import Table, select, delete, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+logger = logging.getLogger(__name__)
+
+# Column raw event tables are partitioned on
+PARTITION_COLUMN = 'timestamp'
+
+# TemplateRollup.resolution of hourly rows
+HOURLY_RESOLUTION = 'hour'
+
+# TemplateSketch.period of the all-time sketches, which are never pruned
+ALL_TIME_PERIOD = 'all'
+
+# Monthly partitions are named {table}_pYYYYMM
+_PARTITION_NAME = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+@dataclass(frozen=True)
+class EventRetention:
+    """How long raw analytics events, hourly rollups and daily sketches are kept.
+
+    Every event is already counted in the daily and hourly rollups and the
+    sketches when it is written, so raw events older than raw_days are simply
+    deleted, and hourly rollups older than hourly_days are deleted in favour
+    of the daily rows that cover the same hours; period queries read whole
+    days, so they only need the daily rows. Daily sketches older than sketch_days are deleted; the all-time
+    sketches keep counting their guilds and users, but unique counts over
+    periods reaching further back only cover the retained days.
+    """
+    raw_days: int = 90
+    hourly_days: int = 90
+    sketch_days: int = 90
+    batch_size: int = 5000
+
+    @classmethod
+    def from_env(cls) -> 'EventRetention':
+        """Read the policy from ANALYTICS_RAW_RETENTION_DAYS, ANALYTICS_HOURLY_RETENTION_DAYS
+        and ANALYTICS_SKETCH_RETENTION_DAYS."""
+        defaults = cls()
+        return cls(
+            raw_days=int(os.environ.get('ANALYTICS_RAW_RETENTION_DAYS', defaults.raw_days)),
+            hourly_days=int(os.environ.get('ANALYTICS_HOURLY_RETENTION_DAYS', defaults.hourly_days)),
+            sketch_days=int(os.environ.get('ANALYTICS_SKETCH_RETENTION_DAYS', defaults.sketch_days))
+        )
+
+
+def partitioning_enabled(engine) -> bool:
+    """Whether raw event tables should be partitioned: PostgreSQL with ANALYTICS_PARTITIONING=1."""
+    return engine.dialect.name == 'postgresql' and os.environ.get('ANALYTICS_PARTITIONING') == '1'
+
+
+def _month_start(moment: datetime, months_later: int = 0) -> datetime:
+    month = moment.year * 12 + moment.month - 1 + months_later
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def _is_partitioned(connection, table: Table) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name"
+    ), {'name': table.name}).first() is not None
+
+
+def _partitions(connection, table: Table) -> List[Tuple[str, datetime]]:
+    """Monthly partitions of a table, as (name, month start), oldest first."""
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name"
+    ), {'name': table.name})
+    partitions = []
+    for (name,) in rows:
+        match = _PARTITION_NAME.search(name)
+        if match:
+            partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partitioned_tables(engine, tables: Iterable[Table]) -> None:
+    """Create raw event tables as PostgreSQL tables partitioned by month, if they don't exist yet.
+
+    Call before create_all, which then skips them. Existing unpartitioned
+    tables are left alone. The primary key becomes (id, timestamp), since
+    PostgreSQL requires it to include the partition column.
+    """
+    if not partitioning_enabled(engine):
+        return
+    with engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in tables:
+            if engine.dialect.has_table(connection, table.name):
+                continue
+            columns = [str(CreateColumn(column).compile(dialect=connection.dialect)) for column in table.columns]
+            connection.execute(text(
+                f"CREATE TABLE {preparer.quote(table.name)} ({', '.join(columns)}, "
+                f"PRIMARY KEY (id, {preparer.quote(PARTITION_COLUMN)})) "
+                f"PARTITION BY RANGE ({preparer.quote(PARTITION_COLUMN)})"
+            ))
+            # Catches rows outside every monthly partition, so inserts never fail
+            connection.execute(text(
+                f"CREATE TABLE {preparer.quote(table.name + '_default')} PARTITION OF {preparer.quote(table.name)} DEFAULT"
+            ))
+            logger.info(f"Created {table.name} partitioned by month")
+    ensure_partitions(engine, tables)
+
+
+def ensure_partitions(engine, tables: Iterable[Table], months_ahead: int = 2) -> int:
+    """Create the monthly partitions for this month and the next months_ahead, where missing.
+
+    Returns:
+        Number of partitions created
+    """
+    if not partitioning_enabled(engine):
+        return 0
+    created = 0
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in tables:
+            if not _is_partitioned(connection, table):
+                continue
+            existing = {start for _, start in _partitions(connection, table)}
+            for offset in range(months_ahead + 1):
+                start = _month_start(now, offset)
+                if start in existing:
+                    continue
+                name = f"{table.name}_p{start:%Y%m}"
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {preparer.quote(name)} PARTITION OF {preparer.quote(table.name)} "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{_month_start(start, 1):%Y-%m-%d}')"
+                ))
+                created += 1
+    return created
+
+
+def ensure_indexes(engine, tables: Iterable[Table]) -> None:
+    """Create the indexes declared on tables that already existed, which create_all doesn't add."""
+    with engine.begin() as connection:
+        for table in tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _delete_in_batches(session, table: Table, condition, batch_size: int) -> int:
+    """Delete matching rows a batch at a time, committing after each, so locks are held briefly.
+
+    Returns:
+        Number of rows deleted
+    """
+    deleted = 0
+    while True:
+        ids = session.execute(select(table.c.id).where(condition).limit(batch_size)).scalars().all()
+        if not ids:
+            return deleted
+        session.execute(delete(table).where(table.c.id.in_(ids)))
+        session.commit()
+        deleted += len(ids)
+
+
+def _drop_expired_partitions(session, table: Table, cutoff: datetime) -> int:
+    """Drop monthly partitions that end before the cutoff, which is far cheaper than deleting their rows.
+
+    Returns:
+        Number of partitions dropped
+    """
+    connection = session.connection()
+    if not _is_partitioned(connection, table):
+        return 0
+    preparer = connection.dialect.identifier_preparer
+    dropped = 0
+    for name, start in _partitions(connection, table):
+        if _month_start(start, 1) > cutoff:
+            break
+        connection.execute(text(f"DROP TABLE {preparer.quote(name)}"))
+        dropped += 1
+    session.commit()
+    return dropped
+
+
+def compact_events(session, event_tables: Iterable[Table], rollup_table: Table, sketch_table: Table,
+                   policy: EventRetention, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Apply the retention policy to raw events, hourly rollups and daily sketches.
+
+    Args:
+        session: The SQLAlchemy session to delete through; committed per batch
+        event_tables: Raw event tables, each with id and timestamp columns
+        rollup_table: The rollup table, with resolution and bucket columns
+        sketch_table: The sketch table, with a period column of YYYY-MM-DD days
+        policy: How long to keep raw events, hourly rollups and daily sketches
+        now: Current time, defaults to utcnow
+
+    Returns:
+        Counts of 'deleted_events', 'dropped_partitions', 'deleted_hourly_rollups'
+        and 'deleted_daily_sketches'
+    """
+    now = now or datetime.utcnow()
+    counts = {'deleted_events': 0, 'dropped_partitions': 0, 'deleted_hourly_rollups': 0, 'deleted_daily_sketches': 0}
+
+    event_cutoff = now - timedelta(days=policy.raw_days)
+    for table in event_tables:
+        if session.get_bind().dialect.name == 'postgresql':
+            counts['dropped_partitions'] += _drop_expired_partitions(session, table, event_cutoff)
+        counts['deleted_events'] += _delete_in_batches(
+            session, table, table.c[PARTITION_COLUMN] < event_cutoff, policy.batch_size
+        )
+
+    # Whole days only, so a day never has hourly rows for only part of it
+    hourly_cutoff = (now - timedelta(days=policy.hourly_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    counts['deleted_hourly_rollups'] = _delete_in_batches(
+        session, rollup_table,
+        (rollup_table.c.resolution == HOURLY_RESOLUTION) & (rollup_table.c.bucket < hourly_cutoff),
+        policy.batch_size
+    )
+
+    sketch_cutoff = (now - timedelta(days=policy.sketch_days)).strftime('%Y-%m-%d')
+    counts['deleted_daily_sketches'] = _delete_in_batches(
+        session, sketch_table,
+        (sketch_table.c.period != ALL_TIME_PERIOD) & (sketch_table.c.period < sketch_cutoff),
+        policy.batch_size
+    )
+    return counts
@@ -1,18 +1,103 @@
+import asyncio
 import logging
-from datetime import datetime
-from models import TemplateUsage, TemplateAnalytics, TemplateView
-from app import db
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Iterable, Iterator, Set, Tuple
+from sqlalchemy import insert, select, update, func, and_, text
+from sqlalchemy.exc import IntegrityError
+from models import TemplateUsage, TemplateAnalytics, TemplateView, TemplateSketch, TemplateRollup, AnalyticsBackfill
+from app import app, db
+from utils.analytics_writer import AnalyticsWriter, Event, VIEW, USAGE
+from utils.analytics_upsert import dialect_insert, coalesce_rows, upsert_increments
+from utils.analytics_retention import EventRetention, compact_events, ensure_partitions
+from utils.hyperloglog import HyperLogLog
 
 logger = logging.getLogger(__name__)
 
+# TemplateSketch.period of the sketches covering all time
+ALL_TIME = 'all'
+
+# TemplateSketch.kind, and the usage column each kind counts distinct values of
+SKETCH_COLUMNS = {'guilds': 'guild_id', 'users': 'user_id'}
+
+# TemplateRollup.resolution values
+HOUR = 'hour'
+DAY = 'day'
+
+ROLLUP_COUNTERS = ('views', 'total_uses', 'successful_uses', 'failed_uses', 'ai_generated_uses')
+
+# Rollup rows per upsert statement, keeping well under SQLite's bound parameter limit
+ROLLUP_CHUNK_SIZE = 1000
+
+
+def _rollup_rows(views: Iterable[Dict[str, Any]], usages: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Turn events into TemplateRollup increments, one per resolution per event."""
+    def rows(template_name, timestamp, **counters):
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        for resolution, bucket in ((HOUR, hour), (DAY, hour.replace(hour=0))):
+            row = {'template_name': template_name, 'resolution': resolution, 'bucket': bucket}
+            row.update({counter: counters.get(counter, 0) for counter in ROLLUP_COUNTERS})
+            yield row
+
+    for view in views:
+        yield from rows(view['template_name'], view['timestamp'], views=1)
+    for usage in usages:
+        yield from rows(
+            usage['template_name'], usage['timestamp'],
+            total_uses=1,
+            successful_uses=1 if usage['success'] else 0,
+            failed_uses=0 if usage['success'] else 1,
+            ai_generated_uses=1 if usage['is_ai_generated'] else 0
+        )
+
+
+def _period_start(period_days: int) -> datetime:
+    """Start of a period of period_days whole UTC days, including today.
+
+    Counters and unique counts both use this boundary, so they always
+    describe the same interval; daily sketches can't split a day, so the
+    window can't start part way through one.
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=period_days - 1)
+
+
+def _period_filter(period_days: int):
+    """Select the rollup rows covering the last period_days days, one daily row per day per template."""
+    return and_(TemplateRollup.resolution == DAY, TemplateRollup.bucket >= _period_start(period_days))
+
+
+def _rollup_totals():
+    """Summed rollup counters, labelled like the TemplateAnalytics columns."""
+    return [func.coalesce(func.sum(getattr(TemplateRollup, counter)), 0).label(counter) for counter in ROLLUP_COUNTERS]
+
+
 class AnalyticsService:
     """Service for tracking template usage analytics"""
 
-    @staticmethod
-    def track_template_usage(template_name, guild_id, guild_name, user_id, is_ai_generated=False, 
-                             customization_options=None, success=True):
+    def __init__(self, daily_sketches=True):
+        """Initialize the service.
+
+        Args:
+            daily_sketches: Also keep a distinct-count sketch per template per day,
+                so unique guilds and users can be counted over recent periods
+        """
+        self.daily_sketches = daily_sketches
+        # Events are buffered and written in batches by a background task
+        self.writer = AnalyticsWriter(self._write_batch)
+        self.event_retention = EventRetention.from_env()
+        # Raw events may only be deleted once every one of them is counted in the rollups and sketches;
+        # the backfills run in the background once the bot is ready, never on import
+        self.backfilled = False
+        self._backfill_lock = threading.Lock()
+
+    async def track_template_usage(self, template_name, guild_id, guild_name, user_id, is_ai_generated=False,
+                                   customization_options=None, success=True):
         """Track template usage
 
+        The event is queued and written in the background; this only waits
+        if the queue is full.
+
         Args:
             template_name: Name of the template used
             guild_id: Discord guild ID where template was applied
@@ -22,68 +107,343 @@ class AnalyticsService:
             customization_options: Dict of customization options used
             success: Whether the template application was successful
         """
-        try:
-            # Record the usage event
-            usage = TemplateUsage(
-                template_name=template_name,
-                guild_id=guild_id,
-                guild_name=guild_name,
-                user_id=user_id,
-                is_ai_generated=is_ai_generated,
-                customization_options=customization_options,
-                success=success
-            )
-            db.session.add(usage)
+        await self.writer.put(USAGE, {
+            'template_name': template_name,
+            'guild_id': guild_id,
+            'guild_name': guild_name,
+            'user_id': user_id,
+            'is_ai_generated': is_ai_generated,
+            'customization_options': customization_options,
+            'success': success
+        })
 
-            # Update or create template analytics
-            analytics = TemplateAnalytics.query.filter_by(template_name=template_name).first()
-            if not analytics:
-                analytics = TemplateAnalytics(template_name=template_name)
-                db.session.add(analytics)
+    async def track_template_view(self, template_name, user_id, guild_id=None):
+        """Track template view/preview
 
-            # Safely update statistics by treating None as 0
-            analytics.total_uses = (analytics.total_uses or 0) + 1
+        The event is queued and written in the background; this only waits
+        if the queue is full.
 
-            if success:
-                analytics.successful_uses = (analytics.successful_uses or 0) + 1
-            else:
-                analytics.failed_uses = (analytics.failed_uses or 0) + 1
+        Args:
+            template_name: Name of the template viewed
+            user_id: Discord user ID who viewed the template
+            guild_id: Discord guild ID where template was viewed (optional)
+        """
+        await self.writer.put(VIEW, self._view_row(template_name, user_id, guild_id))
 
-            if is_ai_generated:
-                analytics.ai_generated_uses = (analytics.ai_generated_uses or 0) + 1
+    def track_template_view_nowait(self, template_name, user_id, guild_id=None):
+        """Track template view/preview from synchronous code, dropping the event if the queue is full."""
+        self.writer.put_nowait(VIEW, self._view_row(template_name, user_id, guild_id))
 
-            analytics.last_updated = datetime.utcnow()
+    @staticmethod
+    def _view_row(template_name, user_id, guild_id) -> Dict[str, Any]:
+        return {'template_name': template_name, 'user_id': user_id, 'guild_id': guild_id}
 
-            # Commit the changes
-            db.session.commit()
-            logger.info(f"Tracked usage of template '{template_name}' by user {user_id} in guild {guild_id}")
+    def _write_batch(self, events: List[Event]) -> None:
+        """Bulk insert a batch of events and update the totals and rollups, in one transaction.
 
-        except Exception as e:
+        Runs in a worker thread, with its own app context.
+        """
+        views = [row for kind, row in events if kind == VIEW]
+        usages = [row for kind, row in events if kind == USAGE]
+
+        with app.app_context():
+            try:
+                if views:
+                    db.session.execute(insert(TemplateView), views)
+                if usages:
+                    db.session.execute(insert(TemplateUsage), usages)
+                    self._update_usage_totals(usages)
+                    self._update_sketches(usages)
+                self._upsert_rollups(_rollup_rows(views, usages))
+                db.session.commit()
+                logger.debug(f"Wrote {len(views)} template view(s) and {len(usages)} template usage(s)")
+            except Exception:
+                db.session.rollback()
+                raise
+
+    @staticmethod
+    def _update_usage_totals(usages: List[Dict[str, Any]]) -> None:
+        """Add a batch's usages to each template's totals with a single atomic upsert."""
+        now = datetime.utcnow()
+        upsert_increments(
+            db.session,
+            TemplateAnalytics,
+            (
+                {
+                    'template_name': usage['template_name'],
+                    'total_uses': 1,
+                    'successful_uses': 1 if usage['success'] else 0,
+                    'failed_uses': 0 if usage['success'] else 1,
+                    'ai_generated_uses': 1 if usage['is_ai_generated'] else 0,
+                    'last_updated': now
+                }
+                for usage in usages
+            ),
+            key_columns=('template_name',),
+            counter_columns=('total_uses', 'successful_uses', 'failed_uses', 'ai_generated_uses'),
+            replace_columns=('last_updated',)
+        )
+
+    @staticmethod
+    def _upsert_rollups(rows: Iterable[Dict[str, Any]]) -> None:
+        """Add increments to their hourly and daily rollup rows with atomic upserts."""
+        rows = coalesce_rows(rows, ('template_name', 'resolution', 'bucket'), ROLLUP_COUNTERS)
+        for start in range(0, len(rows), ROLLUP_CHUNK_SIZE):
+            upsert_increments(
+                db.session,
+                TemplateRollup,
+                rows[start:start + ROLLUP_CHUNK_SIZE],
+                key_columns=('template_name', 'resolution', 'bucket'),
+                counter_columns=ROLLUP_COUNTERS
+            )
+
+    @staticmethod
+    def _claim_backfill(name: str) -> bool:
+        """Record a backfill as applied in the current transaction, unless it already is.
+
+        Inserting the marker first makes concurrent processes wait for the
+        transaction that holds it, then see it and skip the backfill, so a
+        backfill committed together with its marker runs exactly once.
+
+        Returns:
+            bool: True if the caller should run the backfill
+        """
+        try:
+            db.session.add(AnalyticsBackfill(name=name))
+            db.session.flush()
+            return True
+        except IntegrityError:
             db.session.rollback()
-            logger.error(f"Error tracking template usage: {e}")
+            return False
+
+    def _ensure_backfilled(self) -> bool:
+        """Run the one-off backfills if this process hasn't seen them applied yet.
+
+        Returns:
+            bool: Whether every raw event is counted in the rollups and sketches
+        """
+        with self._backfill_lock:
+            if not self.backfilled:
+                try:
+                    self._backfill_rollups()
+                    self._backfill_sketches()
+                    self.backfilled = True
+                except Exception as e:
+                    logger.error(f"Failed to backfill analytics rollups and sketches: {e}")
+            return self.backfilled
+
+    async def backfill(self) -> None:
+        """Run the one-off backfills in a worker thread; they scan every raw event the first time."""
+        await asyncio.to_thread(self._ensure_backfilled)
+
+    def _backfill_rollups(self) -> None:
+        """Build the rollups from the raw events once, if events were recorded before rollups existed."""
+        with app.app_context():
+            try:
+                if not self._claim_backfill('rollups'):
+                    return
+                if db.session.get_bind().dialect.name == 'postgresql':
+                    # Hold back concurrent batches so the rollups don't change between the check and the backfill
+                    db.session.execute(text("LOCK TABLE template_rollup IN EXCLUSIVE MODE"))
+                if db.session.execute(select(TemplateRollup.id).limit(1)).first() is None:
+                    self._rollup_raw_events()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _rollup_raw_events(self) -> None:
+        """Add every stored raw event to the rollups, in the current transaction."""
+        views = (
+            row._asdict() for row in db.session.execute(
+                select(TemplateView.template_name, TemplateView.timestamp)
+                .where(TemplateView.timestamp.isnot(None))
+                .execution_options(yield_per=5000)
+            )
+        )
+        usages = (
+            row._asdict() for row in db.session.execute(
+                select(TemplateUsage.template_name, TemplateUsage.timestamp,
+                       TemplateUsage.success, TemplateUsage.is_ai_generated)
+                .where(TemplateUsage.timestamp.isnot(None))
+                .execution_options(yield_per=5000)
+            )
+        )
+        # Increments are merged per bucket as the events stream in, so memory grows with buckets, not events
+        rows = coalesce_rows(_rollup_rows(views, usages), ('template_name', 'resolution', 'bucket'), ROLLUP_COUNTERS)
+        if rows:
+            self._upsert_rollups(rows)
+            logger.info(f"Backfilled {len(rows)} analytics rollup row(s) from raw events")
+
+    def _update_sketches(self, usages: List[Dict[str, Any]]) -> None:
+        """Fold a batch's guilds and users into the templates' sketches and refresh the unique counts."""
+        values: Dict[Tuple[str, str, str], Set[int]] = {}
+        for usage in usages:
+            for key, value in self._sketch_values(usage):
+                values.setdefault(key, set()).add(value)
+        self._merge_sketches(values)
+
+    def _sketch_values(self, usage: Dict[str, Any]) -> Iterator[Tuple[Tuple[str, str, str], int]]:
+        """The (template_name, period, kind) sketches a usage belongs in, with the value it adds to each."""
+        periods = [ALL_TIME]
+        if self.daily_sketches:
+            periods.append(usage['timestamp'].strftime('%Y-%m-%d'))
+        for period in periods:
+            for kind, column in SKETCH_COLUMNS.items():
+                yield (usage['template_name'], period, kind), usage[column]
 
     @staticmethod
-    def track_template_view(template_name, user_id, guild_id=None):
-        """Track template view/preview
+    def _merge_sketches(values: Dict[Tuple[str, str, str], Any]) -> None:
+        """Merge values into stored sketches, creating missing ones, and refresh the all-time unique counts.
+
+        Registers are merged by taking the maximum, which SQL can't express on
+        a blob, so each affected sketch row is locked, merged in Python and
+        written back within the current transaction. Merging is idempotent, so
+        merging the same values twice leaves a sketch unchanged.
 
         Args:
-            template_name: Name of the template viewed
-            user_id: Discord user ID who viewed the template
-            guild_id: Discord guild ID where template was viewed (optional)
+            values: Per (template_name, period, kind), either values to add or a HyperLogLog to merge
         """
-        try:
-            view = TemplateView(
-                template_name=template_name,
-                user_id=user_id,
-                guild_id=guild_id
+        if not values:
+            return
+        now = datetime.utcnow()
+        empty = HyperLogLog().to_bytes()
+        statement = dialect_insert(db.session, TemplateSketch.__table__).values([
+            {'template_name': name, 'period': period, 'kind': kind, 'registers': empty, 'last_updated': now}
+            for name, period, kind in values
+        ])
+        db.session.execute(statement.on_conflict_do_nothing(index_elements=['template_name', 'period', 'kind']))
+
+        rows = db.session.execute(
+            select(TemplateSketch.id, TemplateSketch.template_name, TemplateSketch.period,
+                   TemplateSketch.kind, TemplateSketch.registers)
+            .where(TemplateSketch.template_name.in_({name for name, _, _ in values}))
+            .where(TemplateSketch.period.in_({period for _, period, _ in values}))
+            .with_for_update()
+        ).all()
+
+        unique_counts: Dict[str, Dict[str, int]] = {}
+        updates = []
+        for row in rows:
+            key = (row.template_name, row.period, row.kind)
+            if key not in values:
+                continue
+            sketch = HyperLogLog.from_bytes(row.registers)
+            if isinstance(values[key], HyperLogLog):
+                sketch.merge(values[key])
+            else:
+                sketch.update(values[key])
+            updates.append({'id': row.id, 'registers': sketch.to_bytes(), 'last_updated': now})
+            if row.period == ALL_TIME:
+                unique_counts.setdefault(row.template_name, {})[f"unique_{row.kind}"] = sketch.count()
+        db.session.execute(update(TemplateSketch), updates)
+
+        for template_name, counts in unique_counts.items():
+            db.session.execute(
+                update(TemplateAnalytics).where(TemplateAnalytics.template_name == template_name).values(**counts)
             )
-            db.session.add(view)
-            db.session.commit()
-            logger.debug(f"Tracked view of template '{template_name}' by user {user_id}")
 
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error tracking template view: {e}")
+    def _backfill_sketches(self) -> None:
+        """Fold the usages recorded before sketches existed into them, once.
+
+        Runs one template at a time, each in its own transaction, so memory
+        is bounded by one template's sketches. Since merging is idempotent,
+        usages already merged by the writer, or a backfill interrupted and
+        run again, don't inflate the counts; the marker is only written once
+        every template is done.
+        """
+        with app.app_context():
+            if db.session.get(AnalyticsBackfill, 'sketches') is not None:
+                return
+            template_names = db.session.execute(select(TemplateUsage.template_name).distinct()).scalars().all()
+            for template_name in template_names:
+                sketches: Dict[Tuple[str, str, str], HyperLogLog] = {}
+                rows = db.session.execute(
+                    select(TemplateUsage.template_name, TemplateUsage.timestamp,
+                           TemplateUsage.guild_id, TemplateUsage.user_id)
+                    .where(TemplateUsage.template_name == template_name)
+                    .where(TemplateUsage.timestamp.isnot(None))
+                    .execution_options(yield_per=5000)
+                )
+                for row in rows:
+                    for key, value in self._sketch_values(row._asdict()):
+                        sketches.setdefault(key, HyperLogLog()).add(value)
+                try:
+                    self._merge_sketches(sketches)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+
+            try:
+                db.session.add(AnalyticsBackfill(name='sketches'))
+                db.session.commit()
+            except IntegrityError:
+                # Another process finished the same backfill first
+                db.session.rollback()
+            if template_names:
+                logger.info(f"Backfilled unique guild and user sketches for {len(template_names)} template(s)")
+
+    def _compact_raw_events(self) -> Dict[str, int]:
+        """Delete raw events, hourly rollups and daily sketches the retention policy no longer keeps."""
+        if not self._ensure_backfilled():
+            logger.warning("Skipping analytics retention: raw events are not all counted in the rollups and sketches")
+            return {}
+        event_tables = [TemplateUsage.__table__, TemplateView.__table__]
+        with app.app_context():
+            ensure_partitions(db.engine, event_tables)
+            try:
+                counts = compact_events(
+                    db.session, event_tables, TemplateRollup.__table__, TemplateSketch.__table__, self.event_retention
+                )
+            except Exception:
+                db.session.rollback()
+                raise
+        if any(counts.values()):
+            logger.info(f"Compacted analytics: {counts}")
+        return counts
+
+    async def compact_raw_events(self, interval: float = 3600.0) -> None:
+        """Periodically apply the raw event retention policy.
+
+        Args:
+            interval: Seconds between compaction runs
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self._compact_raw_events)
+            except Exception as e:
+                logger.error(f"Error compacting analytics events: {e}")
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        """Write every queued event; call before the event loop shuts down."""
+        await self.writer.close()
+
+    def close_sync(self):
+        """Write every queued event once the event loop has stopped."""
+        self.writer.close_sync()
+
+    @staticmethod
+    def _period_analytics(rows, period_days: int) -> List[TemplateAnalytics]:
+        """Wrap summed rollup counters in TemplateAnalytics, like the all-time rows, without saving them.
+
+        The unique counts of every row are read together, in one query.
+        """
+        unique_counts = AnalyticsService._unique_counts([row.template_name for row in rows], period_days)
+        now = datetime.utcnow()
+        return [
+            TemplateAnalytics(
+                template_name=row.template_name,
+                total_uses=row.total_uses,
+                successful_uses=row.successful_uses,
+                failed_uses=row.failed_uses,
+                ai_generated_uses=row.ai_generated_uses,
+                last_updated=now,
+                **unique_counts[row.template_name]
+            )
+            for row in rows
+        ]
 
     @staticmethod
     def get_popular_templates(limit=10, period_days=30):
@@ -91,30 +451,99 @@ class AnalyticsService:
 
         Args:
             limit: Maximum number of templates to return
-            period_days: Period for analytics in days (0 = all time)
+            period_days: Period for analytics in whole days, including today (0 = all time)
 
         Returns:
-            List of template analytics ordered by popularity
+            List of template analytics ordered by popularity; for a period, unsaved
+            TemplateAnalytics with the counters summed from the rollups
         """
         try:
-            query = TemplateAnalytics.query.order_by(TemplateAnalytics.total_uses.desc())
-            return query.limit(limit).all()
+            if not period_days:
+                query = TemplateAnalytics.query.order_by(TemplateAnalytics.total_uses.desc())
+                return query.limit(limit).all()
+
+            rows = db.session.execute(
+                select(TemplateRollup.template_name, *_rollup_totals())
+                .where(_period_filter(period_days))
+                .group_by(TemplateRollup.template_name)
+                .order_by(func.sum(TemplateRollup.total_uses).desc(), TemplateRollup.template_name)
+                .limit(limit)
+            ).all()
+            return AnalyticsService._period_analytics(rows, period_days)
         except Exception as e:
             logger.error(f"Error getting popular templates: {e}")
             return []
 
     @staticmethod
-    def get_template_stats(template_name):
+    def get_unique_counts(template_name, period_days=0):
+        """Estimate how many distinct guilds and users applied a template
+
+        All-time counts are read from the template's totals; counts over a
+        period merge one fixed-size daily sketch per day, so neither reads
+        any usage rows.
+
+        Args:
+            template_name: Name of the template
+            period_days: Period in days, including today (0 = all time)
+
+        Returns:
+            Dict with 'unique_guilds' and 'unique_users'
+        """
+        try:
+            return AnalyticsService._unique_counts([template_name], period_days)[template_name]
+        except Exception as e:
+            logger.error(f"Error getting unique counts for '{template_name}': {e}")
+            return {'unique_guilds': 0, 'unique_users': 0}
+
+    @staticmethod
+    def _unique_counts(template_names: List[str], period_days: int) -> Dict[str, Dict[str, int]]:
+        """Unique guild and user counts of several templates, read with a single query."""
+        if not period_days:
+            rows = db.session.execute(
+                select(TemplateAnalytics.template_name, TemplateAnalytics.unique_guilds, TemplateAnalytics.unique_users)
+                .where(TemplateAnalytics.template_name.in_(template_names))
+            )
+            stored = {name: {'unique_guilds': guilds or 0, 'unique_users': users or 0} for name, guilds, users in rows}
+            return {name: stored.get(name, {'unique_guilds': 0, 'unique_users': 0}) for name in template_names}
+
+        first_day = _period_start(period_days).strftime('%Y-%m-%d')
+        merged = {name: {kind: HyperLogLog() for kind in SKETCH_COLUMNS} for name in template_names}
+        rows = db.session.execute(
+            select(TemplateSketch.template_name, TemplateSketch.kind, TemplateSketch.registers)
+            .where(TemplateSketch.template_name.in_(template_names))
+            .where(TemplateSketch.period != ALL_TIME)
+            .where(TemplateSketch.period >= first_day)
+        )
+        for template_name, kind, registers in rows:
+            merged[template_name][kind].merge(HyperLogLog.from_bytes(registers))
+        return {
+            name: {f"unique_{kind}": sketch.count() for kind, sketch in sketches.items()}
+            for name, sketches in merged.items()
+        }
+
+    @staticmethod
+    def get_template_stats(template_name, period_days=0):
         """Get analytics for a specific template
 
         Args:
             template_name: Name of the template to get stats for
+            period_days: Period for analytics in whole days, including today (0 = all time)
 
         Returns:
-            TemplateAnalytics object or None if not found
+            TemplateAnalytics object or None if not found; for a period, an unsaved
+            TemplateAnalytics with the counters summed from the rollups
         """
         try:
-            return TemplateAnalytics.query.filter_by(template_name=template_name).first()
+            if not period_days:
+                return TemplateAnalytics.query.filter_by(template_name=template_name).first()
+
+            row = db.session.execute(
+                select(TemplateRollup.template_name, *_rollup_totals())
+                .where(TemplateRollup.template_name == template_name)
+                .where(_period_filter(period_days))
+                .group_by(TemplateRollup.template_name)
+            ).first()
+            return AnalyticsService._period_analytics([row], period_days)[0] if row else None
         except Exception as e:
             logger.error(f"Error getting template stats for '{template_name}': {e}")
             return None
@@ -0,0 +1,80 @@
+import logging
+from typing import Dict, List, Any, Iterable, Sequence, Tuple
+from sqlalchemy import func
+
+logger = logging.getLogger(__name__)
+
+
+def dialect_insert(session, table):
+    """Build an INSERT for the session's database that supports ON CONFLICT.
+
+    Raises:
+        NotImplementedError: For databases other than SQLite and PostgreSQL
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(table)
+
+
+def coalesce_rows(rows: Iterable[Dict[str, Any]], key_columns: Sequence[str],
+                  counter_columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """Merge rows with the same key, summing their counters.
+
+    Other columns take the value of the last row with the key. A single
+    upsert can't touch the same row twice, so rows are merged first.
+
+    Returns:
+        One row per key, in first-seen order
+    """
+    merged: Dict[Tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = tuple(row[column] for column in key_columns)
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = dict(row)
+            continue
+        for column, value in row.items():
+            if column in counter_columns:
+                existing[column] = existing.get(column, 0) + value
+            elif column not in key_columns:
+                existing[column] = value
+    return list(merged.values())
+
+
+def upsert_increments(session, model, rows: Iterable[Dict[str, Any]], key_columns: Sequence[str],
+                      counter_columns: Sequence[str], replace_columns: Sequence[str] = ()) -> int:
+    """Add counters to rows identified by a unique key, creating missing rows, in one statement.
+
+    Runs INSERT ... ON CONFLICT (key) DO UPDATE SET counter = counter + excluded.counter,
+    which the database applies atomically per row, so concurrent writers never
+    lose increments and no row is read first.
+
+    Args:
+        session: The SQLAlchemy session to execute in
+        model: The mapped class whose table is updated
+        rows: Column values per row, with the same columns in every row
+        key_columns: Columns of a unique constraint identifying a row
+        counter_columns: Columns to add to
+        replace_columns: Columns overwritten with the new value, e.g. timestamps
+
+    Returns:
+        Number of distinct rows written
+    """
+    rows = coalesce_rows(rows, key_columns, counter_columns)
+    if not rows:
+        return 0
+
+    table = model.__table__
+    statement = dialect_insert(session, table).values(rows)
+    updates = {column: func.coalesce(table.c[column], 0) + statement.excluded[column] for column in counter_columns}
+    updates.update({column: statement.excluded[column] for column in replace_columns})
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[table.c[column] for column in key_columns],
+        set_=updates
+    ))
+    return len(rows)
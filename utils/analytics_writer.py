@@ -0,0 +1,152 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Event kinds, one per table the writer inserts into
+VIEW = 'view'
+USAGE = 'usage'
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+class AnalyticsWriter:
+    """Buffers analytics events in memory and writes them to the database in batches.
+
+    Commands enqueue events and return immediately; a background task drains
+    the queue and hands each batch to a writer function that runs in a worker
+    thread, so the event loop never waits on a database round trip. A batch
+    is written once batch_size events are buffered or flush_interval seconds
+    after its first event, whichever comes first. The queue is bounded: when
+    it is full, async producers wait for room and synchronous ones drop the
+    event.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Event]], None], max_queue: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 2.0):
+        """Initialize the writer.
+
+        Args:
+            write_batch: Writes a list of (kind, row) events; called in a worker thread
+            max_queue: Maximum number of buffered events
+            batch_size: Events per database write
+            flush_interval: Longest time in seconds an event waits before being written
+        """
+        self.write_batch = write_batch
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        # Events taken off the queue by the background task but not yet handed to write_batch
+        self._collecting: List[Event] = []
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _ensure_running(self) -> None:
+        """Start the background flush task on the running loop, if it isn't running."""
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            except RuntimeError:
+                # No running loop; the events are written by close()
+                pass
+
+    @staticmethod
+    def _stamp(row: Dict[str, Any]) -> Dict[str, Any]:
+        # Events are written later, so record when they happened
+        row.setdefault('timestamp', datetime.utcnow())
+        return row
+
+    async def put(self, kind: str, row: Dict[str, Any]) -> None:
+        """Queue an event, waiting for room if the queue is full."""
+        self._ensure_running()
+        await self._queue.put((kind, self._stamp(row)))
+
+    def put_nowait(self, kind: str, row: Dict[str, Any]) -> bool:
+        """Queue an event from synchronous code, dropping it if the queue is full.
+
+        Returns:
+            bool: True if the event was queued
+        """
+        self._ensure_running()
+        try:
+            self._queue.put_nowait((kind, self._stamp(row)))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Analytics queue full, dropped a {kind} event ({self.dropped} dropped so far)")
+            return False
+
+    def _drain(self, batch: List[Event]) -> None:
+        """Move already queued events into a batch, up to batch_size."""
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    def _write(self, batch: List[Event]) -> None:
+        """Write one batch, logging instead of raising so the writer keeps running."""
+        try:
+            self.write_batch(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} analytics event(s): {e}")
+
+    async def _run(self) -> None:
+        """Collect events into batches and write them until cancelled."""
+        while True:
+            batch = self._collecting = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            self._drain(batch)
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+                self._drain(batch)
+            self._collecting = []
+            await asyncio.to_thread(self._write, batch)
+
+    def _take_remaining(self) -> List[List[Event]]:
+        """Take every event not yet handed to write_batch, in batches."""
+        batches = []
+        if self._collecting:
+            batches.append(self._collecting)
+            self._collecting = []
+        while not self._queue.empty():
+            batch = []
+            self._drain(batch)
+            batches.append(batch)
+        # A fresh queue, since a queue stays bound to the event loop it was first awaited on
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return batches
+
+    async def close(self) -> None:
+        """Stop the background task and write whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for batch in self._take_remaining():
+            await asyncio.to_thread(self._write, batch)
+
+    def close_sync(self) -> None:
+        """Write whatever is still queued from synchronous code, e.g. at interpreter exit.
+
+        Only safe once the event loop that produced the events has stopped.
+        """
+        for batch in self._take_remaining():
+            self._write(batch)
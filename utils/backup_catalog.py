@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, List, Any, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Which backups of a guild to keep.
+
+    A backup is kept if it is one of the newest keep_last, or the newest of
+    one of the keep_daily most recent days, or of one of the keep_weekly most
+    recent ISO weeks, that have backups.
+    """
+    keep_last: int = 5
+    keep_daily: int = 7
+    keep_weekly: int = 4
+
+    @classmethod
+    def from_env(cls) -> 'RetentionPolicy':
+        """Read the policy from BACKUP_KEEP_LAST, BACKUP_KEEP_DAILY and BACKUP_KEEP_WEEKLY."""
+        defaults = cls()
+        return cls(
+            keep_last=int(os.environ.get('BACKUP_KEEP_LAST', defaults.keep_last)),
+            keep_daily=int(os.environ.get('BACKUP_KEEP_DAILY', defaults.keep_daily)),
+            keep_weekly=int(os.environ.get('BACKUP_KEEP_WEEKLY', defaults.keep_weekly))
+        )
+
+    def select(self, created_at: List[str]) -> Set[str]:
+        """Pick the timestamps to keep.
+
+        Args:
+            created_at: One guild's backup timestamps (YYYYmmdd_HHMMSS), in any order
+
+        Returns:
+            The timestamps to keep
+        """
+        newest_first = sorted(created_at, reverse=True)
+        keep = set(newest_first[:self.keep_last])
+
+        days: Dict[str, str] = {}
+        weeks: Dict[Any, str] = {}
+        for timestamp in newest_first:
+            days.setdefault(timestamp[:8], timestamp)
+            weeks.setdefault(datetime.strptime(timestamp, TIMESTAMP_FORMAT).isocalendar()[:2], timestamp)
+        keep.update(list(days.values())[:self.keep_daily])
+        keep.update(list(weeks.values())[:self.keep_weekly])
+        return keep
+
+
+class BackupCatalog:
+    """SQLite index of stored backups and the chunks each one references.
+
+    Listing a guild's backups is an index lookup instead of a directory scan,
+    and the chunk references let garbage collection find chunks that no
+    remaining backup uses without reading any manifest.
+    """
+
+    def __init__(self, db_path: str):
+        """Open (and create if needed) the catalog database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS backups (
+                backup_id TEXT PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                role_count INTEGER NOT NULL,
+                category_count INTEGER NOT NULL,
+                channel_count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_backups_guild ON backups (guild_id, created_at);
+            CREATE TABLE IF NOT EXISTS backup_chunks (
+                backup_id TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (backup_id, digest)
+            );
+            CREATE INDEX IF NOT EXISTS ix_backup_chunks_digest ON backup_chunks (digest);
+            CREATE TABLE IF NOT EXISTS removed_backups (
+                backup_id TEXT PRIMARY KEY
+            );
+        """)
+
+    def add(self, record: Dict[str, Any], digests: Iterable[str]) -> None:
+        """Record a backup and the chunks it references, replacing an earlier record with the same id.
+
+        Args:
+            record: backup_id, guild_id, created_at, size_bytes, content_hash,
+                role_count, category_count and channel_count
+            digests: Hashes of the chunks the backup references
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM backup_chunks WHERE backup_id = ?", (record['backup_id'],))
+                self._conn.execute("DELETE FROM removed_backups WHERE backup_id = ?", (record['backup_id'],))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO backups (backup_id, guild_id, created_at, size_bytes, content_hash, "
+                    "role_count, category_count, channel_count) VALUES (:backup_id, :guild_id, :created_at, "
+                    ":size_bytes, :content_hash, :role_count, :category_count, :channel_count)",
+                    record
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO backup_chunks (backup_id, digest) VALUES (?, ?)",
+                    ((record['backup_id'], digest) for digest in set(digests))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def contains(self, backup_id: str) -> bool:
+        """Whether a backup is recorded."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM backups WHERE backup_id = ?", (backup_id,)).fetchone()
+        return row is not None
+
+    def was_removed(self, backup_id: str) -> bool:
+        """Whether a backup was removed by retention, so it isn't imported again."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM removed_backups WHERE backup_id = ?", (backup_id,)).fetchone()
+        return row is not None
+
+    def get(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        """Get a backup's record, or None if it isn't recorded."""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM backups WHERE backup_id = ?", (backup_id,))
+            row = cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+        return dict(zip(columns, row)) if row else None
+
+    def list(self, guild_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List backups, newest first, optionally only one guild's."""
+        query = "SELECT * FROM backups"
+        params: List[Any] = []
+        if guild_id is not None:
+            query += " WHERE guild_id = ?"
+            params.append(guild_id)
+        query += " ORDER BY created_at DESC, backup_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def guild_ids(self) -> List[int]:
+        """Guilds with at least one backup."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT guild_id FROM backups")]
+
+    def expired(self, guild_id: int, policy: RetentionPolicy) -> List[str]:
+        """Backup ids of a guild that the retention policy no longer keeps."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT backup_id, created_at FROM backups WHERE guild_id = ?", (guild_id,)
+            ).fetchall()
+        keep = policy.select([created_at for _, created_at in rows])
+        return [backup_id for backup_id, created_at in rows if created_at not in keep]
+
+    def unreferenced(self, digests: List[str]) -> Set[str]:
+        """Pick the chunk hashes that no recorded backup references."""
+        if not digests:
+            return set()
+
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS stored (digest TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM temp.stored")
+            self._conn.executemany("INSERT OR IGNORE INTO temp.stored (digest) VALUES (?)", ((d,) for d in digests))
+            return {row[0] for row in self._conn.execute(
+                "SELECT digest FROM temp.stored WHERE digest NOT IN (SELECT digest FROM backup_chunks)"
+            )}
+
+    def remove(self, backup_ids: List[str]) -> Set[str]:
+        """Delete backups from the catalog in one transaction, remembering their ids.
+
+        Returns:
+            Hashes of chunks that were referenced by the removed backups and are now unreferenced
+        """
+        if not backup_ids:
+            return set()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS expired (backup_id TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM temp.expired")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO temp.expired (backup_id) VALUES (?)", ((b,) for b in backup_ids)
+                )
+                candidates = {row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT digest FROM backup_chunks WHERE backup_id IN (SELECT backup_id FROM temp.expired)"
+                )}
+                self._conn.execute("DELETE FROM backup_chunks WHERE backup_id IN (SELECT backup_id FROM temp.expired)")
+                self._conn.execute("DELETE FROM backups WHERE backup_id IN (SELECT backup_id FROM temp.expired)")
+                self._conn.execute("INSERT OR IGNORE INTO removed_backups (backup_id) SELECT backup_id FROM temp.expired")
+                unreferenced = {
+                    digest for digest in candidates
+                    if self._conn.execute("SELECT 1 FROM backup_chunks WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None
+                }
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return unreferenced
@@ -0,0 +1,414 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows; only threads of one process are coordinated there
+    fcntl = None
+
+from utils.backup_catalog import BackupCatalog, RetentionPolicy
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Template fields kept in the manifest itself rather than in chunks
+_HEADER_FIELDS = ('name', 'description', 'category')
+
+# Legacy full-copy backups: {guild_id}_{YYYYmmdd_HHMMSS}.json
+_LEGACY_NAME = re.compile(r'^(\d+)_(\d{8}_\d{6})\.json$')
+
+
+# First bytes of a gzip stream; chunks written before compression are plain JSON
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# Canonical encoding of a chunk, so equal content always hashes the same
+_CHUNK_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _hash_chunk(value: Any) -> str:
+    """SHA-256 of a chunk's canonical encoding, computed piece by piece."""
+    digest = hashlib.sha256()
+    for piece in _CHUNK_ENCODER.iterencode(value):
+        digest.update(piece.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, pieces: Iterable[str], compress: bool = False) -> int:
+    """Stream text into a temporary file next to path and move it into place.
+
+    Readers never see a partial file, and concurrent writers of the same path
+    each use their own temporary file.
+
+    Returns:
+        Number of bytes written to disk
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            stream = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) if compress else raw
+            for piece in pieces:
+                stream.write(piece.encode('utf-8'))
+            if compress:
+                stream.close()
+            size = raw.tell()
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return size
+
+
+class BackupStore:
+    """Content-addressed storage for server backups.
+
+    A backup is split into one chunk per role and one per category (with its
+    channels). Chunks are stored once, gzip-compressed, under the SHA-256 of
+    their content, and each backup is a small manifest listing its chunk
+    hashes in order, so an unchanged role or category costs nothing to back
+    up again. Chunks are encoded, written and read one at a time, so memory
+    use is bounded by the largest category rather than the whole guild. All
+    methods do blocking file I/O; call them from a worker thread.
+
+    Layout under the root directory:
+        objects/ab/cdef...    chunk content, named by its hash
+        manifests/{id}.json   one manifest per backup, id = {guild_id}_{timestamp}
+        catalog.db            index of backups and the chunks they reference
+        store.lock            held shared by saves and exclusively by compaction
+    """
+
+    def __init__(self, root: str):
+        """Initialize the store, creating its directories if needed.
+
+        Args:
+            root: Directory holding the objects and manifests
+        """
+        self.root = root
+        self.objects_path = os.path.join(root, 'objects')
+        self.manifests_path = os.path.join(root, 'manifests')
+        os.makedirs(self.objects_path, exist_ok=True)
+        os.makedirs(self.manifests_path, exist_ok=True)
+        self.catalog = BackupCatalog(os.path.join(root, 'catalog.db'))
+        # Keeps compaction from deleting a chunk that a backup being saved has just reused,
+        # within this process (_lock) and across processes sharing the directory (lock_path)
+        self._lock = threading.Condition()
+        self._savers = 0
+        self._compacting = False
+        self.lock_path = os.path.join(root, 'store.lock')
+        self._index_manifests()
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        """Hold the store lock: shared for saves, which may run concurrently, exclusive for compaction.
+
+        A save only reuses a chunk while holding the shared lock, and only
+        references it in the catalog before releasing it, so compaction, which
+        needs the exclusive lock, never sees a reused chunk as unreferenced.
+        """
+        with self._lock:
+            # Compaction waits for running saves to finish, and saves wait for compaction
+            self._lock.wait_for(lambda: not self._compacting and (not exclusive or not self._savers))
+            if exclusive:
+                self._compacting = True
+            else:
+                self._savers += 1
+        try:
+            if fcntl is None:
+                yield
+                return
+            # Every holder opens the file itself, so shared holders in this process don't release each other
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._lock:
+                if exclusive:
+                    self._compacting = False
+                else:
+                    self._savers -= 1
+                self._lock.notify_all()
+
+    def _index_manifests(self) -> None:
+        """Add manifests written before the catalog existed to it."""
+        for name in os.listdir(self.manifests_path):
+            if not name.endswith('.json') or self.catalog.contains(name[:-len('.json')]):
+                continue
+            try:
+                with open(os.path.join(self.manifests_path, name), 'rb') as f:
+                    data = f.read()
+                self._record(json.loads(data), name[:-len('.json')], data)
+            except Exception as e:
+                logger.error(f"Failed to index backup manifest {name}: {e}")
+
+    def _record(self, manifest: Dict[str, Any], backup_id: str, data: bytes,
+                size_bytes: Optional[int] = None, channel_count: Optional[int] = None) -> None:
+        """Add a manifest to the catalog, measuring what the caller didn't already know."""
+        digests = manifest['roles'] + manifest['categories']
+        if size_bytes is None:
+            size_bytes = len(data) + sum(os.path.getsize(self._object_path(digest)) for digest in set(digests))
+        if channel_count is None:
+            channel_count = sum(len(self._get_chunk(digest).get('channels', [])) for digest in manifest['categories'])
+        self.catalog.add({
+            'backup_id': backup_id,
+            'guild_id': manifest['guild_id'],
+            'created_at': manifest['created_at'],
+            'size_bytes': size_bytes,
+            'content_hash': hashlib.sha256(data).hexdigest(),
+            'role_count': len(manifest['roles']),
+            'category_count': len(manifest['categories']),
+            'channel_count': channel_count
+        }, digests)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_path, digest[:2], digest[2:])
+
+    def manifest_path(self, backup_id: str) -> str:
+        """Path of a backup's manifest."""
+        return os.path.join(self.manifests_path, f"{backup_id}.json")
+
+    def _put_chunk(self, value: Any, stats: Dict[str, int]) -> str:
+        """Store a chunk unless identical content is already stored.
+
+        Returns:
+            The chunk's hash
+        """
+        digest = _hash_chunk(value)
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            stats['reused_chunks'] += 1
+            size = os.path.getsize(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            size = _write_atomic(path, _CHUNK_ENCODER.iterencode(value), compress=True)
+            stats['new_chunks'] += 1
+            stats['bytes_written'] += size
+        stats['size_bytes'] += size
+        return digest
+
+    def _get_chunk(self, digest: str) -> Any:
+        with open(self._object_path(digest), 'rb') as f:
+            if f.read(len(_GZIP_MAGIC)) != _GZIP_MAGIC:
+                f.seek(0)
+                return json.load(f)
+            f.seek(0)
+            with gzip.GzipFile(fileobj=f, mode='rb') as stream:
+                return json.load(stream)
+
+    def save(self, guild_id: int, timestamp: str, backup: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a backup as chunks plus a manifest.
+
+        Args:
+            guild_id: The backed-up guild
+            timestamp: Backup time as YYYYmmdd_HHMMSS
+            backup: The backup in template form; 'roles' and 'categories' may be any
+                iterables, and are consumed one chunk at a time
+
+        Returns:
+            The backup 'id', counts of 'new_chunks', 'reused_chunks' and 'bytes_written',
+            and 'size_bytes', the stored size of everything the backup references
+        """
+        stats = {'new_chunks': 0, 'reused_chunks': 0, 'bytes_written': 0, 'size_bytes': 0}
+        channel_count = 0
+
+        def put_category(category: Dict[str, Any]) -> str:
+            nonlocal channel_count
+            channel_count += len(category.get('channels', []))
+            return self._put_chunk(category, stats)
+
+        with self._locked(exclusive=False):
+            manifest = {
+                'version': MANIFEST_VERSION,
+                'guild_id': guild_id,
+                'created_at': timestamp,
+                **{field: backup[field] for field in _HEADER_FIELDS if field in backup},
+                'roles': [self._put_chunk(role, stats) for role in backup.get('roles', ())],
+                'categories': [put_category(category) for category in backup.get('categories', ())]
+            }
+
+            # Manifests hold only hashes, so they are small enough to encode in one piece
+            backup_id = f"{guild_id}_{timestamp}"
+            text = json.dumps(manifest, separators=(',', ':'))
+            _write_atomic(self.manifest_path(backup_id), [text])
+            data = text.encode('utf-8')
+            stats['bytes_written'] += len(data)
+            stats['size_bytes'] += len(data)
+            self._record(manifest, backup_id, data, stats['size_bytes'], channel_count)
+        return {'id': backup_id, **stats}
+
+    def load_manifest(self, backup_id: str) -> Dict[str, Any]:
+        """Read a backup's manifest without its chunks."""
+        with open(self.manifest_path(backup_id), 'r') as f:
+            return json.load(f)
+
+    def load(self, backup_id: str) -> Dict[str, Any]:
+        """Reassemble a backup in template form.
+
+        Raises:
+            FileNotFoundError: If the backup or one of its chunks doesn't exist
+        """
+        backup: Dict[str, Any] = {'roles': [], 'categories': []}
+        for kind, value in self.iter_backup(backup_id):
+            if kind == 'header':
+                backup.update(value)
+            else:
+                backup[kind].append(value)
+        return backup
+
+    def open_backup(self, backup_id: str) -> Dict[str, Any]:
+        """Open a backup in template form with its chunks read lazily.
+
+        'roles' and 'categories' are iterators that read one chunk at a time
+        as they are consumed, so compiling a restore plan from the result
+        never holds more than one raw chunk.
+
+        Raises:
+            FileNotFoundError: If the backup doesn't exist; a missing chunk raises when it is reached
+        """
+        manifest = self.load_manifest(backup_id)
+        backup: Dict[str, Any] = {field: manifest[field] for field in _HEADER_FIELDS if field in manifest}
+        backup['roles'] = (self._get_chunk(digest) for digest in manifest['roles'])
+        backup['categories'] = (self._get_chunk(digest) for digest in manifest['categories'])
+        return backup
+
+    def iter_backup(self, backup_id: str) -> Iterator[Tuple[str, Any]]:
+        """Read a backup one chunk at a time.
+
+        Yields:
+            ('header', {name, description, category}) first, then ('roles', role)
+            and ('categories', category) pairs in backup order
+
+        Raises:
+            FileNotFoundError: If the backup or one of its chunks doesn't exist
+        """
+        manifest = self.load_manifest(backup_id)
+        yield 'header', {field: manifest[field] for field in _HEADER_FIELDS if field in manifest}
+        for kind in ('roles', 'categories'):
+            for digest in manifest[kind]:
+                yield kind, self._get_chunk(digest)
+
+    def list_backups(self, guild_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List backups, newest first, from the catalog.
+
+        Args:
+            guild_id: Only list this guild's backups
+            limit: Maximum number of backups to return
+
+        Returns:
+            Catalog records: backup_id, guild_id, created_at, size_bytes, content_hash,
+            role_count, category_count and channel_count
+        """
+        return self.catalog.list(guild_id, limit)
+
+    def get_backup(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        """Get a backup's catalog record, or None if there is no such backup."""
+        return self.catalog.get(backup_id)
+
+    def _sweep_orphans(self) -> int:
+        """Delete chunks no backup references, such as those written by a save that failed part way.
+
+        Leftover temporary files of interrupted writes go too. Call with the
+        exclusive lock held, so no save is reusing or writing a chunk.
+
+        Returns:
+            Number of chunks deleted
+        """
+        removed = 0
+        for prefix in sorted(os.listdir(self.objects_path)):
+            directory = os.path.join(self.objects_path, prefix)
+            if not os.path.isdir(directory):
+                continue
+            names = os.listdir(directory)
+            for name in names:
+                if name.endswith('.tmp'):
+                    os.remove(os.path.join(directory, name))
+            # One directory at a time, so memory stays bounded however many chunks are stored
+            digests = [prefix + name for name in names if not name.endswith('.tmp')]
+            for digest in self.catalog.unreferenced(digests):
+                try:
+                    os.remove(self._object_path(digest))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def compact(self, policy: RetentionPolicy) -> Dict[str, int]:
+        """Delete the backups a retention policy no longer keeps, and the chunks only they used.
+
+        Chunks that no backup references at all, left behind by saves that
+        failed or were aborted, are swept up as well.
+
+        Args:
+            policy: Which backups of each guild to keep
+
+        Returns:
+            Counts of 'removed_backups', 'removed_chunks' and 'orphaned_chunks'
+        """
+        with self._locked(exclusive=True):
+            expired = []
+            for guild_id in self.catalog.guild_ids():
+                expired.extend(self.catalog.expired(guild_id, policy))
+            unreferenced = self.catalog.remove(expired)
+
+            # Legacy copies stay where they are; the catalog remembers the removed ids so they aren't imported again
+            for backup_id in expired:
+                try:
+                    os.remove(self.manifest_path(backup_id))
+                except FileNotFoundError:
+                    pass
+            for digest in unreferenced:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+            orphaned = self._sweep_orphans()
+
+        if expired:
+            logger.info(f"Compacted backups: removed {len(expired)} backup(s) and {len(unreferenced)} chunk(s)")
+        if orphaned:
+            logger.info(f"Compacted backups: removed {orphaned} unreferenced chunk(s) of failed saves")
+        return {'removed_backups': len(expired), 'removed_chunks': len(unreferenced), 'orphaned_chunks': orphaned}
+
+    def import_legacy(self, directory: str) -> int:
+        """Import full-copy JSON backups from a directory into the store.
+
+        Backups already imported, or imported and since removed by retention,
+        are skipped without being read, so this is cheap to run on every start.
+        The legacy files are left in place.
+
+        Args:
+            directory: Directory containing {guild_id}_{timestamp}.json backups
+
+        Returns:
+            Number of backups imported
+        """
+        imported = 0
+        for name in sorted(os.listdir(directory)):
+            match = _LEGACY_NAME.match(name)
+            if not match:
+                continue
+            guild_id, timestamp = match.groups()
+            backup_id = f"{guild_id}_{timestamp}"
+            if os.path.exists(self.manifest_path(backup_id)) or self.catalog.was_removed(backup_id):
+                continue
+            try:
+                with open(os.path.join(directory, name), 'r') as f:
+                    backup = json.load(f)
+                self.save(int(guild_id), timestamp, backup)
+                imported += 1
+            except Exception as e:
+                logger.error(f"Failed to import legacy backup {name}: {e}")
+
+        if imported:
+            logger.info(f"Imported {imported} legacy backup(s) from {directory}")
+        return imported
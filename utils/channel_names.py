@@ -0,0 +1,60 @@
+import re
+import discord
+from functools import lru_cache
+from typing import Union
+
+# Punctuation Discord strips from text-like channel names
+_STRIPPED_CHARACTERS = re.compile(r"[!\"#$%&'()*+,./:;<=>?@\[\\\]^`{|}~]")
+_WHITESPACE = re.compile(r"\s+")
+_DASHES = re.compile(r"-{2,}")
+
+# Template channel types and the discord.py channel types they correspond to
+_KINDS = {
+    discord.ChannelType.text: 'text',
+    discord.ChannelType.news: 'text',
+    discord.ChannelType.voice: 'voice',
+    discord.ChannelType.stage_voice: 'stage',
+    discord.ChannelType.forum: 'forum',
+    discord.ChannelType.media: 'forum',
+    discord.ChannelType.category: 'category',
+}
+
+# Kinds whose names Discord lowercases and hyphenates
+_SLUGGED_KINDS = {'text', 'forum'}
+
+
+def channel_kind(channel_type: Union[str, discord.ChannelType]) -> str:
+    """Map a template channel type or a discord.ChannelType onto a template channel type."""
+    if isinstance(channel_type, discord.ChannelType):
+        return _KINDS.get(channel_type, channel_type.name)
+    return channel_type
+
+
+@lru_cache(maxsize=4096)
+def _normalize(name: str, kind: str) -> str:
+    name = name.strip()
+    if kind not in _SLUGGED_KINDS:
+        return name
+
+    name = name.lower()
+    name = _WHITESPACE.sub('-', name)
+    name = _STRIPPED_CHARACTERS.sub('', name)
+    name = _DASHES.sub('-', name)
+    return name.strip('-')
+
+
+def normalize_channel_name(name: str, channel_type: Union[str, discord.ChannelType] = 'text') -> str:
+    """Canonicalize a channel name the way Discord stores it for the channel's type.
+
+    Text-like channels are lowercased, whitespace becomes hyphens and
+    disallowed punctuation is dropped; voice and stage channels and
+    categories keep their name apart from surrounding whitespace.
+
+    Args:
+        name: The channel name as written in a template or typed by a user
+        channel_type: A template channel type ('text', 'voice', 'forum') or a discord.ChannelType
+
+    Returns:
+        The normalized name
+    """
+    return _normalize(name, channel_kind(channel_type))
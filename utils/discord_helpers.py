@@ -1,6 +1,9 @@
 import discord
 import logging
 from typing import Dict, Any, List, Optional
+from utils.rest_scheduler import rest_scheduler, INTERACTIVE, BULK
+from utils.execution_engine import execution_engine, route_key, CHANNEL_POSITIONS_ROUTE
+from utils.guild_index import guild_indexes
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +28,14 @@ async def create_role(guild: discord.Guild, role_data: Dict[str, Any]) -> Option
             if hasattr(permissions, perm_name):
                 setattr(permissions, perm_name, perm_value)
         
-        role = await guild.create_role(
+        role = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_role(
             name=name,
             permissions=permissions,
             color=discord.Color(color),
             hoist=role_data.get('hoist', False),
             mentionable=role_data.get('mentionable', False),
             reason="ServerSetup Bot - Role Creation"
-        )
+        ))
         return role
     except Exception as e:
         logger.error(f"Error creating role {role_data.get('name', 'unknown')}: {e}")
@@ -57,12 +60,12 @@ async def create_category(
         The created category object or None if failed
     """
     try:
-        category = await guild.create_category(
+        category = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_category(
             name=name,
             position=position,
             overwrites=overwrites or {},
             reason="ServerSetup Bot - Category Creation"
-        )
+        ))
         return category
     except Exception as e:
         logger.error(f"Error creating category {name}: {e}")
@@ -93,7 +96,7 @@ async def create_text_channel(
         The created channel object or None if failed
     """
     try:
-        channel = await guild.create_text_channel(
+        channel = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_text_channel(
             name=name,
             category=category,
             topic=topic,
@@ -101,7 +104,7 @@ async def create_text_channel(
             nsfw=nsfw,
             overwrites=overwrites or {},
             reason="ServerSetup Bot - Text Channel Creation"
-        )
+        ))
         return channel
     except Exception as e:
         logger.error(f"Error creating text channel {name}: {e}")
@@ -130,19 +133,45 @@ async def create_voice_channel(
         The created channel object or None if failed
     """
     try:
-        channel = await guild.create_voice_channel(
+        channel = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_voice_channel(
             name=name,
             category=category,
             bitrate=bitrate,
             user_limit=user_limit,
             overwrites=overwrites or {},
             reason="ServerSetup Bot - Voice Channel Creation"
-        )
+        ))
         return channel
     except Exception as e:
         logger.error(f"Error creating voice channel {name}: {e}")
         return None
 
+async def update_channel_positions(guild: discord.Guild, positions: List[Dict[str, Any]], reason: str = None) -> None:
+    """
+    Move several channels in one request, through the execution engine's bulk lane.
+    
+    GuildChannel.edit(position=...) can't be used per channel: each call sends
+    a bulk update of every channel in the category, computed from cached
+    positions that the previous calls have already made stale, so ordering N
+    channels would cost N full rewrites that race each other. discord.py has
+    no public call for the guild's bulk channel position route, so this is the
+    one place that reaches into its HTTP client.
+    
+    Args:
+        guild: The guild the channels are in
+        positions: {'id': channel ID, 'position': new position} entries
+        reason: Audit log reason
+        
+    Raises:
+        discord.HTTPException: If the update fails after the engine's retries
+    """
+    await execution_engine.run(
+        route_key(CHANNEL_POSITIONS_ROUTE, guild_id=guild.id),
+        lambda: guild._state.http.bulk_channel_update(guild.id, positions, reason=reason),
+        guild_id=guild.id,
+        lane=BULK
+    )
+
 def build_permission_overwrites(
     guild: discord.Guild,
     overwrite_data: Dict[str, Dict[str, bool]]
@@ -158,9 +187,10 @@ def build_permission_overwrites(
         Dictionary of permission overwrites
     """
     overwrites = {}
+    index = guild_indexes.get(guild)
     
     for role_name, permissions in overwrite_data.items():
-        role = discord.utils.get(guild.roles, name=role_name)
+        role = index.get_role(role_name)
         if role:
             overwrite = discord.PermissionOverwrite(**permissions)
             overwrites[role] = overwrite
@@ -169,3 +199,97 @@ def build_permission_overwrites(
             overwrites[guild.default_role] = overwrite
     
     return overwrites
+
+async def setup_verification_system(guild: discord.Guild) -> discord.TextChannel:
+    """
+    Set up the verification role, category and channel, post the verify button
+    and hide the rest of the server from unverified members.
+    
+    Objects that already exist are reused, so running it again is cheap.
+    
+    Args:
+        guild: The guild to set up verification in
+        
+    Returns:
+        The verification channel
+    """
+    reason = "ServerSetup Bot Verification System"
+
+    # Create verified role if it doesn't exist
+    index = guild_indexes.get(guild)
+    verified_role = index.get_role("Verified")
+    if not verified_role:
+        verified_role = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_role(
+            name="Verified",
+            color=discord.Color.green(),
+            reason=reason
+        ))
+        index.add_role(verified_role)
+
+    # Create verification category if it doesn't exist
+    verification_category = index.get_category("🔒 Verification")
+    if not verification_category:
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(view_channel=True, read_messages=True),
+            verified_role: discord.PermissionOverwrite(view_channel=False)
+        }
+        verification_category = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_category(
+            name="🔒 Verification",
+            overwrites=overwrites,
+            reason=reason
+        ))
+        index.add_channel(verification_category)
+
+    # Create verification channel if it doesn't exist
+    verification_channel = index.get_channel(verification_category.id, "verify")
+    if not verification_channel:
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(
+                view_channel=True,
+                send_messages=False,
+                read_messages=True
+            ),
+            verified_role: discord.PermissionOverwrite(view_channel=False)
+        }
+        verification_channel = await rest_scheduler.call(guild.id, INTERACTIVE, lambda: guild.create_text_channel(
+            name="verify",
+            category=verification_category,
+            overwrites=overwrites,
+            reason=reason
+        ))
+        index.add_channel(verification_channel)
+
+    # Create button for verification
+    verify_button = discord.ui.Button(style=discord.ButtonStyle.green, label="Verify", custom_id="verify_button")
+    view = discord.ui.View()
+    view.add_item(verify_button)
+
+    # Create the embed
+    embed = discord.Embed(
+        title="Server Verification",
+        description="Click the button below to verify and gain access to the server.",
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text=f"{guild.name} • Verification System")
+
+    await rest_scheduler.call(guild.id, INTERACTIVE, lambda: verification_channel.send(embed=embed, view=view))
+
+    # Update server settings to lock main channels for unverified users; this scales
+    # with the number of categories, so it shares the bulk lane with template builds
+    for category in guild.categories:
+        if category.id != verification_category.id:
+            try:
+                await rest_scheduler.call(guild.id, BULK, lambda: category.set_permissions(
+                    verified_role,
+                    view_channel=True,
+                    reason=reason
+                ))
+                await rest_scheduler.call(guild.id, BULK, lambda: category.set_permissions(
+                    guild.default_role,
+                    view_channel=False,
+                    reason=reason
+                ))
+            except discord.Forbidden:
+                pass
+
+    return verification_channel
@@ -0,0 +1,134 @@
+import asyncio
+import time
+import logging
+import discord
+from typing import Dict, List, Any, Awaitable, Callable, Optional
+from utils.rest_scheduler import rest_scheduler, BULK
+
+logger = logging.getLogger(__name__)
+
+# Discord buckets rate limits per route and major parameter (the guild ID for
+# everything the template system touches), so route keys are built the same way.
+ROLE_ROUTE = "POST /guilds/{guild_id}/roles"
+CHANNEL_ROUTE = "POST /guilds/{guild_id}/channels"
+CHANNEL_EDIT_ROUTE = "PATCH /channels/{channel_id}"
+CHANNEL_POSITIONS_ROUTE = "PATCH /guilds/{guild_id}/channels"
+# Role edits share one bucket per guild, so the role ID stays a placeholder in the key
+ROLE_EDIT_ROUTE = "PATCH /guilds/{guild_id}/roles/{{role_id}}"
+
+
+def route_key(route: str, **params: Any) -> str:
+    """Build the bucket key for a route template and its major parameters."""
+    return route.format(**params)
+
+
+class ExecutionEngine:
+    """Runs independent Discord REST operations concurrently.
+
+    Operations are grouped by route key. Each route gets its own concurrency
+    limit on top of a global limit, and a 429 on a route pauses every pending
+    operation on that route until the retry-after window has passed. Every
+    request also draws from the shared REST budget of the rest scheduler.
+    """
+
+    def __init__(self, max_concurrency: int = 8, route_concurrency: int = 2, max_retries: int = 3):
+        """Initialize the execution engine.
+
+        Args:
+            max_concurrency: Maximum number of in-flight requests across all routes
+            route_concurrency: Maximum number of in-flight requests per route key
+            max_retries: How many times an operation is retried after a 429
+        """
+        self.max_concurrency = max_concurrency
+        self.route_concurrency = route_concurrency
+        self.max_retries = max_retries
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._route_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._route_blocked_until: Dict[str, float] = {}
+
+    def _get_route_semaphore(self, route: str) -> asyncio.Semaphore:
+        """Get or create the semaphore guarding a route key."""
+        semaphore = self._route_semaphores.get(route)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.route_concurrency)
+            self._route_semaphores[route] = semaphore
+        return semaphore
+
+    async def _wait_for_route(self, route: str) -> None:
+        """Sleep until a rate-limited route is available again."""
+        while True:
+            delay = self._route_blocked_until.get(route, 0) - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Extract the retry-after delay from a rate-limit error, if it is one."""
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        if isinstance(error, discord.HTTPException) and error.status == 429:
+            try:
+                return float(error.response.headers.get('Retry-After', 1))
+            except (AttributeError, TypeError, ValueError):
+                return 1.0
+        return None
+
+    async def run(self, route: str, operation: Callable[[], Awaitable[Any]],
+                  guild_id: Optional[int] = None, lane: str = BULK) -> Any:
+        """Run a single operation within the limits of its route.
+
+        Args:
+            route: The bucket key the operation's request belongs to
+            operation: A zero-argument callable returning the coroutine to await
+            guild_id: The guild the request is for, used for fair sharing of the REST budget
+            lane: The rest scheduler lane to draw from
+
+        Returns:
+            Whatever the operation returns
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        attempt = 0
+        while True:
+            async with self._get_route_semaphore(route):
+                await self._wait_for_route(route)
+                async with self._semaphore:
+                    await rest_scheduler.acquire(guild_id, lane)
+                    try:
+                        return await operation()
+                    except Exception as e:
+                        retry_after = self._retry_after(e)
+                        if retry_after is None or attempt >= self.max_retries:
+                            raise
+                        attempt += 1
+                        logger.warning(f"Rate limited on {route}, retrying in {retry_after:.2f}s "
+                                       f"(attempt {attempt}/{self.max_retries})")
+                        self._route_blocked_until[route] = max(
+                            self._route_blocked_until.get(route, 0),
+                            time.monotonic() + retry_after
+                        )
+
+    async def gather(self, route: str, operations: List[Callable[[], Awaitable[Any]]],
+                     guild_id: Optional[int] = None, lane: str = BULK) -> List[Any]:
+        """Run a batch of independent operations on the same route concurrently.
+
+        Args:
+            route: The bucket key shared by all operations
+            operations: Zero-argument callables returning the coroutines to await
+            guild_id: The guild the requests are for
+            lane: The rest scheduler lane to draw from
+
+        Returns:
+            Results in the same order as the operations; failed operations
+            return their exception instead of raising it
+        """
+        return await asyncio.gather(
+            *(self.run(route, operation, guild_id, lane) for operation in operations),
+            return_exceptions=True
+        )
+
+
+# Create a global instance
+execution_engine = ExecutionEngine()
@@ -0,0 +1,221 @@
+import logging
+import discord
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from utils.template_plan import CategoryPlan, ChannelPlan, RolePlan, OverwritePlan
+from utils.guild_index import GuildIndex
+
+logger = logging.getLogger(__name__)
+
+Overwrites = Dict[discord.Role, discord.PermissionOverwrite]
+
+
+@dataclass
+class CategoryDiff:
+    """What has to change for one template category."""
+    plan: CategoryPlan
+    existing: Optional[discord.CategoryChannel]
+    overwrites: Overwrites
+    overwrites_changed: bool
+    checkpointed: bool = False
+    channels_to_create: List[ChannelPlan] = field(default_factory=list)
+    # (channel plan, existing channel, edit keyword arguments) for channels that drifted from the plan
+    channels_to_edit: List[Tuple[ChannelPlan, discord.abc.GuildChannel, Dict[str, Any]]] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether the category needs no REST calls at all."""
+        return self.existing is not None and not self.overwrites_changed and \
+            not self.channels_to_create and not self.channels_to_edit
+
+
+def resolve_overwrites(overwrite_plans: Tuple[OverwritePlan, ...], role_objects: Dict[str, discord.Role],
+                       index: GuildIndex) -> Overwrites:
+    """Map a plan's overwrite pairs onto role objects, skipping roles that don't exist."""
+    overwrites = {}
+    for overwrite_plan in overwrite_plans:
+        role = role_objects.get(overwrite_plan.role_name) or index.get_role(overwrite_plan.role_name)
+        if role:
+            overwrites[role] = overwrite_plan.to_overwrite()
+    return overwrites
+
+
+def _overwrite_pairs(overwrites) -> Dict[int, Tuple[int, int]]:
+    """Reduce overwrites to comparable {target_id: (allow, deny)} pairs."""
+    pairs = {}
+    for target, overwrite in overwrites.items():
+        allow, deny = overwrite.pair()
+        pairs[target.id] = (allow.value, deny.value)
+    return pairs
+
+
+def diff_roles(roles: Iterable[RolePlan], index: GuildIndex) -> Tuple[List[Tuple[RolePlan, discord.Role]], List[RolePlan]]:
+    """Split template roles into ones the guild already has and ones to create.
+
+    Returns:
+        A tuple of ((role plan, existing role) pairs, role plans that need creating)
+    """
+    existing = []
+    missing = []
+    for role in roles:
+        existing_role = index.get_role(role.name)
+        if existing_role:
+            existing.append((role, existing_role))
+        else:
+            missing.append(role)
+    return existing, missing
+
+
+def diff_role(role_plan: RolePlan, role: discord.Role) -> Dict[str, Any]:
+    """Work out the edit that brings an existing role back in line with its plan.
+
+    Returns:
+        Keyword arguments for Role.edit, empty if the role matches
+    """
+    changes = {}
+    if role.color.value != role_plan.color:
+        changes['color'] = discord.Color(role_plan.color)
+    if role.permissions.value != role_plan.permissions:
+        changes['permissions'] = discord.Permissions(role_plan.permissions)
+    if role.hoist != role_plan.hoist:
+        changes['hoist'] = role_plan.hoist
+    if role.mentionable != role_plan.mentionable:
+        changes['mentionable'] = role_plan.mentionable
+    return changes
+
+
+def diff_channel(channel_plan: ChannelPlan, channel: discord.abc.GuildChannel,
+                 role_objects: Dict[str, discord.Role], index: GuildIndex) -> Dict[str, Any]:
+    """Work out the single edit that brings an existing channel back in line with its plan.
+
+    Planned overwrites are merged over the channel's current ones, like
+    category overwrites, so overwrites added since are left alone.
+
+    Returns:
+        Keyword arguments for the channel's edit, empty if the channel matches
+    """
+    changes: Dict[str, Any] = {}
+    if channel_plan.type in ('text', 'forum') and (channel.topic or '') != channel_plan.topic:
+        changes['topic'] = channel_plan.topic
+    if channel_plan.type == 'text':
+        if channel.slowmode_delay != channel_plan.slowmode:
+            changes['slowmode_delay'] = channel_plan.slowmode
+        if channel.is_nsfw() != channel_plan.nsfw:
+            changes['nsfw'] = channel_plan.nsfw
+    elif channel_plan.type == 'voice':
+        # A backup from a boosted guild may record more than this guild allows
+        bitrate = min(channel_plan.bitrate, int(channel.guild.bitrate_limit))
+        if channel.bitrate != bitrate:
+            changes['bitrate'] = bitrate
+        if channel.user_limit != channel_plan.user_limit:
+            changes['user_limit'] = channel_plan.user_limit
+
+    current = channel.overwrites
+    desired = dict(current)
+    desired.update(resolve_overwrites(channel_plan.overwrites, role_objects, index))
+    if _overwrite_pairs(desired) != _overwrite_pairs(current):
+        changes['overwrites'] = desired
+    return changes
+
+
+def diff_category(category_plan: CategoryPlan, index: GuildIndex, role_objects: Dict[str, discord.Role],
+                  include_text_channels: bool = True, include_voice_channels: bool = True,
+                  completed: Optional[Dict[str, Optional[int]]] = None, repair: bool = False) -> CategoryDiff:
+    """Work out the create and edit calls a template category needs.
+
+    For an existing category the template overwrites are merged over the
+    category's current ones; it only needs an edit if that changes anything.
+    Channels already checkpointed by a resumed job are skipped as long as
+    they still exist; one deleted since the checkpoint is diffed again.
+
+    Args:
+        category_plan: The compiled category
+        index: Index of the guild being applied to
+        role_objects: Roles resolved or created for this apply, by name
+        include_text_channels: Whether text channels should be created
+        include_voice_channels: Whether voice channels should be created
+        completed: Checkpointed steps of the job, as {step_key: object_id}
+        repair: Whether existing channels that drifted from the plan should be edited back
+
+    Returns:
+        The CategoryDiff for the category
+    """
+    completed = completed or {}
+    checkpointed_id = completed.get(category_plan.key)
+    existing = index.guild.get_channel(checkpointed_id) if checkpointed_id else None
+    checkpointed = existing is not None
+    if not checkpointed:
+        existing = index.get_category(category_plan.name)
+
+    if checkpointed:
+        # The category's overwrites were reconciled before the job was interrupted
+        overwrites_changed = False
+        overwrites = existing.overwrites
+    elif existing:
+        template_overwrites = resolve_overwrites(category_plan.overwrites, role_objects, index)
+        current = existing.overwrites
+        desired = dict(current)
+        desired.update(template_overwrites)
+        overwrites_changed = _overwrite_pairs(desired) != _overwrite_pairs(current)
+        overwrites = desired
+    else:
+        overwrites_changed = False
+        overwrites = resolve_overwrites(category_plan.overwrites, role_objects, index)
+
+    diff = CategoryDiff(category_plan, existing, overwrites, overwrites_changed, checkpointed)
+    for channel_plan in category_plan.channels:
+        checkpointed_channel_id = completed.get(channel_plan.key)
+        if checkpointed_channel_id and index.guild.get_channel(checkpointed_channel_id) is not None:
+            continue
+        # Skip based on channel type and options
+        if (channel_plan.type == 'text' and not include_text_channels) or \
+           (channel_plan.type == 'voice' and not include_voice_channels):
+            continue
+        # Skip if channel already exists in this category, unless it has to be repaired
+        channel = index.get_channel(existing.id, channel_plan.name, channel_plan.type) if existing else None
+        if channel:
+            changes = diff_channel(channel_plan, channel, role_objects, index) if repair else {}
+            if changes:
+                diff.channels_to_edit.append((channel_plan, channel, changes))
+            continue
+        diff.channels_to_create.append(channel_plan)
+
+    return diff
+
+
+def diff_channel_positions(category_plan: CategoryPlan, category: discord.CategoryChannel,
+                           index: GuildIndex) -> List[Dict[str, Any]]:
+    """Work out the position updates that put a category's channels in template order.
+
+    Template channels come first in template order, followed by any other
+    channels in the category in their current order. Nothing is returned if
+    the channels are already in that order; otherwise only channels whose
+    position actually changes are included.
+
+    Args:
+        category_plan: The compiled category
+        category: The guild's category for it
+        index: Index of the guild being applied to
+
+    Returns:
+        Entries for a bulk channel position update, empty if the order is already right
+    """
+    current = category.channels
+    ordered = []
+    seen = set()
+    for channel_plan in category_plan.channels:
+        channel = index.get_channel(category.id, channel_plan.name, channel_plan.type)
+        if channel and channel.id not in seen:
+            ordered.append(channel)
+            seen.add(channel.id)
+    ordered.extend(channel for channel in current if channel.id not in seen)
+
+    # Positions need not start at zero within a category; only the relative order matters
+    if [channel.id for channel in ordered] == [channel.id for channel in current]:
+        return []
+
+    return [
+        {'id': channel.id, 'position': position}
+        for position, channel in enumerate(ordered)
+        if channel.position != position
+    ]
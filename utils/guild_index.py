@@ -0,0 +1,175 @@
+import logging
+import discord
+from typing import Dict, Any, Optional, Tuple, Union
+from utils.channel_names import channel_kind, normalize_channel_name
+
+logger = logging.getLogger(__name__)
+
+
+class _NameIndex:
+    """Maps names to the objects carrying them, keeping every object per name.
+
+    Like discord.utils.get, a lookup returns the first object indexed under
+    the name; when it goes away the next one takes over.
+    """
+
+    def __init__(self):
+        self._by_key: Dict[Any, Dict[int, Any]] = {}
+
+    def add(self, key: Any, obj: Any) -> None:
+        self._by_key.setdefault(key, {})[obj.id] = obj
+
+    def remove(self, key: Any, object_id: int) -> None:
+        bucket = self._by_key.get(key)
+        if bucket is None:
+            return
+        bucket.pop(object_id, None)
+        if not bucket:
+            del self._by_key[key]
+
+    def get(self, key: Any) -> Optional[Any]:
+        bucket = self._by_key.get(key)
+        if not bucket:
+            return None
+        return next(iter(bucket.values()))
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+
+class GuildIndex:
+    """Name and ID index over a guild's roles, categories and channels.
+
+    Built once per guild with a single pass over its cache, then kept up to
+    date from gateway role and channel events, so lookups by name are O(1)
+    instead of discord.utils.get scans. Channels are keyed on their type and
+    normalized name, so a template name like "General Chat" finds the
+    "general-chat" text channel Discord actually created.
+    """
+
+    def __init__(self, guild: discord.Guild):
+        """Index a guild.
+
+        Args:
+            guild: The guild to index
+        """
+        self.guild = guild
+        self.roles = _NameIndex()
+        self.categories = _NameIndex()
+        self.channels = _NameIndex()
+
+        for role in guild.roles:
+            self.add_role(role)
+        for channel in guild.channels:
+            self.add_channel(channel)
+
+    @staticmethod
+    def _channel_key(category_id: Optional[int], name: str,
+                     channel_type: Union[str, discord.ChannelType]) -> Tuple[Optional[int], str, str]:
+        kind = channel_kind(channel_type)
+        return category_id, kind, normalize_channel_name(name, kind)
+
+    def add_role(self, role: discord.Role) -> None:
+        """Index a role; safe to call again for a role that is already indexed."""
+        # Keep the cached object, which gateway updates edit in place, rather than a REST response copy
+        role = self.guild.get_role(role.id) or role
+        self.roles.add(role.name, role)
+
+    def remove_role(self, role: discord.Role) -> None:
+        self.roles.remove(role.name, role.id)
+
+    def add_channel(self, channel: discord.abc.GuildChannel) -> None:
+        """Index a channel or category; safe to call again for one that is already indexed."""
+        channel = self.guild.get_channel(channel.id) or channel
+        if isinstance(channel, discord.CategoryChannel):
+            self.categories.add(channel.name, channel)
+        else:
+            self.channels.add(self._channel_key(channel.category_id, channel.name, channel.type), channel)
+
+    def remove_channel(self, channel: discord.abc.GuildChannel) -> None:
+        if isinstance(channel, discord.CategoryChannel):
+            self.categories.remove(channel.name, channel.id)
+        else:
+            self.channels.remove(self._channel_key(channel.category_id, channel.name, channel.type), channel.id)
+
+    def get_role(self, name: str) -> Optional[discord.Role]:
+        """Look up a role by name."""
+        return self.roles.get(name)
+
+    def get_category(self, name: str) -> Optional[discord.CategoryChannel]:
+        """Look up a category by name."""
+        return self.categories.get(name)
+
+    def get_channel(self, category_id: Optional[int], name: str,
+                    channel_type: Union[str, discord.ChannelType] = 'text') -> Optional[discord.abc.GuildChannel]:
+        """Look up a non-category channel by type and name within a category (None for uncategorized).
+
+        The name is normalized with Discord's rules for the channel type first.
+        """
+        return self.channels.get(self._channel_key(category_id, name, channel_type))
+
+
+class GuildIndexRegistry:
+    """Holds one GuildIndex per guild and applies gateway events to them."""
+
+    def __init__(self):
+        self._indexes: Dict[int, GuildIndex] = {}
+
+    def get(self, guild: discord.Guild) -> GuildIndex:
+        """Get the index for a guild, building it on first use.
+
+        The index is rebuilt if discord.py replaced the guild object (e.g.
+        after a fresh gateway session), since events then refer to the new one.
+        """
+        index = self._indexes.get(guild.id)
+        if index is None or index.guild is not guild:
+            index = GuildIndex(guild)
+            self._indexes[guild.id] = index
+        return index
+
+    def _existing(self, guild: discord.Guild) -> Optional[GuildIndex]:
+        """Get a guild's index only if it has been built and is current."""
+        index = self._indexes.get(guild.id)
+        if index is not None and index.guild is guild:
+            return index
+        return None
+
+    def drop(self, guild_id: int) -> None:
+        """Forget a guild's index."""
+        self._indexes.pop(guild_id, None)
+
+    def on_role_create(self, role: discord.Role) -> None:
+        index = self._existing(role.guild)
+        if index:
+            index.add_role(role)
+
+    def on_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        index = self._existing(after.guild)
+        if index and before.name != after.name:
+            index.remove_role(before)
+            index.add_role(after)
+
+    def on_role_delete(self, role: discord.Role) -> None:
+        index = self._existing(role.guild)
+        if index:
+            index.remove_role(role)
+
+    def on_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        index = self._existing(channel.guild)
+        if index:
+            index.add_channel(channel)
+
+    def on_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        index = self._existing(after.guild)
+        if index and (before.name != after.name or before.category_id != after.category_id):
+            index.remove_channel(before)
+            index.add_channel(after)
+
+    def on_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        index = self._existing(channel.guild)
+        if index:
+            index.remove_channel(channel)
+
+
+# Create a global instance
+guild_indexes = GuildIndexRegistry()
@@ -0,0 +1,149 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, Deque, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GuildJob:
+    """A queued unit of work against one guild."""
+
+    def __init__(self, key: Hashable, description: str, factory: Callable[[], Awaitable[Any]], estimated_steps: int):
+        self.key = key
+        self.description = description
+        self.factory = factory
+        self.estimated_steps = estimated_steps
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.merged_requests = 0
+        self.started_at: Optional[float] = None
+
+
+class GuildJobQueue:
+    """Serializes jobs per guild and merges duplicate requests.
+
+    Each guild gets its own FIFO queue and worker, so two applies never run
+    against the same guild at once while different guilds proceed in parallel.
+    A request whose key matches a queued or running job for the same guild
+    waits on that job's result instead of enqueueing another one.
+    """
+
+    def __init__(self, default_seconds_per_step: float = 0.5, smoothing: float = 0.3):
+        """Initialize the job queue.
+
+        Args:
+            default_seconds_per_step: Initial per-step duration used for ETAs
+            smoothing: Weight of the newest job when updating the per-step average
+        """
+        self.seconds_per_step = default_seconds_per_step
+        self.smoothing = smoothing
+        self._pending: Dict[int, Deque[GuildJob]] = {}
+        self._running: Dict[int, GuildJob] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def _find(self, guild_id: int, key: Hashable) -> Optional[GuildJob]:
+        """Find a queued or running job with the given key."""
+        running = self._running.get(guild_id)
+        if running and running.key == key:
+            return running
+        for job in self._pending.get(guild_id, ()):
+            if job.key == key:
+                return job
+        return None
+
+    async def submit(self, guild_id: int, key: Hashable, factory: Callable[[], Awaitable[Any]],
+                     description: str = "job", estimated_steps: int = 1) -> Any:
+        """Queue a job for a guild and wait for its result.
+
+        Args:
+            guild_id: The guild the job runs against
+            key: Identifies duplicate requests; equal keys are merged into one job
+            factory: Zero-argument callable returning the coroutine that does the work
+            description: Human-readable description for status output
+            estimated_steps: Rough size of the job, used for ETAs
+
+        Returns:
+            The result of the job (shared by every merged request)
+        """
+        job = self._find(guild_id, key)
+        if job:
+            job.merged_requests += 1
+            logger.info(f"Merged duplicate request for {job.description} in guild {guild_id}")
+        else:
+            job = GuildJob(key, description, factory, estimated_steps)
+            self._pending.setdefault(guild_id, deque()).append(job)
+            if guild_id not in self._workers:
+                self._workers[guild_id] = asyncio.create_task(self._work(guild_id))
+
+        # Shield so one cancelled waiter doesn't cancel the job for everyone else
+        return await asyncio.shield(job.future)
+
+    async def _work(self, guild_id: int) -> None:
+        """Run a guild's queued jobs one at a time until its queue is empty."""
+        pending = self._pending[guild_id]
+        try:
+            while pending:
+                job = pending.popleft()
+                self._running[guild_id] = job
+                job.started_at = time.monotonic()
+                try:
+                    result = await job.factory()
+                except Exception as e:
+                    self._fail(job, e)
+                else:
+                    job.future.set_result(result)
+                finally:
+                    # Cancelled (e.g. at shutdown): fail the job rather than leave its waiters hanging
+                    self._fail(job, RuntimeError(f"{job.description} was cancelled"))
+                    self._record_duration(job)
+                    del self._running[guild_id]
+        finally:
+            for job in pending:
+                self._fail(job, RuntimeError(f"{job.description} was cancelled"))
+            del self._workers[guild_id]
+            del self._pending[guild_id]
+
+    @staticmethod
+    def _fail(job: GuildJob, error: Exception) -> None:
+        """Fail a job's future unless it is already resolved."""
+        if job.future.done():
+            return
+        job.future.set_exception(error)
+        # Mark retrieved so unawaited failures aren't reported as never retrieved
+        job.future.exception()
+
+    def _record_duration(self, job: GuildJob) -> None:
+        """Fold a finished job's per-step duration into the running average."""
+        if job.started_at is None or job.estimated_steps <= 0:
+            return
+        per_step = (time.monotonic() - job.started_at) / job.estimated_steps
+        self.seconds_per_step += self.smoothing * (per_step - self.seconds_per_step)
+
+    def queue_depth(self, guild_id: int) -> int:
+        """Number of jobs queued or running for a guild."""
+        return len(self._pending.get(guild_id, ())) + (1 if guild_id in self._running else 0)
+
+    def estimated_time_remaining(self, guild_id: int) -> float:
+        """Estimated seconds until every job for a guild has finished."""
+        remaining = sum(job.estimated_steps for job in self._pending.get(guild_id, ())) * self.seconds_per_step
+        running = self._running.get(guild_id)
+        if running:
+            elapsed = time.monotonic() - running.started_at
+            remaining += max(running.estimated_steps * self.seconds_per_step - elapsed, 0)
+        return remaining
+
+    def status(self) -> Dict[int, Dict[str, Any]]:
+        """Queue depth, ETA and current job for every guild with queued work."""
+        return {
+            guild_id: {
+                "depth": self.queue_depth(guild_id),
+                "eta": self.estimated_time_remaining(guild_id),
+                "running": self._running[guild_id].description if guild_id in self._running else None
+            }
+            for guild_id in self._workers
+        }
+
+
+# Create a global instance
+guild_job_queue = GuildJobQueue()
@@ -0,0 +1,74 @@
+import math
+import hashlib
+import logging
+from typing import Any, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 2^12 one-byte registers: 4 KiB per sketch, about 1.6% standard error
+DEFAULT_PRECISION = 12
+
+
+def _hash64(value: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Fixed-size sketch estimating the number of distinct values added to it.
+
+    Adding a value and counting take constant memory however many values are
+    added, and two sketches of the same precision merge into the sketch of
+    their union, so per-day sketches combine into any longer range.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None):
+        """Initialize an empty sketch, or load one.
+
+        Args:
+            precision: Number of index bits; the sketch has 2^precision registers
+            registers: Serialized registers from to_bytes
+        """
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError(f"Expected {self.size} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Load a sketch serialized with to_bytes."""
+        return cls(int(math.log2(len(data))), data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, value: Any) -> None:
+        """Add a value; values are compared by their string form."""
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[Any]) -> None:
+        """Add several values."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        """Fold another sketch into this one, which then covers the union of both."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added."""
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
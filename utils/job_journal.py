@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Failed jobs not retried within this many seconds expire instead of being resumed
+FAILED_JOB_MAX_AGE = 24 * 3600
+
+# A running job whose owner hasn't renewed it within this many seconds is taken to be interrupted
+JOB_LEASE_SECONDS = 60
+
+
+class JobJournal:
+    """SQLite journal of template-apply jobs and the steps they have completed.
+
+    Every created or verified object is checkpointed under its plan step key
+    together with its Discord ID, so an interrupted job can resume without
+    redoing or re-checking the steps it already finished.
+
+    Several processes may share the journal. A running job is leased to the
+    journal that started it, which keeps it alive by updating updated_at;
+    only jobs whose lease has run out count as interrupted.
+    """
+
+    def __init__(self, db_path: str, failed_job_max_age: float = FAILED_JOB_MAX_AGE,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        """Open (and create if needed) the journal database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            failed_job_max_age: Seconds after its last update that a failed job can still be resumed
+            lease_seconds: Seconds a running job stays leased to its owner without being renewed
+        """
+        self.db_path = db_path
+        self.failed_job_max_age = failed_job_max_age
+        self.lease_seconds = lease_seconds
+        # The pid tells processes apart; the suffix keeps a reused pid from inheriting old leases
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                template_name TEXT NOT NULL,
+                options TEXT NOT NULL,
+                user_id INTEGER,
+                status TEXT NOT NULL,
+                owner TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_lookup ON jobs (guild_id, template_name, status);
+            CREATE TABLE IF NOT EXISTS job_steps (
+                job_id TEXT NOT NULL,
+                step_key TEXT NOT NULL,
+                object_id INTEGER,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (job_id, step_key)
+            );
+        """)
+        # Journals created before jobs were leased
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'owner' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    @staticmethod
+    def _encode_options(options: Optional[Dict[str, Any]]) -> str:
+        return json.dumps(options or {}, sort_keys=True)
+
+    def start_job(self, guild_id: int, template_name: str, options: Optional[Dict[str, Any]], user_id: Optional[int]) -> Tuple[str, bool]:
+        """Start a job, resuming an unfinished one for the same guild, template and options.
+
+        Failed jobs older than failed_job_max_age are expired first, since the
+        guild has likely changed too much since for their checkpoints to hold.
+        A running job is only resumed if this journal owns it or its lease has
+        run out, so a job still running in another process is never taken over.
+
+        Returns:
+            A tuple of (job ID, whether an existing job is being resumed)
+        """
+        encoded = self._encode_options(options)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_failed_jobs(now)
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE guild_id = ? AND template_name = ? AND options = ? "
+                    "AND (status = 'failed' OR (status = 'running' AND (owner IS ? OR updated_at < ?))) "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (guild_id, template_name, encoded, self.owner, now - self.lease_seconds)
+                ).fetchone()
+                if row:
+                    job_id = row[0]
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', owner = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                        (self.owner, now, job_id)
+                    )
+                else:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO jobs (job_id, guild_id, template_name, options, user_id, status, owner, "
+                        "created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'running', ?, ?, ?)",
+                        (job_id, guild_id, template_name, encoded, user_id, self.owner, now, now)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id, row is not None
+
+    def _expire_failed_jobs(self, now: float) -> None:
+        """Mark stale failed jobs as expired and drop their step journals; call in a transaction."""
+        cutoff = now - self.failed_job_max_age
+        self._conn.execute(
+            "DELETE FROM job_steps WHERE job_id IN "
+            "(SELECT job_id FROM jobs WHERE status = 'failed' AND updated_at < ?)",
+            (cutoff,)
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = 'expired' WHERE status = 'failed' AND updated_at < ?", (cutoff,)
+        )
+
+    def renew_lease(self, job_id: str) -> None:
+        """Keep a running job leased to this journal; call well within lease_seconds."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = 'running' AND owner = ?",
+                (time.time(), job_id, self.owner)
+            )
+
+    def completed_steps(self, job_id: str) -> Dict[str, Optional[int]]:
+        """Get the checkpointed steps of a job as {step_key: object_id}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT step_key, object_id FROM job_steps WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def record_step(self, job_id: str, step_key: str, object_id: Optional[int]) -> None:
+        """Checkpoint a single completed step."""
+        self.record_steps(job_id, [(step_key, object_id)])
+
+    def record_steps(self, job_id: str, steps: Iterable[Tuple[str, Optional[int]]]) -> None:
+        """Checkpoint several completed steps in one transaction."""
+        now = time.time()
+        rows = [(job_id, step_key, object_id, now) for step_key, object_id in steps]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_steps (job_id, step_key, object_id, completed_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            self._conn.execute("COMMIT")
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """Mark a job as finished.
+
+        Completed jobs drop their step journal; failed jobs keep it so the next
+        apply of the same template can resume from the last checkpoint.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id)
+            )
+            if status == 'completed':
+                self._conn.execute("DELETE FROM job_steps WHERE job_id = ?", (job_id,))
+            self._conn.execute("COMMIT")
+
+    def interrupted_jobs(self) -> List[Dict[str, Any]]:
+        """Claim the running jobs whose lease has run out, because the process running them stopped.
+
+        Claimed jobs are leased to this journal, so another process looking
+        for interrupted jobs at the same time doesn't resume them too.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT job_id, guild_id, template_name, options, user_id FROM jobs "
+                    "WHERE status = 'running' AND updated_at < ? ORDER BY created_at",
+                    (now - self.lease_seconds,)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET owner = ?, updated_at = ? WHERE job_id = ?",
+                    ((self.owner, now, row[0]) for row in rows)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {
+                "job_id": job_id,
+                "guild_id": guild_id,
+                "template_name": template_name,
+                "options": json.loads(options),
+                "user_id": user_id
+            }
+            for job_id, guild_id, template_name, options, user_id in rows
+        ]
@@ -0,0 +1,77 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (kind, template name); catalog-wide renders such as /help use None as the name
+RenderKey = Tuple[str, Optional[str]]
+
+
+class RenderCache:
+    """Memoizes rendered command output, such as ready-to-send embeds.
+
+    Entries are keyed by what was rendered and the content digest of the
+    template it was rendered from, so an edited template is never served
+    from a stale render. Catalog reloads also drop the affected entries
+    outright, freeing them instead of waiting for LRU eviction.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Number of renders kept before the least recently used is evicted
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[RenderKey, Optional[str]], Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: RenderKey, digest: Optional[str], render: Callable[[], Any]) -> Any:
+        """Return the cached render for a key and digest, rendering it on a miss.
+
+        Args:
+            key: (kind, template name) identifying the render
+            digest: Content digest of the template it depends on, if any
+            render: Builds the output; a None result is returned but not cached
+
+        Returns:
+            The cached or freshly rendered output
+        """
+        cache_key = (key, digest)
+        if cache_key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(cache_key)
+            return self._entries[cache_key]
+
+        self.misses += 1
+        value = render()
+        if value is not None:
+            self._entries[cache_key] = value
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, changes: Optional[Dict[str, List[str]]] = None) -> None:
+        """Drop renders made stale by a catalog reload.
+
+        Args:
+            changes: The reload's 'added', 'removed' and 'changed' template names;
+                None drops everything
+        """
+        if changes is None:
+            self._entries.clear()
+            return
+
+        stale_names = set(changes.get('removed', [])) | set(changes.get('changed', []))
+        catalog_changed = any(changes.get(kind) for kind in ('added', 'removed', 'changed'))
+        for cache_key in list(self._entries):
+            (_, name), _ = cache_key
+            if name in stale_names or (name is None and catalog_changed):
+                del self._entries[cache_key]
+        logger.debug(f"Invalidated rendered output for {len(stale_names)} template(s)")
+
+
+# Create a global instance
+render_cache = RenderCache()
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import logging
+from collections import deque, OrderedDict
+from typing import Deque, Dict, Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: interactive calls (a user is waiting on them) always go first
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class RestScheduler:
+    """Shares the bot token's global REST budget between every caller.
+
+    The budget is a token bucket refilled at Discord's global rate. Waiting
+    interactive calls are always served before bulk ones; bulk calls are
+    served round-robin by guild so one large template build can't starve
+    the others.
+    """
+
+    def __init__(self, rate: float = 45.0, burst: int = 10):
+        """Initialize the scheduler.
+
+        Args:
+            rate: Requests per second granted across all callers (Discord allows 50)
+            burst: Maximum number of tokens that can accumulate while idle
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._interactive: Deque[asyncio.Future] = deque()
+        self._bulk: "OrderedDict[Optional[int], Deque[asyncio.Future]]" = OrderedDict()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.requests = {INTERACTIVE: 0, BULK: 0}
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last refill."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _has_waiters(self) -> bool:
+        return bool(self._interactive) or bool(self._bulk)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """Pop the next live waiter: interactive first, then bulk round-robin by guild."""
+        while self._interactive:
+            waiter = self._interactive.popleft()
+            if not waiter.done():
+                return waiter
+
+        while self._bulk:
+            guild_id, waiters = next(iter(self._bulk.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                # Rotate the guild to the back so the next guild gets the next token
+                self._bulk.move_to_end(guild_id)
+            else:
+                del self._bulk[guild_id]
+            if not waiter.done():
+                return waiter
+        return None
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand out available tokens to waiters and schedule the next wakeup."""
+        self._refill()
+        while self._tokens >= 1 and self._has_waiters():
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._tokens -= 1
+            waiter.set_result(None)
+
+        if self._has_waiters() and self._wakeup is None:
+            delay = max((1 - self._tokens) / self.rate, 0)
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    async def acquire(self, guild_id: Optional[int] = None, lane: str = BULK) -> None:
+        """Wait for permission to send one REST request.
+
+        Args:
+            guild_id: The guild the request is for, used for fair sharing of the bulk lane
+            lane: INTERACTIVE or BULK
+        """
+        self.requests[lane] += 1
+        self._refill()
+        if self._tokens >= 1 and not self._has_waiters():
+            self._tokens -= 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        if lane == INTERACTIVE:
+            self._interactive.append(waiter)
+        else:
+            self._bulk.setdefault(guild_id, deque()).append(waiter)
+        self._dispatch()
+        await waiter
+
+    async def call(self, guild_id: Optional[int], lane: str, operation: Callable[[], Awaitable[Any]]) -> Any:
+        """Acquire a token, then run the operation.
+
+        Args:
+            guild_id: The guild the request is for
+            lane: INTERACTIVE or BULK
+            operation: Zero-argument callable returning the coroutine to await
+
+        Returns:
+            Whatever the operation returns
+        """
+        await self.acquire(guild_id, lane)
+        return await operation()
+
+    def backlog(self) -> Dict[str, int]:
+        """Number of callers currently waiting in each lane."""
+        return {
+            INTERACTIVE: sum(1 for waiter in self._interactive if not waiter.done()),
+            BULK: sum(1 for waiters in self._bulk.values() for waiter in waiters if not waiter.done())
+        }
+
+
+# Create a global instance
+rest_scheduler = RestScheduler()
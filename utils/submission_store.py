@@ -0,0 +1,183 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Submission review states
+STATUSES = ('pending', 'approved', 'rejected')
+
+# PRAGMA user_version once the legacy JSON file has been imported
+_MIGRATED_VERSION = 1
+
+
+class SubmissionStore:
+    """SQLite store of user-submitted templates.
+
+    Each submission is one row keyed by template name, with indexes for
+    listing by status and by submitter, so a submission is a single-row
+    upsert instead of a rewrite of every submission. WAL mode and a busy
+    timeout let the web and worker processes use the database at once.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None):
+        """Open (and create if needed) the submission database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            legacy_json_path: user_submitted_templates.json to import on first use, if it exists
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                data TEXT NOT NULL,
+                submitted_by INTEGER,
+                submitted_at TEXT NOT NULL,
+                status TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_submissions_status ON submissions (status, id);
+            CREATE INDEX IF NOT EXISTS ix_submissions_submitter ON submissions (submitted_by, id);
+        """)
+
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+
+    def _migrate_json(self, path: str) -> None:
+        """Import submissions from the legacy JSON file, once."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+                if version >= _MIGRATED_VERSION:
+                    self._conn.execute("COMMIT")
+                    return
+
+                submissions = {}
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        submissions = json.load(f).get('submissions', {})
+
+                for name, submission in submissions.items():
+                    metadata = submission.get('metadata', {})
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO submissions (name, data, submitted_by, submitted_at, status) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (name, json.dumps(submission.get('data', {})), metadata.get('submitted_by'),
+                         metadata.get('submitted_at', ''), metadata.get('status', 'pending'))
+                    )
+                self._conn.execute(f"PRAGMA user_version = {_MIGRATED_VERSION}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if submissions:
+            logger.info(f"Imported {len(submissions)} template submission(s) from {path}")
+
+    @staticmethod
+    def _row_to_submission(row) -> Dict[str, Any]:
+        submission_id, name, data, submitted_by, submitted_at, status = row
+        return {
+            'id': submission_id,
+            'name': name,
+            'data': json.loads(data),
+            'metadata': {
+                'submitted_by': submitted_by,
+                'submitted_at': submitted_at,
+                'status': status
+            }
+        }
+
+    def submit(self, name: str, data: Dict[str, Any], submitted_by: int, submitted_at: str) -> None:
+        """Store a submission as pending review, replacing an earlier one with the same name."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO submissions (name, data, submitted_by, submitted_at, status) "
+                "VALUES (?, ?, ?, ?, 'pending') "
+                "ON CONFLICT(name) DO UPDATE SET data = excluded.data, submitted_by = excluded.submitted_by, "
+                "submitted_at = excluded.submitted_at, status = 'pending'",
+                (name, json.dumps(data), submitted_by, submitted_at)
+            )
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get a submission by template name."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, name, data, submitted_by, submitted_at, status FROM submissions WHERE name = ?", (name,)
+            ).fetchone()
+        return self._row_to_submission(row) if row else None
+
+    def set_status(self, name: str, status: str) -> bool:
+        """Change a submission's review status.
+
+        Returns:
+            bool: True if the submission exists
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown submission status '{status}'")
+        with self._lock:
+            cursor = self._conn.execute("UPDATE submissions SET status = ? WHERE name = ?", (status, name))
+        return cursor.rowcount > 0
+
+    def list(self, status: Optional[str] = None, submitted_by: Optional[int] = None,
+             limit: int = 25, after_id: int = 0) -> List[Dict[str, Any]]:
+        """List submissions in submission order, one page at a time.
+
+        Args:
+            status: Only list submissions with this status
+            submitted_by: Only list submissions by this user
+            limit: Page size
+            after_id: The 'id' of the last submission on the previous page (0 for the first page)
+
+        Returns:
+            Up to limit submissions
+        """
+        conditions = ["id > ?"]
+        params: List[Any] = [after_id]
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if submitted_by is not None:
+            conditions.append("submitted_by = ?")
+            params.append(submitted_by)
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, data, submitted_by, submitted_at, status FROM submissions "
+                f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                params
+            ).fetchall()
+        return [self._row_to_submission(row) for row in rows]
+
+    def count(self, status: Optional[str] = None) -> int:
+        """Count submissions, optionally only those with one status."""
+        with self._lock:
+            if status is None:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM submissions").fetchone()
+            else:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM submissions WHERE status = ?", (status,)).fetchone()
+        return count
+
+    def approved_names(self) -> List[str]:
+        """Get the names of all approved submissions, without reading their definitions."""
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM submissions WHERE status = 'approved' ORDER BY id").fetchall()
+        return [name for (name,) in rows]
+
+    def approved_templates(self) -> Dict[str, Dict[str, Any]]:
+        """Get the definitions of all approved submissions by name."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, data FROM submissions WHERE status = 'approved' ORDER BY id"
+            ).fetchall()
+        return {name: json.loads(data) for name, data in rows}
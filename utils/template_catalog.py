@@ -0,0 +1,254 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+import tempfile
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# File layout (little-endian):
+#   header   magic, version, template count, source mtime (ns), source size
+#   index    one record per template: body offset, body length, SHA-1 digest,
+#            then name, description and category as length-prefixed UTF-8
+#   bodies   each template as zlib-compressed compact JSON
+MAGIC = b'SSTC'
+VERSION = 1
+_HEADER = struct.Struct('<4sHIqQ')
+_RECORD = struct.Struct('<QI20s')
+_STRING_LENGTH = struct.Struct('<H')
+_NO_VALUE = 0xFFFF
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """Index record of one template in a catalog."""
+    name: str
+    description: Optional[str]
+    category: Optional[str]
+    digest: str
+    offset: int = 0
+    length: int = 0
+
+
+def _encode_body(template: Dict[str, Any]) -> bytes:
+    return json.dumps(template, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def template_digest(template: Dict[str, Any]) -> str:
+    """Content digest of a template definition, computed as the catalog computes it."""
+    return hashlib.sha1(_encode_body(template)).hexdigest()
+
+
+def _entry_for(name: str, template: Dict[str, Any], body: bytes, offset: int = 0, length: int = 0) -> CatalogEntry:
+    return CatalogEntry(
+        name=name,
+        description=template.get('description'),
+        category=template.get('category'),
+        digest=hashlib.sha1(body).hexdigest(),
+        offset=offset,
+        length=length
+    )
+
+
+class TemplateCatalog(Mapping):
+    """Read-only mapping of template names to template definitions.
+
+    Names, descriptions, categories and content digests come from an index, so
+    listing templates never touches their bodies; a body is decoded the first
+    time its template is looked up.
+    """
+
+    def __init__(self, entries: Dict[str, CatalogEntry], read_body: Callable[[CatalogEntry], Dict[str, Any]]):
+        """Initialize the catalog.
+
+        Args:
+            entries: Index records by template name, in catalog order
+            read_body: Decodes the template an index record points at
+        """
+        self._entries = entries
+        self._read_body = read_body
+        self._decoded: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_templates(cls, templates: Dict[str, Dict[str, Any]]) -> 'TemplateCatalog':
+        """Wrap already decoded templates, e.g. when no binary catalog is available."""
+        entries = {name: _entry_for(name, template, _encode_body(template)) for name, template in templates.items()}
+        catalog = cls(entries, lambda entry: templates[entry.name])
+        catalog._decoded.update(templates)
+        return catalog
+
+    @classmethod
+    def open(cls, path: str) -> 'TemplateCatalog':
+        """Memory-map a binary catalog and read its index.
+
+        Raises:
+            ValueError: If the file is not a catalog of a supported version
+        """
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, _, _ = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            data.close()
+            raise ValueError(f"{path} is not a version {VERSION} template catalog")
+
+        entries = {}
+        position = _HEADER.size
+        for _ in range(count):
+            offset, length, digest = _RECORD.unpack_from(data, position)
+            position += _RECORD.size
+            strings = []
+            for _ in range(3):
+                (size,) = _STRING_LENGTH.unpack_from(data, position)
+                position += _STRING_LENGTH.size
+                if size == _NO_VALUE:
+                    strings.append(None)
+                else:
+                    strings.append(data[position:position + size].decode('utf-8'))
+                    position += size
+            name, description, category = strings
+            entries[name] = CatalogEntry(name, description, category, digest.hex(), offset, length)
+
+        def read_body(entry: CatalogEntry) -> Dict[str, Any]:
+            return json.loads(zlib.decompress(data[entry.offset:entry.offset + entry.length]))
+
+        return cls(entries, read_body)
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        template = self._decoded.get(name)
+        if template is None:
+            template = self._read_body(self._entries[name])
+            self._decoded[name] = template
+        return template
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._entries
+
+    def entry(self, name: str) -> Optional[CatalogEntry]:
+        """Get a template's index record without decoding its body."""
+        return self._entries.get(name)
+
+    def digest(self, name: str) -> Optional[str]:
+        """Content digest of a template, which changes whenever its definition does."""
+        entry = self._entries.get(name)
+        return entry.digest if entry else None
+
+
+def _encode_string(value: Optional[str]) -> bytes:
+    if value is None:
+        return _STRING_LENGTH.pack(_NO_VALUE)
+    encoded = str(value).encode('utf-8')[:_NO_VALUE - 1]
+    return _STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def build_catalog(templates: Dict[str, Dict[str, Any]], path: str, source_path: Optional[str] = None) -> None:
+    """Write templates to a binary catalog file.
+
+    The file is written next to its destination and moved into place, so
+    processes that have the previous catalog mapped keep reading it safely.
+
+    Args:
+        templates: Template definitions by name
+        path: Where to write the catalog
+        source_path: The JSON file the templates came from, recorded so stale catalogs can be detected
+    """
+    bodies = []
+    records = []
+    for name, template in templates.items():
+        body = _encode_body(template)
+        bodies.append(zlib.compress(body))
+        records.append(_entry_for(name, template, body))
+
+    index_size = sum(
+        _RECORD.size + len(_encode_string(r.name)) + len(_encode_string(r.description)) + len(_encode_string(r.category))
+        for r in records
+    )
+    offset = _HEADER.size + index_size
+
+    source_mtime, source_size = 0, 0
+    if source_path:
+        stat = os.stat(source_path)
+        source_mtime, source_size = stat.st_mtime_ns, stat.st_size
+
+    parts = [_HEADER.pack(MAGIC, VERSION, len(records), source_mtime, source_size)]
+    for record, body in zip(records, bodies):
+        parts.append(_RECORD.pack(offset, len(body), bytes.fromhex(record.digest)))
+        parts.append(_encode_string(record.name))
+        parts.append(_encode_string(record.description))
+        parts.append(_encode_string(record.category))
+        offset += len(body)
+    parts.extend(bodies)
+
+    # A temporary file of its own, so processes rebuilding the catalog at the same time never share one
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b''.join(parts))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def is_current(path: str, source_path: str) -> bool:
+    """Whether a binary catalog exists and was built from the current source file."""
+    try:
+        stat = os.stat(source_path)
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+        magic, version, _, source_mtime, source_size = _HEADER.unpack(header)
+    except (OSError, struct.error):
+        return False
+    return magic == MAGIC and version == VERSION and \
+        source_mtime == stat.st_mtime_ns and source_size == stat.st_size
+
+
+def load_catalog(path: str, source_path: str) -> TemplateCatalog:
+    """Open the binary catalog for a templates file, rebuilding it first if it is stale.
+
+    Args:
+        path: Location of the binary catalog
+        source_path: The templates JSON file
+
+    Returns:
+        The catalog; if the binary catalog can't be written, the parsed JSON is served directly
+    """
+    if is_current(path, source_path):
+        try:
+            return TemplateCatalog.open(path)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable template catalog {path}: {e}")
+
+    with open(source_path, 'r') as f:
+        templates = json.load(f)
+
+    try:
+        build_catalog(templates, path, source_path)
+        logger.info(f"Built template catalog {path} with {len(templates)} templates")
+        return TemplateCatalog.open(path)
+    except Exception as e:
+        logger.error(f"Failed to build template catalog {path}: {e}")
+        return TemplateCatalog.from_templates(templates)
+
+
+if __name__ == '__main__':
+    # Build step: python -m utils.template_catalog [templates.json [catalog.bin]]
+    import sys
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data_path, 'server_templates.json')
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + '.bin'
+    with open(source, 'r') as f:
+        build_catalog(json.load(f), target, source)
+    print(f"Wrote {target}")
@@ -1,13 +1,98 @@
 import json
 import os
 import time
+import asyncio
 import logging
 import discord
-from typing import Dict, List, Any
+from collections import OrderedDict
+from typing import Dict, List, Any, Awaitable, Callable, Optional, Tuple
 from utils.analytics_service import analytics_service
+from utils.execution_engine import (execution_engine, route_key, ROLE_ROUTE, ROLE_EDIT_ROUTE, CHANNEL_ROUTE,
+                                    CHANNEL_EDIT_ROUTE)
+from utils.template_plan import TemplatePlan, RolePlan, ChannelPlan, CategoryPlan, compile_template, compile_catalog
+from utils.template_catalog import TemplateCatalog, build_catalog, load_catalog, template_digest
+from utils.template_search import TemplateSearchIndex, build_search_index
+from utils.job_journal import JobJournal
+from utils.submission_store import SubmissionStore
+from utils.backup_store import BackupStore
+from utils.backup_catalog import RetentionPolicy
+from utils.guild_index import GuildIndex, guild_indexes
+from utils.guild_diff import (CategoryDiff, diff_roles, diff_role, diff_category, diff_channel_positions,
+                              resolve_overwrites)
+from utils.discord_helpers import update_channel_positions
 
 logger = logging.getLogger(__name__)
 
+# Backups are applied like templates under this prefix, e.g. 'backup:{guild_id}_{timestamp}'
+BACKUP_PLAN_PREFIX = 'backup:'
+
+# Compiled backup plans kept for restores in progress and resumed restore jobs
+MAX_BACKUP_PLANS = 8
+
+class _ChunkFeed:
+    """Hands backup chunks built on the event loop to BackupStore.save running in a worker thread.
+
+    The loop puts roles, then categories, then finishes; save consumes them
+    through stream('roles') and stream('categories'). At most max_pending
+    chunks are buffered, so memory stays bounded however large the guild.
+    Both sides wait on an asyncio queue: the loop awaits room in it, and the
+    worker thread blocks on a get scheduled on the loop, so neither polls.
+    Create the feed on the event loop it is fed from.
+    """
+
+    _END = object()
+    _ABORT = object()
+
+    def __init__(self, max_pending: int = 8):
+        self._loop = asyncio.get_running_loop()
+        self._items: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        # An item the roles stream read past its end, for the categories stream
+        self._pending: List[Any] = []
+
+    def _next(self) -> Any:
+        if self._pending:
+            return self._pending.pop()
+        item = asyncio.run_coroutine_threadsafe(self._items.get(), self._loop).result()
+        if item is self._ABORT:
+            raise RuntimeError("Backup aborted")
+        return item
+
+    def stream(self, kind: str):
+        """Yield the chunks of one kind; called from the worker thread, roles before categories."""
+        while True:
+            item = self._next()
+            if item is self._END or item[0] != kind:
+                self._pending.append(item)
+                return
+            yield item[1]
+
+    async def _put(self, item: Any, saving: asyncio.Future) -> None:
+        if not saving.done():
+            putting = asyncio.ensure_future(self._items.put(item))
+            await asyncio.wait({putting, saving}, return_when=asyncio.FIRST_COMPLETED)
+            if putting.done():
+                return
+            putting.cancel()
+        # The save stopped before taking every chunk, so it failed; raise its error
+        await saving
+
+    async def put(self, kind: str, value: Dict[str, Any], saving: asyncio.Future) -> None:
+        """Queue a 'roles' or 'categories' chunk, waiting while the buffer is full."""
+        await self._put((kind, value), saving)
+
+    async def finish(self, saving: asyncio.Future) -> Dict[str, Any]:
+        """Mark the end of the chunks and wait for the save to complete."""
+        await self._put(self._END, saving)
+        return await saving
+
+    def abort(self) -> None:
+        """Make the save fail instead of waiting for more chunks; call on the feed's event loop."""
+        # The buffered chunks will never be saved, and dropping them makes room for the marker
+        while not self._items.empty():
+            self._items.get_nowait()
+        self._items.put_nowait(self._ABORT)
+
+
 class TemplateManager:
     """Manager for Discord server templates."""
 
@@ -15,53 +100,145 @@ class TemplateManager:
         """Initialize the template manager and load templates."""
         self.templates_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         self.templates_file = os.path.join(self.templates_path, 'server_templates.json')
+        self.catalog_file = os.path.join(self.templates_path, 'server_templates.bin')
         self.user_templates_file = os.path.join(self.templates_path, 'user_submitted_templates.json')
         self.backup_path = os.path.join(self.templates_path, 'backups')
+        self.jobs_db_file = os.path.join(self.templates_path, 'jobs.db')
+        self.submissions_db_file = os.path.join(self.templates_path, 'submissions.db')
 
         # Create directories if they don't exist
         os.makedirs(self.templates_path, exist_ok=True)
         os.makedirs(self.backup_path, exist_ok=True)
 
+        self.templates_mtime = self._templates_mtime()
         self.templates = self._load_templates()
-        self.user_templates = self._load_user_templates()
-
-    def _load_templates(self) -> Dict[str, Any]:
-        """Load server templates from JSON file."""
+        # Plans are compiled on first use; see get_plan
+        self.plans: Dict[str, TemplatePlan] = {}
+        # Content digests of the approved user templates whose plans have been loaded
+        self.user_template_digests: Dict[str, str] = {}
+        self.reload_listeners: List[Callable[[Dict[str, List[str]]], Any]] = []
+        # Submissions used to live in user_templates_file; it is imported into the store once
+        self.submissions = SubmissionStore(self.submissions_db_file, self.user_templates_file)
+        self.job_journal = JobJournal(self.jobs_db_file)
+        self.backups = BackupStore(self.backup_path)
+        self.backups.import_legacy(self.backup_path)
+        self.backup_retention = RetentionPolicy.from_env()
+        self.backup_plans: "OrderedDict[str, TemplatePlan]" = OrderedDict()
+
+        # Built off the event loop by rebuild_search_index, and again after every catalog reload
+        self.search_index: Optional[TemplateSearchIndex] = None
+        self.reload_listeners.append(lambda changes: self.rebuild_search_index())
+
+    def _load_templates(self) -> TemplateCatalog:
+        """Load server templates from the binary catalog, building it from the JSON file if needed."""
         try:
-            with open(self.templates_file, 'r') as f:
-                return json.load(f)
+            return load_catalog(self.catalog_file, self.templates_file)
         except Exception as e:
             logger.error(f"Failed to load templates: {e}")
-            return {}
+            return TemplateCatalog.from_templates({})
 
-    def _load_user_templates(self) -> Dict[str, Any]:
-        """Load user-submitted templates from JSON file."""
+    def _templates_mtime(self) -> Optional[float]:
+        """Modification time of the templates file, or None if it is missing."""
         try:
-            if os.path.exists(self.user_templates_file):
-                with open(self.user_templates_file, 'r') as f:
-                    return json.load(f)
-            else:
-                # Create empty template file if it doesn't exist
-                with open(self.user_templates_file, 'w') as f:
-                    json.dump({}, f)
-                return {}
+            return os.stat(self.templates_file).st_mtime
+        except OSError:
+            return None
+
+    def _read_catalog(self) -> Tuple[TemplateCatalog, Dict[str, TemplatePlan]]:
+        """Read, validate and compile the templates file, then rebuild the binary catalog from it.
+
+        Unlike _load_templates this raises instead of falling back to an empty
+        catalog, so a broken edit never replaces a working one.
+
+        Raises:
+            ValueError: If the file isn't a JSON object of template objects
+        """
+        with open(self.templates_file, 'r') as f:
+            templates = json.load(f)
+        if not isinstance(templates, dict):
+            raise ValueError("Templates file must contain a JSON object")
+        invalid = [name for name, template in templates.items() if not isinstance(template, dict)]
+        if invalid:
+            raise ValueError(f"Invalid template definitions: {', '.join(invalid)}")
+        plans = compile_catalog(templates)
+
+        try:
+            build_catalog(templates, self.catalog_file, self.templates_file)
+            catalog = TemplateCatalog.open(self.catalog_file)
         except Exception as e:
-            logger.error(f"Failed to load user templates: {e}")
-            return {}
+            logger.error(f"Failed to rebuild template catalog {self.catalog_file}: {e}")
+            catalog = TemplateCatalog.from_templates(templates)
+        return catalog, plans
+
+    async def reload_templates(self, force: bool = False) -> Optional[Dict[str, List[str]]]:
+        """Reload the template catalog if the templates file changed.
 
-    def _save_user_templates(self) -> bool:
-        """Save user-submitted templates to JSON file.
+        The file is read and compiled in a worker thread; the new templates and
+        plans then replace the old ones together, without yielding to the event
+        loop in between, and the reload listeners are told what changed.
+
+        Args:
+            force: Reload even if the file's modification time hasn't changed
 
         Returns:
-            bool: True if successful, False otherwise
+            The template names that were 'added', 'removed' and 'changed', or None
+            if nothing was reloaded
         """
+        mtime = self._templates_mtime()
+        if mtime is None or (mtime == self.templates_mtime and not force):
+            return None
+
         try:
-            with open(self.user_templates_file, 'w') as f:
-                json.dump(self.user_templates, f, indent=4)
-            return True
+            templates, plans = await asyncio.to_thread(self._read_catalog)
         except Exception as e:
-            logger.error(f"Error saving user templates: {e}")
-            return False
+            # Remember the mtime so a broken file is reported once, not on every poll
+            self.templates_mtime = mtime
+            logger.error(f"Keeping the current templates, failed to reload {self.templates_file}: {e}")
+            return None
+
+        old_templates = self.templates
+        changes = {
+            'added': [name for name in templates if name not in old_templates],
+            'removed': [name for name in old_templates if name not in templates],
+            'changed': [name for name in templates
+                        if name in old_templates and templates.digest(name) != old_templates.digest(name)]
+        }
+
+        self.templates, self.plans, self.templates_mtime = templates, plans, mtime
+        logger.info(f"Reloaded templates: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+                    f"{len(changes['changed'])} changed")
+
+        for listener in self.reload_listeners:
+            try:
+                result = listener(changes)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error in template reload listener: {e}")
+        return changes
+
+    async def watch_templates(self, interval: float = 5.0) -> None:
+        """Poll the templates file and reload it whenever it changes.
+
+        Args:
+            interval: Seconds between modification time checks
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload_templates()
+
+    async def compact_backups(self, interval: float = 3600.0) -> None:
+        """Periodically delete backups the retention policy no longer keeps.
+
+        Args:
+            interval: Seconds between compaction runs
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.backups.compact, self.backup_retention)
+            except Exception as e:
+                logger.error(f"Error compacting backups: {e}")
+            await asyncio.sleep(interval)
 
     def get_template_names(self) -> List[str]:
         """Get the list of template names."""
@@ -69,7 +246,7 @@ class TemplateManager:
 
     def get_template_list(self) -> Dict[str, str]:
         """Get a dictionary of template names and descriptions."""
-        return {name: template.get('description', 'No description') for name, template in self.templates.items()}
+        return {name: self._description(name) for name in self.templates}
 
     def get_templates_by_category(self) -> Dict[str, Dict[str, str]]:
         """Get templates organized by categories.
@@ -79,21 +256,167 @@ class TemplateManager:
         """
         categorized = {}
 
-        for name, template in self.templates.items():
-            # Get category or use 'Other' as default
-            category = template.get('category', 'Other')
+        for name in self.templates:
+            # Get category or use 'Other' as default; the catalog index has it without decoding the template
+            category = self.templates.entry(name).category or 'Other'
 
             if category not in categorized:
                 categorized[category] = {}
 
-            categorized[category][name] = template.get('description', 'No description')
+            categorized[category][name] = self._description(name)
 
         return categorized
 
+    def _description(self, name: str) -> str:
+        description = self.templates.entry(name).description
+        return description if description is not None else 'No description'
+
     def get_template(self, name: str) -> Dict[str, Any]:
         """Get a specific template by name."""
         return self.templates.get(name, {})
 
+    def get_template_digest(self, name: str) -> Optional[str]:
+        """Get a template's content digest, which changes whenever its definition does.
+
+        Approved user templates are digested from their submitted definition
+        when their plan is loaded, so a resubmission is never served from
+        renders of the old one. Returns None for templates that don't exist,
+        aren't approved or haven't been loaded yet.
+        """
+        return self.templates.digest(name) or self.user_template_digests.get(name)
+
+    def get_plan(self, name: str) -> Optional[TemplatePlan]:
+        """Get the compiled execution plan for a template, or None if it doesn't exist or is invalid.
+
+        Compiling an approved user template or a backup reads it from disk;
+        on the event loop, use load_plan instead.
+        """
+        if name.startswith(BACKUP_PLAN_PREFIX):
+            return self._get_backup_plan(name[len(BACKUP_PLAN_PREFIX):])
+
+        plan = self.plans.get(name)
+        if plan is None:
+            # Approved user submissions are available like catalog templates
+            digest = None
+            if name in self.templates:
+                template = self.templates[name]
+            else:
+                submission = self.submissions.get(name)
+                if not submission or submission['metadata']['status'] != 'approved':
+                    return None
+                template = submission['data']
+                digest = template_digest(template)
+            try:
+                plan = compile_template(name, template)
+            except Exception as e:
+                logger.error(f"Failed to compile template {name}: {e}")
+                return None
+            self.plans[name] = plan
+            if digest:
+                self.user_template_digests[name] = digest
+        return plan
+
+    async def load_plan(self, name: str) -> Optional[TemplatePlan]:
+        """Get a template's plan like get_plan, reading from disk in a worker thread.
+
+        Compiled plans and catalog templates are returned straight away; only
+        an approved user template or a backup that isn't compiled yet is read
+        from its store, off the event loop.
+        """
+        if name in self.plans or name in self.backup_plans or name in self.templates:
+            return self.get_plan(name)
+        return await asyncio.to_thread(self.get_plan, name)
+
+    def _compile_backup(self, backup_id: str) -> TemplatePlan:
+        """Read a backup chunk by chunk and compile it into a plan named after it."""
+        return compile_template(f"{BACKUP_PLAN_PREFIX}{backup_id}", self.backups.open_backup(backup_id))
+
+    def _cache_backup_plan(self, plan: TemplatePlan) -> None:
+        self.backup_plans[plan.name] = plan
+        self.backup_plans.move_to_end(plan.name)
+        if len(self.backup_plans) > MAX_BACKUP_PLANS:
+            self.backup_plans.popitem(last=False)
+
+    def _get_backup_plan(self, backup_id: str) -> Optional[TemplatePlan]:
+        """Get the compiled plan for restoring a backup, reading the backup if it isn't loaded yet."""
+        plan = self.backup_plans.get(f"{BACKUP_PLAN_PREFIX}{backup_id}")
+        if plan is None:
+            try:
+                plan = self._compile_backup(backup_id)
+            except Exception as e:
+                logger.error(f"Failed to load backup {backup_id}: {e}")
+                return None
+        self._cache_backup_plan(plan)
+        return plan
+
+    async def load_backup_plan(self, guild_id: int, backup_id: Optional[str] = None) -> Optional[TemplatePlan]:
+        """Load one of a guild's backups as a plan that apply_template can restore.
+
+        The backup is read and compiled in a worker thread; afterwards
+        get_plan returns it under the plan's name without touching disk.
+
+        Args:
+            guild_id: The guild being restored; backups of other guilds are refused
+            backup_id: The backup to load, or None for the guild's newest backup
+
+        Returns:
+            The plan, or None if the guild has no such backup
+        """
+        if backup_id is None:
+            newest = self.backups.list_backups(guild_id, limit=1)
+            if not newest:
+                return None
+            backup_id = newest[0]['backup_id']
+        else:
+            record = self.backups.get_backup(backup_id)
+            if not record or record['guild_id'] != guild_id:
+                return None
+
+        plan = self.backup_plans.get(f"{BACKUP_PLAN_PREFIX}{backup_id}")
+        if plan is None:
+            try:
+                plan = await asyncio.to_thread(self._compile_backup, backup_id)
+            except Exception as e:
+                logger.error(f"Failed to load backup {backup_id}: {e}")
+                return None
+        self._cache_backup_plan(plan)
+        return plan
+
+    def get_approved_user_templates(self) -> Dict[str, Dict[str, Any]]:
+        """Get the definitions of approved user-submitted templates by name."""
+        return {name: data for name, data in self.submissions.approved_templates().items() if isinstance(data, dict)}
+
+    async def rebuild_search_index(self) -> None:
+        """Rebuild the template search index in a worker thread and swap it in."""
+        templates = self.templates
+        user_templates = self.get_approved_user_templates()
+        try:
+            self.search_index = await asyncio.to_thread(
+                build_search_index, ((name, templates[name]) for name in templates), user_templates.items()
+            )
+            logger.info(f"Indexed {len(self.search_index)} templates for search")
+        except Exception as e:
+            logger.error(f"Failed to build template search index: {e}")
+
+    def search_templates(self, query: str, limit: int = 25) -> List[str]:
+        """Find template names matching a query, best match first.
+
+        Until the search index has been built, names are matched by prefix only.
+
+        Args:
+            query: Text typed by the user
+            limit: Maximum number of names to return
+
+        Returns:
+            Matching template names, catalog and approved user templates alike
+        """
+        if self.search_index is not None:
+            return self.search_index.search(query, limit)
+
+        query = query.strip().lower()
+        names = list(self.templates) + self.submissions.approved_names()
+        return [name for name in names if name.lower().startswith(query)][:limit]
+
     def generate_preview(self, template_name: str, user_id=None, guild_id=None) -> Dict[str, Any]:
         """Generate a preview of a template with categorized information.
 
@@ -105,74 +428,44 @@ class TemplateManager:
         Returns:
             A dictionary with preview information categorized by roles, categories, channels, etc.
         """
-        template = self.get_template(template_name)
-        if not template:
+        plan = self.get_plan(template_name)
+        if not plan:
             return {"error": f"Template '{template_name}' not found"}
 
         # Track template view if user_id is provided
         if user_id:
-            analytics_service.track_template_view(template_name, user_id, guild_id)
+            analytics_service.track_template_view_nowait(template_name, user_id, guild_id)
 
         # Extract basic information
         preview = {
             "name": template_name,
-            "description": template.get("description", "No description available"),
-            "category": template.get("category", "Other"),
-            "image_url": template.get("image_url", None),
-            "role_count": len(template.get("roles", [])),
-            "category_count": len(template.get("categories", [])),
-            "channel_count": sum(len(category.get("channels", [])) for category in template.get("categories", [])),
+            "description": plan.description,
+            "category": plan.category,
+            "image_url": plan.image_url,
+            "role_count": plan.role_count,
+            "category_count": plan.category_count,
+            "channel_count": plan.channel_count,
             "roles": [],
             "categories": []
         }
 
         # Extract role information
-        for role in template.get("roles", []):
-            role_info = {
-                "name": role.get("name", "Unnamed Role"),
-                "color": role.get("color", "0x000000"),
-                "key_permissions": []
-            }
-
-            # Add notable permissions
-            permissions = role.get("permissions", {})
-            if permissions.get("administrator", False):
-                role_info["key_permissions"].append("Administrator")
-            else:
-                if permissions.get("manage_guild", False):
-                    role_info["key_permissions"].append("Manage Server")
-                if permissions.get("manage_roles", False):
-                    role_info["key_permissions"].append("Manage Roles")
-                if permissions.get("manage_channels", False):
-                    role_info["key_permissions"].append("Manage Channels")
-                if permissions.get("kick_members", False):
-                    role_info["key_permissions"].append("Kick Members")
-                if permissions.get("ban_members", False):
-                    role_info["key_permissions"].append("Ban Members")
-                if permissions.get("manage_messages", False):
-                    role_info["key_permissions"].append("Manage Messages")
-                if permissions.get("priority_speaker", False):
-                    role_info["key_permissions"].append("Priority Speaker")
-
-            preview["roles"].append(role_info)
+        for role in plan.roles:
+            preview["roles"].append({
+                "name": role.name,
+                "color": role.color_hex,
+                "key_permissions": list(role.key_permissions)
+            })
 
         # Extract category and channel information
-        for category in template.get("categories", []):
-            category_info = {
-                "name": category.get("name", "Unnamed Category"),
-                "channels": []
-            }
-
-            # Add channel information
-            for channel in category.get("channels", []):
-                channel_info = {
-                    "name": channel.get("name", "Unnamed Channel"),
-                    "type": channel.get("type", "text"),
-                    "topic": channel.get("topic", "")
-                }
-                category_info["channels"].append(channel_info)
-
-            preview["categories"].append(category_info)
+        for category in plan.categories:
+            preview["categories"].append({
+                "name": category.name,
+                "channels": [
+                    {"name": channel.name, "type": channel.type, "topic": channel.topic}
+                    for channel in category.channels
+                ]
+            })
 
         return preview
 
@@ -187,14 +480,18 @@ class TemplateManager:
                 include_categories: Whether to include categories
                 include_text_channels: Whether to include text channels
                 include_voice_channels: Whether to include voice channels
+                repair: Whether existing roles and channels that drifted from the template
+                    are edited back, as when restoring a backup
             user_id: The Discord user ID of who is applying the template
         """
         success = False
+        job_id = None
+        heartbeat = None
 
         try:
-            # Get template data
-            template = self.get_template(template_name)
-            if not template:
+            # Get the compiled template plan
+            plan = await self.load_plan(template_name)
+            if not plan:
                 raise ValueError(f"Template '{template_name}' not found")
 
             # Default options if none provided
@@ -206,147 +503,135 @@ class TemplateManager:
             include_categories = options.get('include_categories', True)
             include_text_channels = options.get('include_text_channels', True)
             include_voice_channels = options.get('include_voice_channels', True)
+            repair = options.get('repair', False)
 
-            # Setup roles and channels
+            reason = f"ServerSetup Bot - Applying {template_name} template"
+
+            # Run as a journaled job; an unfinished job for the same apply resumes from its checkpoints
+            job_id, resumed = await asyncio.to_thread(self.job_journal.start_job, guild.id, template_name, options, user_id)
+            heartbeat = asyncio.ensure_future(self._renew_lease(job_id))
+            completed = await asyncio.to_thread(self.job_journal.completed_steps, job_id) if resumed else {}
+            if resumed:
+                logger.info(f"Resuming job {job_id} for {template_name} in guild {guild.id} "
+                            f"from {len(completed)} checkpointed steps")
+            failed_steps = 0
+
+            # Look objects up through the guild's index; everything below only touches what it's missing
+            index = guild_indexes.get(guild)
             role_objects = {}
 
-            # Create roles
+            # Create roles; they don't depend on each other, so missing ones are created concurrently
             if include_roles:
-                for role in template.get('roles', []):
-                    try:
-                        existing_role = discord.utils.get(guild.roles, name=role['name'])
-                        if existing_role:
-                            role_objects[role['name']] = existing_role
-                            continue
-
-                        color = int(role.get('color', '0x000000'), 16)
-                        permissions = discord.Permissions()
-
-                        # Set permissions based on template
-                        for perm_name, perm_value in role.get('permissions', {}).items():
-                            if hasattr(permissions, perm_name):
-                                setattr(permissions, perm_name, perm_value)
-
-                        new_role = await guild.create_role(
-                            name=role['name'],
-                            color=discord.Color(color),
-                            permissions=permissions,
-                            hoist=role.get('hoist', False),
-                            mentionable=role.get('mentionable', False),
-                            reason=f"ServerSetup Bot - Applying {template_name} template"
-                        )
-                        role_objects[role['name']] = new_role
-                        logger.debug(f"Created role: {role['name']}")
-                    except Exception as e:
-                        logger.error(f"Error creating role {role['name']}: {e}")
-
-            # Create categories and channels
+                pending_roles = []
+                for role in plan.roles:
+                    role_id = completed.get(role.key)
+                    checkpointed_role = guild.get_role(role_id) if role_id else None
+                    if checkpointed_role:
+                        role_objects[role.name] = checkpointed_role
+                    else:
+                        pending_roles.append(role)
+
+                existing_roles, missing_roles = diff_roles(pending_roles, index)
+                for role, existing_role in existing_roles:
+                    role_objects[role.name] = existing_role
+
+                # Edit roles that drifted back in line; the rest only need a checkpoint
+                role_edits = []
+                if repair:
+                    role_edits = [(role, existing_role, diff_role(role, existing_role)) for role, existing_role in existing_roles]
+                    role_edits = [edit for edit in role_edits if edit[2]]
+                drifted = {role.key for role, _, _ in role_edits}
+                steps = [(role.key, existing_role.id) for role, existing_role in existing_roles if role.key not in drifted]
+
+                results = await execution_engine.gather(
+                    route_key(ROLE_EDIT_ROUTE, guild_id=guild.id),
+                    [self._role_editor(existing_role, changes, reason) for _, existing_role, changes in role_edits],
+                    guild_id=guild.id
+                )
+                for (role, existing_role, _), result in zip(role_edits, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Error repairing role {role.name}: {result}")
+                        failed_steps += 1
+                    else:
+                        steps.append((role.key, existing_role.id))
+                        logger.debug(f"Repaired role: {role.name}")
+                await self._checkpoint(job_id, steps)
+
+                results = await execution_engine.gather(
+                    route_key(ROLE_ROUTE, guild_id=guild.id),
+                    [self._role_creator(guild, role, reason) for role in missing_roles],
+                    guild_id=guild.id
+                )
+                steps = []
+                for role, result in zip(missing_roles, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Error creating role {role.name}: {result}")
+                        failed_steps += 1
+                    else:
+                        role_objects[role.name] = result
+                        index.add_role(result)
+                        steps.append((role.key, result.id))
+                        logger.debug(f"Created role: {role.name}")
+                await self._checkpoint(job_id, steps)
+
+            # Create categories and channels; each category is built independently once roles exist
             if include_categories:
-                for category_data in template.get('categories', []):
-                    try:
-                        # Create category overwrites
-                        overwrites = {}
-                        for role_name, perms in category_data.get('permissions', {}).items():
-                            role = role_objects.get(role_name) or discord.utils.get(guild.roles, name=role_name)
-                            if role:
-                                overwrite = discord.PermissionOverwrite(**perms)
-                                overwrites[role] = overwrite
-
-                        # Check if category exists
-                        category_name = category_data['name']
-                        existing_category = discord.utils.get(guild.categories, name=category_name)
-
-                        if existing_category:
-                            category = existing_category
-                            # Update permissions
-                            for role, overwrite in overwrites.items():
-                                await category.set_permissions(role, overwrite=overwrite)
-                        else:
-                            # Create new category
-                            category = await guild.create_category(
-                                name=category_name,
-                                overwrites=overwrites,
-                                reason=f"ServerSetup Bot - Applying {template_name} template"
-                            )
-                            logger.debug(f"Created category: {category_name}")
-
-                        # Create channels in the category
-                        for channel_data in category_data.get('channels', []):
-                            channel_name = channel_data['name']
-                            channel_type = channel_data.get('type', 'text')
-
-                            # Skip if channel already exists in this category
-                            existing_channel = discord.utils.get(category.channels, name=channel_name)
-                            if existing_channel:
-                                continue
-
-                            # Skip based on channel type and options
-                            if (channel_type == 'text' and not include_text_channels) or \
-                              (channel_type == 'voice' and not include_voice_channels):
-                                continue
-
-                            # Create channel overwrites
-                            channel_overwrites = overwrites.copy()  # Start with category overwrites
-                            for role_name, perms in channel_data.get('permissions', {}).items():
-                                role = role_objects.get(role_name) or discord.utils.get(guild.roles, name=role_name)
-                                if role:
-                                    # Start with category overwrite if exists
-                                    base_overwrite = channel_overwrites.get(role, discord.PermissionOverwrite())
-                                    # Update with channel-specific permissions
-                                    for perm_name, perm_value in perms.items():
-                                        setattr(base_overwrite, perm_name, perm_value)
-                                    channel_overwrites[role] = base_overwrite
-
-                            if channel_type == 'text':
-                                await guild.create_text_channel(
-                                    name=channel_name,
-                                    category=category,
-                                    overwrites=channel_overwrites,
-                                    topic=channel_data.get('topic', ''),
-                                    slowmode_delay=channel_data.get('slowmode', 0),
-                                    nsfw=channel_data.get('nsfw', False),
-                                    reason=f"ServerSetup Bot - Applying {template_name} template"
-                                )
-                            elif channel_type == 'voice':
-                                await guild.create_voice_channel(
-                                    name=channel_name,
-                                    category=category,
-                                    overwrites=channel_overwrites,
-                                    bitrate=channel_data.get('bitrate', 64000),
-                                    user_limit=channel_data.get('user_limit', 0),
-                                    reason=f"ServerSetup Bot - Applying {template_name} template"
-                                )
-                            elif channel_type == 'forum':
-                                await guild.create_forum_channel(
-                                    name=channel_name,
-                                    category=category,
-                                    overwrites=channel_overwrites,
-                                    topic=channel_data.get('topic', ''),
-                                    reason=f"ServerSetup Bot - Applying {template_name} template"
-                                )
-                            logger.debug(f"Created channel: {channel_name}")
-
-                    except Exception as e:
-                        logger.error(f"Error creating category {category_data['name']}: {e}")
-
-            # Log completion
-            logger.info(f"Successfully applied {template_name} template to guild {guild.name} ({guild.id})")
-            success = True
+                category_diffs = [
+                    diff_category(category_plan, index, role_objects, include_text_channels,
+                                  include_voice_channels, completed, repair)
+                    for category_plan in plan.categories
+                ]
+
+                # Categories that are already up to date only need a checkpoint
+                await self._checkpoint(job_id, [
+                    (category_diff.plan.key, category_diff.existing.id)
+                    for category_diff in category_diffs
+                    if category_diff.is_empty and not category_diff.checkpointed
+                ])
+
+                results = await asyncio.gather(*(
+                    self._apply_category(guild, category_diff, index, role_objects, reason, job_id)
+                    for category_diff in category_diffs if not category_diff.is_empty
+                ))
+                failed_steps += results.count(False)
+
+                # Put every category's channels in template order, one bulk update per category
+                results = await asyncio.gather(*(
+                    self._order_category(guild, category_plan, index, reason)
+                    for category_plan in plan.categories
+                ))
+                failed_steps += results.count(False)
+
+            if failed_steps:
+                # Keep the journal so the next apply resumes instead of starting over
+                await asyncio.to_thread(self.job_journal.finish_job, job_id, 'failed', f"{failed_steps} step(s) failed")
+                logger.warning(f"Applied {template_name} template to guild {guild.name} ({guild.id}) "
+                               f"with {failed_steps} failed step(s)")
+            else:
+                await asyncio.to_thread(self.job_journal.finish_job, job_id, 'completed')
+                # Log completion
+                logger.info(f"Successfully applied {template_name} template to guild {guild.name} ({guild.id})")
+            # Analytics agree with the journal: a run with failed steps isn't a success
+            success = not failed_steps
 
         except Exception as e:
             logger.error(f"Error applying template {template_name} to guild {guild.name} ({guild.id}): {e}")
+            if job_id:
+                await asyncio.to_thread(self.job_journal.finish_job, job_id, 'failed', str(e))
             success = False
             raise
 
         finally:
-            # Track template usage if user_id is provided
-            if user_id:
+            if heartbeat:
+                heartbeat.cancel()
+            # Track template usage if user_id is provided; restoring a backup isn't template usage
+            if user_id and not template_name.startswith(BACKUP_PLAN_PREFIX):
                 # Get template data
-                template_data = self.get_template(template_name)
-                is_ai_generated = template_data.get('is_ai_generated', False) if template_data else False
+                plan = await self.load_plan(template_name)
+                is_ai_generated = plan.is_ai_generated if plan else False
 
-                # Track template usage
-                analytics_service.track_template_usage(
+                # Track template usage; it is written to the database in the background
+                await analytics_service.track_template_usage(
                     template_name=template_name,
                     guild_id=guild.id,
                     guild_name=guild.name,
@@ -356,23 +641,284 @@ class TemplateManager:
                     success=success
                 )
 
+    async def _checkpoint(self, job_id: str, steps: List[Tuple[str, Optional[int]]]) -> None:
+        """Checkpoint a batch of completed steps in a worker thread, off the event loop."""
+        if steps:
+            await asyncio.to_thread(self.job_journal.record_steps, job_id, steps)
+
+    async def _renew_lease(self, job_id: str) -> None:
+        """Keep a job leased to this process while it runs, so no other process resumes it."""
+        while True:
+            await asyncio.sleep(self.job_journal.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.job_journal.renew_lease, job_id)
+            except Exception as e:
+                logger.error(f"Failed to renew the lease of job {job_id}: {e}")
+
+    async def resume_interrupted_jobs(self, client: discord.Client, apply: Callable[..., Awaitable[Any]] = None) -> int:
+        """Resume apply jobs that were still running when the process running them stopped.
+
+        Only jobs whose lease has run out are resumed, so jobs still running
+        in another process sharing the journal are left alone.
+
+        Args:
+            client: The connected Discord client, used to look up the jobs' guilds
+            apply: Optional coroutine function used instead of apply_template,
+                e.g. to route resumed jobs through a job queue
+
+        Returns:
+            int: The number of jobs resumed
+        """
+        apply = apply or self.apply_template
+
+        async def resume(job: Dict[str, Any]) -> bool:
+            guild = client.get_guild(job['guild_id'])
+            if not guild:
+                logger.warning(f"Cannot resume job {job['job_id']}: guild {job['guild_id']} is unavailable")
+                await asyncio.to_thread(self.job_journal.finish_job, job['job_id'], 'failed', "Guild unavailable on resume")
+                return False
+
+            try:
+                await apply(guild, job['template_name'], job['options'], job['user_id'])
+                return True
+            except Exception as e:
+                logger.error(f"Error resuming job {job['job_id']}: {e}")
+                return False
+
+        jobs = await asyncio.to_thread(self.job_journal.interrupted_jobs)
+        results = await asyncio.gather(*(resume(job) for job in jobs))
+        return sum(results)
+
+    @staticmethod
+    def _role_creator(guild: discord.Guild, role: RolePlan, reason: str):
+        """Build a zero-argument callable that creates a template role."""
+        return lambda: guild.create_role(
+            name=role.name,
+            color=discord.Color(role.color),
+            permissions=discord.Permissions(role.permissions),
+            hoist=role.hoist,
+            mentionable=role.mentionable,
+            reason=reason
+        )
+
+    @staticmethod
+    def _role_editor(role: discord.Role, changes: Dict[str, Any], reason: str):
+        """Build a zero-argument callable that applies one edit to an existing role."""
+        return lambda: role.edit(**changes, reason=reason)
+
+    @staticmethod
+    def _channel_creator(guild: discord.Guild, category: discord.CategoryChannel, channel_plan: ChannelPlan,
+                         role_objects: Dict[str, discord.Role], index: GuildIndex, reason: str):
+        """Build a zero-argument callable that creates a template channel in a category.
+
+        Returns None for channel types the bot doesn't create.
+        """
+        # Channel overwrites already include the category's
+        overwrites = resolve_overwrites(channel_plan.overwrites, role_objects, index)
+
+        if channel_plan.type == 'text':
+            return lambda: guild.create_text_channel(
+                name=channel_plan.name,
+                category=category,
+                overwrites=overwrites,
+                topic=channel_plan.topic,
+                slowmode_delay=channel_plan.slowmode,
+                nsfw=channel_plan.nsfw,
+                reason=reason
+            )
+        elif channel_plan.type == 'voice':
+            return lambda: guild.create_voice_channel(
+                name=channel_plan.name,
+                category=category,
+                overwrites=overwrites,
+                bitrate=channel_plan.bitrate,
+                user_limit=channel_plan.user_limit,
+                reason=reason
+            )
+        elif channel_plan.type == 'forum':
+            return lambda: guild.create_forum(
+                name=channel_plan.name,
+                category=category,
+                overwrites=overwrites,
+                topic=channel_plan.topic,
+                reason=reason
+            )
+        return None
+
+    @staticmethod
+    def _channel_editor(channel: discord.abc.GuildChannel, changes: Dict[str, Any], reason: str):
+        """Build a zero-argument callable that applies one edit to an existing channel."""
+        return lambda: channel.edit(**changes, reason=reason)
+
+    async def _apply_category(self, guild: discord.Guild, category_diff: CategoryDiff, index: GuildIndex,
+                              role_objects: Dict[str, discord.Role], reason: str, job_id: str) -> bool:
+        """Create or update one template category, create its missing channels and repair drifted ones.
+
+        Channels are created concurrently through the execution engine without
+        positions; _order_category puts them in template order afterwards.
+        Each drifted channel gets a single edit covering all of its changes.
+        Completed steps are checkpointed in the job journal, one batch per gather.
+
+        Returns:
+            bool: True if every step succeeded, False otherwise
+        """
+        channel_route = route_key(CHANNEL_ROUTE, guild_id=guild.id)
+        category_name = category_diff.plan.name
+
+        try:
+            category = category_diff.existing
+            if category:
+                # Update all changed overwrites with a single edit
+                if category_diff.overwrites_changed:
+                    await execution_engine.run(
+                        route_key(CHANNEL_EDIT_ROUTE, channel_id=category.id),
+                        lambda: category.edit(overwrites=category_diff.overwrites, reason=reason),
+                        guild_id=guild.id
+                    )
+                    logger.debug(f"Updated permissions for category: {category_name}")
+                if not category_diff.checkpointed:
+                    await self._checkpoint(job_id, [(category_diff.plan.key, category.id)])
+            else:
+                # Create new category
+                category = await execution_engine.run(
+                    channel_route,
+                    lambda: guild.create_category(name=category_name, overwrites=category_diff.overwrites, reason=reason),
+                    guild_id=guild.id
+                )
+                index.add_channel(category)
+                await self._checkpoint(job_id, [(category_diff.plan.key, category.id)])
+                logger.debug(f"Created category: {category_name}")
+
+            # Create the channels the category is missing
+            channel_plans = []
+            creators = []
+            for channel_plan in category_diff.channels_to_create:
+                creator = self._channel_creator(guild, category, channel_plan, role_objects, index, reason)
+                if creator:
+                    channel_plans.append(channel_plan)
+                    creators.append(creator)
+
+            results = await execution_engine.gather(channel_route, creators, guild_id=guild.id)
+            succeeded = True
+            steps = []
+            for channel_plan, result in zip(channel_plans, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error creating channel {channel_plan.name}: {result}")
+                    succeeded = False
+                else:
+                    index.add_channel(result)
+                    steps.append((channel_plan.key, result.id))
+                    logger.debug(f"Created channel: {channel_plan.name}")
+            await self._checkpoint(job_id, steps)
+
+            # Edits are rate limited per channel, so each one runs on its own route
+            results = await asyncio.gather(*(
+                execution_engine.run(
+                    route_key(CHANNEL_EDIT_ROUTE, channel_id=channel.id),
+                    self._channel_editor(channel, changes, reason),
+                    guild_id=guild.id
+                )
+                for _, channel, changes in category_diff.channels_to_edit
+            ), return_exceptions=True)
+            steps = []
+            for (channel_plan, channel, _), result in zip(category_diff.channels_to_edit, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error repairing channel {channel_plan.name}: {result}")
+                    succeeded = False
+                else:
+                    steps.append((channel_plan.key, channel.id))
+                    logger.debug(f"Repaired channel: {channel_plan.name}")
+            await self._checkpoint(job_id, steps)
+
+            return succeeded
+
+        except Exception as e:
+            logger.error(f"Error creating category {category_name}: {e}")
+            return False
+
+    async def _order_category(self, guild: discord.Guild, category_plan: CategoryPlan, index: GuildIndex,
+                              reason: str) -> bool:
+        """Move a category's channels into template order with a single bulk position update.
+
+        Nothing is sent if the channels are already in order or the category doesn't exist.
+
+        Returns:
+            bool: True if the channels are in order, False if the update failed
+        """
+        category = index.get_category(category_plan.name)
+        if not category:
+            return True
+
+        positions = diff_channel_positions(category_plan, category, index)
+        if not positions:
+            return True
+
+        try:
+            await update_channel_positions(guild, positions, reason=reason)
+            logger.debug(f"Reordered {len(positions)} channel(s) in category: {category_plan.name}")
+            return True
+        except Exception as e:
+            logger.error(f"Error ordering channels in category {category_plan.name}: {e}")
+            return False
+
     async def backup_server(self, guild: discord.Guild) -> Dict[str, Any]:
         """Create a backup of the server's current structure.
 
+        Roles and categories are serialized on the event loop one at a time
+        and handed to the store, which compresses and writes them in a worker
+        thread as they arrive, so the whole backup is never held in memory.
+
         Args:
             guild: The Discord guild to backup
 
         Returns:
-            A dictionary containing the server template data
+            The backup 'id', its 'role_count', 'category_count' and 'channel_count',
+            and the store's 'new_chunks', 'reused_chunks' and 'bytes_written'
+
+        Raises:
+            Exception: If the backup could not be saved
         """
+        timestamp = discord.utils.utcnow().strftime('%Y%m%d_%H%M%S')
+        feed = _ChunkFeed()
         backup = {
             "name": f"{guild.name} Backup",
             "description": f"Backup of {guild.name} created on {discord.utils.utcnow().strftime('%Y-%m-%d')}",
             "category": "Backup",
-            "roles": [],
-            "categories": []
+            "roles": feed.stream('roles'),
+            "categories": feed.stream('categories')
         }
+        counts = {'role_count': 0, 'category_count': 0, 'channel_count': 0}
 
+        # Compressing and writing chunks is blocking file I/O, so the save runs in a worker thread
+        saving = asyncio.ensure_future(asyncio.to_thread(self.backups.save, guild.id, timestamp, backup))
+        try:
+            saved = await self._feed_backup(guild, feed, saving, counts)
+        except BaseException as e:
+            feed.abort()
+            # The save fails once aborted; collect its error so it isn't reported as unretrieved
+            saving.add_done_callback(lambda future: future.cancelled() or future.exception())
+            logger.error(f"Error saving backup for guild {guild.name} ({guild.id}): {e}")
+            raise
+
+        logger.info(
+            f"Successfully created backup {saved['id']} for guild {guild.name} ({guild.id}): "
+            f"{saved['new_chunks']} new chunk(s), {saved['reused_chunks']} reused, {saved['bytes_written']} bytes written"
+        )
+        return {
+            'id': saved['id'],
+            **counts,
+            'new_chunks': saved['new_chunks'],
+            'reused_chunks': saved['reused_chunks'],
+            'bytes_written': saved['bytes_written']
+        }
+
+    async def _feed_backup(self, guild: discord.Guild, feed: _ChunkFeed, saving: asyncio.Future,
+                           counts: Dict[str, int]) -> Dict[str, Any]:
+        """Serialize a guild's roles and categories into a backup feed and wait for the save.
+
+        Returns:
+            The store's save result
+        """
         # Backup roles (exclude default roles and managed roles like bot roles)
         for role in reversed(guild.roles):
             # Skip default role (@everyone) and managed roles (bot roles, etc)
@@ -391,7 +937,8 @@ class TemplateManager:
             for perm, value in role.permissions:
                 role_data["permissions"][perm] = value
 
-            backup["roles"].append(role_data)
+            await feed.put('roles', role_data, saving)
+            counts['role_count'] += 1
 
         # Backup categories and channels
         for category in guild.categories:
@@ -482,20 +1029,46 @@ class TemplateManager:
 
                 category_data["channels"].append(channel_data)
 
-            backup["categories"].append(category_data)
+            await feed.put('categories', category_data, saving)
+            counts['category_count'] += 1
+            counts['channel_count'] += len(category_data["channels"])
 
-        # Save the backup to a file
-        backup_filename = f"{guild.id}_{discord.utils.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
-        backup_file_path = os.path.join(self.backup_path, backup_filename)
+            # Let heartbeats and other interactions run between categories of a large guild
+            await asyncio.sleep(0)
 
-        try:
-            with open(backup_file_path, 'w') as f:
-                json.dump(backup, f, indent=4)
-            logger.info(f"Successfully created backup for guild {guild.name} ({guild.id}) at {backup_file_path}")
-        except Exception as e:
-            logger.error(f"Error saving backup for guild {guild.name} ({guild.id}): {e}")
+        # Only roles and categories that changed since earlier backups are written
+        return await feed.finish(saving)
+
+    def _forget_user_template(self, name: str) -> None:
+        """Drop a user template's compiled plan and search entry; catalog templates are left alone."""
+        if name in self.templates:
+            return
+        self.plans.pop(name, None)
+        self.user_template_digests.pop(name, None)
+        if self.search_index is not None:
+            self.search_index.remove(name)
+
+    def set_submission_status(self, name: str, status: str) -> bool:
+        """Change a submission's review status, updating the search index to match.
 
-        return backup
+        An approved submission is searchable straight away; one moved to any
+        other status stops being offered.
+
+        Args:
+            name: The submitted template's name
+            status: The new status
+
+        Returns:
+            bool: True if the submission exists
+        """
+        if not self.submissions.set_status(name, status):
+            return False
+        self._forget_user_template(name)
+        if status == 'approved' and name not in self.templates and self.search_index is not None:
+            submission = self.submissions.get(name)
+            if submission and isinstance(submission['data'], dict):
+                self.search_index.add(name, submission['data'], user_template=True)
+        return True
 
     def submit_template(self, user_id: int, template_data: Dict[str, Any]) -> bool:
         """Submit a user-created template for review.
@@ -519,27 +1092,12 @@ class TemplateManager:
             template_name = template_data['name']
             submission_time = discord.utils.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 
-            # Store with metadata
-            if 'submissions' not in self.user_templates:
-                self.user_templates['submissions'] = {}
-
-            self.user_templates['submissions'][template_name] = {
-                'data': template_data,
-                'metadata': {
-                    'submitted_by': user_id,
-                    'submitted_at': submission_time,
-                    'status': 'pending'  # pending, approved, rejected
-                }
-            }
-
-            # Save to file
-            success = self._save_user_templates()
-            if success:
-                logger.info(f"Template '{template_name}' submitted by user {user_id}")
-                return True
-            else:
-                logger.error(f"Failed to save template submission '{template_name}' by user {user_id}")
-                return False
+            # Store as pending review; only this submission's row is written
+            self.submissions.submit(template_name, template_data, user_id, submission_time)
+            # A resubmission is pending review again, so it stops being offered until it is re-approved
+            self._forget_user_template(template_name)
+            logger.info(f"Template '{template_name}' submitted by user {user_id}")
+            return True
 
         except Exception as e:
             logger.error(f"Error processing template submission: {e}")
@@ -0,0 +1,257 @@
+import logging
+import discord
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Permissions surfaced in previews, in display order
+KEY_PERMISSIONS = (
+    ('manage_guild', 'Manage Server'),
+    ('manage_roles', 'Manage Roles'),
+    ('manage_channels', 'Manage Channels'),
+    ('kick_members', 'Kick Members'),
+    ('ban_members', 'Ban Members'),
+    ('manage_messages', 'Manage Messages'),
+    ('priority_speaker', 'Priority Speaker'),
+)
+
+
+@dataclass(frozen=True)
+class OverwritePlan:
+    """A resolved permission overwrite for a role, stored as an allow/deny pair."""
+    role_name: str
+    allow: int
+    deny: int
+
+    def to_overwrite(self) -> discord.PermissionOverwrite:
+        """Build the discord.py overwrite object for this pair."""
+        return discord.PermissionOverwrite.from_pair(discord.Permissions(self.allow), discord.Permissions(self.deny))
+
+
+@dataclass(frozen=True)
+class RolePlan:
+    """A template role with its colour and permissions already resolved."""
+    name: str
+    color: int
+    color_hex: str
+    permissions: int
+    hoist: bool
+    mentionable: bool
+    key_permissions: Tuple[str, ...]
+
+    @property
+    def key(self) -> str:
+        return f"role:{self.name}"
+
+
+@dataclass(frozen=True)
+class ChannelPlan:
+    """A template channel; its overwrites already include the category's."""
+    name: str
+    type: str
+    category_name: str
+    position: int  # Index of the channel within its category, in template order
+    topic: str
+    slowmode: int
+    nsfw: bool
+    bitrate: int
+    user_limit: int
+    overwrites: Tuple[OverwritePlan, ...]
+
+    @property
+    def key(self) -> str:
+        # A category may hold channels of the same name, e.g. a text and a voice channel
+        return f"channel:{self.category_name}/{self.position}/{self.type}/{self.name}"
+
+
+@dataclass(frozen=True)
+class CategoryPlan:
+    """A template category and its channels in template order."""
+    name: str
+    overwrites: Tuple[OverwritePlan, ...]
+    channels: Tuple[ChannelPlan, ...]
+    required_roles: Tuple[str, ...]
+
+    @property
+    def key(self) -> str:
+        return f"category:{self.name}"
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """One object the plan creates, with the steps it depends on."""
+    key: str
+    kind: str
+    depends_on: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class TemplatePlan:
+    """An immutable, precomputed execution plan for a server template."""
+    name: str
+    description: str
+    category: str
+    image_url: Optional[str]
+    is_ai_generated: bool
+    roles: Tuple[RolePlan, ...]
+    categories: Tuple[CategoryPlan, ...]
+    steps: Tuple[PlanStep, ...]
+
+    @property
+    def role_count(self) -> int:
+        return len(self.roles)
+
+    @property
+    def category_count(self) -> int:
+        return len(self.categories)
+
+    @property
+    def channel_count(self) -> int:
+        return sum(len(category.channels) for category in self.categories)
+
+    def count_channels(self, include_text_channels: bool = True, include_voice_channels: bool = True) -> int:
+        """Count the channels that would be created with the given options."""
+        return sum(
+            1 for category in self.categories for channel in category.channels
+            if (channel.type == 'text' and include_text_channels) or
+               (channel.type == 'voice' and include_voice_channels)
+        )
+
+
+def _parse_color(value: Any) -> int:
+    """Parse a template colour, which is either a hex string or an int."""
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value or 0)
+
+
+def _permission_value(template_name: str, permissions: Dict[str, bool]) -> int:
+    """Resolve a role's permission flags into a permission integer."""
+    resolved = discord.Permissions()
+    for perm_name, perm_value in permissions.items():
+        if hasattr(resolved, perm_name):
+            setattr(resolved, perm_name, perm_value)
+        else:
+            logger.warning(f"Ignoring unknown permission '{perm_name}' in template {template_name}")
+    return resolved.value
+
+
+def _apply_flags(template_name: str, allow: int, deny: int, perms: Dict[str, Optional[bool]]) -> Tuple[int, int]:
+    """Layer explicit overwrite flags on top of an existing allow/deny pair."""
+    for perm_name, perm_value in perms.items():
+        flag = discord.Permissions.VALID_FLAGS.get(perm_name)
+        if flag is None:
+            logger.warning(f"Ignoring unknown permission '{perm_name}' in template {template_name}")
+            continue
+        allow &= ~flag
+        deny &= ~flag
+        if perm_value is True:
+            allow |= flag
+        elif perm_value is False:
+            deny |= flag
+    return allow, deny
+
+
+def _key_permissions(permissions: Dict[str, bool]) -> Tuple[str, ...]:
+    """Pick the notable permissions shown in previews."""
+    if permissions.get('administrator', False):
+        return ('Administrator',)
+    return tuple(label for perm_name, label in KEY_PERMISSIONS if permissions.get(perm_name, False))
+
+
+def compile_template(name: str, template: Dict[str, Any]) -> TemplatePlan:
+    """Compile a raw template dict into an immutable execution plan.
+
+    Args:
+        name: The template name
+        template: The raw template data as stored in the template JSON
+
+    Returns:
+        The compiled TemplatePlan
+    """
+    roles = []
+    for role in template.get('roles', []):
+        permissions = role.get('permissions', {})
+        color_value = role.get('color', '0x000000')
+        roles.append(RolePlan(
+            name=role['name'],
+            color=_parse_color(color_value),
+            color_hex=color_value if isinstance(color_value, str) else f"0x{color_value:06x}",
+            permissions=_permission_value(name, permissions),
+            hoist=role.get('hoist', False),
+            mentionable=role.get('mentionable', False),
+            key_permissions=_key_permissions(permissions)
+        ))
+
+    categories = []
+    for category_data in template.get('categories', []):
+        category_name = category_data['name']
+
+        category_pairs: Dict[str, Tuple[int, int]] = {}
+        for role_name, perms in category_data.get('permissions', {}).items():
+            category_pairs[role_name] = _apply_flags(name, 0, 0, perms)
+
+        channels = []
+        required_roles = set(category_pairs)
+        for position, channel_data in enumerate(category_data.get('channels', [])):
+            # Channel overwrites start from the category's and layer channel-specific flags on top
+            channel_pairs = dict(category_pairs)
+            for role_name, perms in channel_data.get('permissions', {}).items():
+                allow, deny = channel_pairs.get(role_name, (0, 0))
+                channel_pairs[role_name] = _apply_flags(name, allow, deny, perms)
+                required_roles.add(role_name)
+
+            channels.append(ChannelPlan(
+                name=channel_data['name'],
+                type=channel_data.get('type', 'text'),
+                category_name=category_name,
+                position=position,
+                topic=channel_data.get('topic', ''),
+                slowmode=channel_data.get('slowmode', 0),
+                nsfw=channel_data.get('nsfw', False),
+                bitrate=channel_data.get('bitrate', 64000),
+                user_limit=channel_data.get('user_limit', 0),
+                overwrites=tuple(OverwritePlan(role_name, allow, deny) for role_name, (allow, deny) in channel_pairs.items())
+            ))
+
+        categories.append(CategoryPlan(
+            name=category_name,
+            overwrites=tuple(OverwritePlan(role_name, allow, deny) for role_name, (allow, deny) in category_pairs.items()),
+            channels=tuple(channels),
+            required_roles=tuple(sorted(required_roles))
+        ))
+
+    # Dependency order: roles, then categories (which need the roles they reference), then channels
+    role_keys = {role.name: role.key for role in roles}
+    steps: List[PlanStep] = [PlanStep(role.key, 'role', ()) for role in roles]
+    for category in categories:
+        steps.append(PlanStep(
+            category.key, 'category',
+            tuple(role_keys[role_name] for role_name in category.required_roles if role_name in role_keys)
+        ))
+    for category in categories:
+        for channel in category.channels:
+            steps.append(PlanStep(channel.key, 'channel', (category.key,)))
+
+    return TemplatePlan(
+        name=name,
+        description=template.get('description', 'No description available'),
+        category=template.get('category', 'Other'),
+        image_url=template.get('image_url', None),
+        is_ai_generated=template.get('is_ai_generated', False),
+        roles=tuple(roles),
+        categories=tuple(categories),
+        steps=tuple(steps)
+    )
+
+
+def compile_catalog(templates: Dict[str, Dict[str, Any]]) -> Dict[str, TemplatePlan]:
+    """Compile every template in a catalog, skipping (and logging) invalid ones."""
+    plans = {}
+    for name, template in templates.items():
+        try:
+            plans[name] = compile_template(name, template)
+        except Exception as e:
+            logger.error(f"Failed to compile template {name}: {e}")
+    return plans
@@ -0,0 +1,210 @@
+import re
+import logging
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# How much a match in each field counts towards a template's score
+NAME_WEIGHT = 8.0
+CATEGORY_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 2.0
+CHANNEL_WEIGHT = 1.0
+
+# A prefix match counts for less than the whole word
+PREFIX_FACTOR = 0.6
+
+# Upper bound on the words a short prefix expands to
+MAX_EXPANSIONS = 256
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase words, ignoring punctuation and emoji."""
+    if not text:
+        return []
+    return _TOKEN.findall(text.lower())
+
+
+class _TrieNode:
+    __slots__ = ('children', 'word')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.word: Optional[str] = None
+
+
+class TemplateSearchIndex:
+    """Ranked template search over names, descriptions, categories and channels.
+
+    An inverted index maps every word to the templates containing it, with a
+    weight per field; a trie over the same words expands the last, partially
+    typed word of a query, so the index can back autocomplete directly.
+    Templates can be added and removed while the index is in use, from any
+    thread.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._names: Dict[str, str] = {}
+        self._user_templates: Set[str] = set()
+        # Words indexed per template, so a template can be removed again
+        self._words: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _insert_word(self, word: str) -> None:
+        node = self._root
+        for character in word:
+            node = node.children.setdefault(character, _TrieNode())
+        node.word = word
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Words in the index starting with a prefix, shortest first."""
+        node = self._root
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return []
+
+        words = []
+        level = [node]
+        while level and len(words) < MAX_EXPANSIONS:
+            next_level = []
+            for current in level:
+                if current.word is not None:
+                    words.append(current.word)
+                next_level.extend(current.children.values())
+            level = next_level
+        return words[:MAX_EXPANSIONS]
+
+    def add(self, name: str, template: Dict[str, Any], user_template: bool = False) -> None:
+        """Index a template.
+
+        Args:
+            name: The template's name
+            template: The template definition
+            user_template: Whether it is an approved user submission rather than a catalog template
+        """
+        weights: Dict[str, float] = {}
+
+        def add_words(text: Optional[str], weight: float) -> None:
+            for word in tokenize(text):
+                weights[word] = max(weights.get(word, 0.0), weight)
+
+        add_words(name, NAME_WEIGHT)
+        add_words(template.get('category'), CATEGORY_WEIGHT)
+        add_words(template.get('description'), DESCRIPTION_WEIGHT)
+        for category in template.get('categories', []):
+            add_words(category.get('name'), CHANNEL_WEIGHT)
+            for channel in category.get('channels', []):
+                add_words(channel.get('name'), CHANNEL_WEIGHT)
+                add_words(channel.get('topic'), CHANNEL_WEIGHT)
+
+        with self._lock:
+            self._remove(name)
+            for word, weight in weights.items():
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = {}
+                    self._insert_word(word)
+                postings[name] = weight
+
+            self._words[name] = list(weights)
+            self._names[name.lower()] = name
+            if user_template:
+                self._user_templates.add(name)
+
+    def remove(self, name: str) -> None:
+        """Remove a template from the index, if it is indexed."""
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name: str) -> None:
+        for word in self._words.pop(name, ()):
+            postings = self._postings.get(word)
+            if postings is not None:
+                postings.pop(name, None)
+                # The word stays in the trie; expansions without postings score nothing
+                if not postings:
+                    del self._postings[word]
+        if self._names.get(name.lower()) == name:
+            del self._names[name.lower()]
+        self._user_templates.discard(name)
+
+    def _score_word(self, word: str, prefix: bool) -> Dict[str, float]:
+        """Score templates for one query word, expanding it through the trie if it is a prefix."""
+        scores = dict(self._postings.get(word, {}))
+        if prefix:
+            for expansion in self._expand(word):
+                if expansion == word:
+                    continue
+                for name, weight in self._postings.get(expansion, {}).items():
+                    scores[name] = max(scores.get(name, 0.0), weight * PREFIX_FACTOR)
+        return scores
+
+    def search(self, query: str, limit: int = 25) -> List[str]:
+        """Find the templates best matching a query.
+
+        Every word must match; the last one may be partially typed. Catalog
+        templates rank above user templates with the same score, and a name
+        starting with the query ranks first.
+
+        Args:
+            query: Text typed by the user
+            limit: Maximum number of names to return (Discord shows at most 25)
+
+        Returns:
+            Template names, best match first
+        """
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query: str, limit: int) -> List[str]:
+        words = tokenize(query)
+        if not words:
+            return sorted(self._names.values(), key=lambda name: (name in self._user_templates, name.lower()))[:limit]
+
+        totals: Optional[Dict[str, float]] = None
+        for position, word in enumerate(words):
+            scores = self._score_word(word, prefix=position == len(words) - 1)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {name: total + scores[name] for name, total in totals.items() if name in scores}
+            if not totals:
+                return []
+
+        lowered = query.strip().lower()
+        for name in totals:
+            if name.lower().startswith(lowered):
+                totals[name] += NAME_WEIGHT * 2
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0] in self._user_templates, item[0].lower()))
+        return [name for name, _ in ranked[:limit]]
+
+
+def build_search_index(templates: Iterable[Tuple[str, Dict[str, Any]]],
+                       user_templates: Iterable[Tuple[str, Dict[str, Any]]] = ()) -> TemplateSearchIndex:
+    """Build a search index over catalog templates and approved user templates.
+
+    Args:
+        templates: (name, definition) pairs from the catalog
+        user_templates: (name, definition) pairs of approved user submissions
+
+    Returns:
+        The populated index
+    """
+    index = TemplateSearchIndex()
+    for name, template in templates:
+        index.add(name, template)
+    for name, template in user_templates:
+        try:
+            index.add(name, template, user_template=True)
+        except Exception as e:
+            logger.warning(f"Skipping user template {name} in search index: {e}")
+    return index